@@ -159,6 +159,33 @@ STORAGES = {
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Normalisation des photos à l'envoi (la taille maximum est réglée dans ParametresSite)
+IMAGE_MAX_DIMENSION = config('IMAGE_MAX_DIMENSION', default=2048, cast=int)
+IMAGE_JPEG_QUALITY = config('IMAGE_JPEG_QUALITY', default=85, cast=int)
+
+# Envoi direct des photos au serveur média, sans passer par Django (voir vetements/upload_receiver.py)
+# Désactivé tant que MEDIA_UPLOAD_URL ou MEDIA_UPLOAD_SECRET est vide
+MEDIA_UPLOAD_URL = config('MEDIA_UPLOAD_URL', default='')
+MEDIA_UPLOAD_SECRET = config('MEDIA_UPLOAD_SECRET', default='')
+MEDIA_UPLOAD_TTL = config('MEDIA_UPLOAD_TTL', default=900, cast=int)
+
+# Photos servies par nginx après autorisation par Django (vue media_protege, X-Accel-Redirect)
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='/media-interne/')
+
+# Cache (statistiques des utilisateurs). En mémoire par défaut ; avec plusieurs
+# processus, un cache partagé (Redis, base de données) évite de recalculer
+# les mêmes statistiques dans chaque processus.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='garde-robe'),
+    }
+}
+
+# Durée de conservation des statistiques en cache (secondes) ; elles sont
+# de toute façon recalculées dès que la garde-robe change
+STATISTIQUES_CACHE_TTL = config('STATISTIQUES_CACHE_TTL', default=86400, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -35,7 +35,8 @@ MEDIA_URL = config('MEDIA_URL', default='https://media.votredomaine.com/media/')
 MEDIA_ROOT = '/tmp/media'  # Non utilisé en production, uploads gérés via SFTP
 
 # Activer le backend SFTP pour les uploads
-DEFAULT_FILE_STORAGE = 'vetements.storage.UnraidSFTPStorage'
+# (vetements.storage.TieredStorage : disque local + réplication vers Unraid en tâche de fond)
+DEFAULT_FILE_STORAGE = config('MEDIA_STORAGE_BACKEND', default='vetements.storage.UnraidSFTPStorage')
 
 # Configuration SFTP (à définir dans variables d'environnement Render)
 # UNRAID_SFTP_HOST = '192.168.1.47' (ou via tunnel Cloudflare)
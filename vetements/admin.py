@@ -3,7 +3,9 @@ from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User, Group
 from django.db.models import Q, Count
 from django.utils.html import format_html
-from .models import Categorie, Couleur, Taille, Vetement, Tenue, Valise, ItemValise, Message, Amitie, AnnonceVente, ParametresSite, RapportModeration, ActionModeration, FavoriAnnonce, TransactionVente, EvaluationVendeur
+from . import recherche_annonces
+from .forms import ImageIngestForm
+from .models import Categorie, Couleur, Taille, Vetement, Tenue, Valise, ItemValise, Message, Amitie, AnnonceVente, ParametresSite, RapportModeration, ActionModeration, FavoriAnnonce, TransactionVente, EvaluationVendeur, UtilisationStockage, StatistiquesUtilisateur, Portage
 
 
 # Personnalisation du site admin pour restreindre l'accès
@@ -182,6 +184,7 @@ class TailleAdmin(admin.ModelAdmin):
 
 @admin.register(Vetement, site=restricted_admin_site)
 class VetementAdmin(admin.ModelAdmin):
+    form = ImageIngestForm
     change_form_template = 'admin/vetements/vetement_change_form.html'
     add_form_template = 'admin/vetements/vetement_change_form.html'
 
@@ -256,26 +259,26 @@ class VetementAdmin(admin.ModelAdmin):
 
     def marquer_a_laver(self, request, queryset):
         queryset.update(a_laver=True)
+        # update() ne déclenche pas les signaux : statistiques recalculées
+        StatistiquesUtilisateur.recalculer(set(queryset.values_list('proprietaire_id', flat=True)))
         self.message_user(request, f"{queryset.count()} vêtement(s) marqué(s) à laver.")
     marquer_a_laver.short_description = "Marquer comme à laver"
 
     def marquer_lave(self, request, queryset):
         queryset.update(a_laver=False)
+        StatistiquesUtilisateur.recalculer(set(queryset.values_list('proprietaire_id', flat=True)))
         self.message_user(request, f"{queryset.count()} vêtement(s) marqué(s) comme lavé(s).")
     marquer_lave.short_description = "Marquer comme lavé"
 
     def incrementer_portage(self, request, queryset):
-        from django.utils import timezone
-        for vetement in queryset:
-            vetement.nombre_portage += 1
-            vetement.derniere_utilisation = timezone.now().date()
-            vetement.save()
+        Portage.enregistrer(queryset)
         self.message_user(request, f"Portage incrémenté pour {queryset.count()} vêtement(s).")
     incrementer_portage.short_description = "Incrémenter le nombre de portages"
 
 
 @admin.register(Tenue, site=restricted_admin_site)
 class TenuAdmin(admin.ModelAdmin):
+    form = ImageIngestForm
     list_display = ['nom', 'occasion', 'saison', 'nombre_fois_portee', 'favori_icon']
     list_filter = ['occasion', 'saison', 'favori', 'date_creation']
     search_fields = ['nom', 'description']
@@ -330,11 +333,8 @@ class TenuAdmin(admin.ModelAdmin):
     actions = ['incrementer_portage_tenue']
 
     def incrementer_portage_tenue(self, request, queryset):
-        from django.utils import timezone
         for tenue in queryset:
-            tenue.nombre_fois_portee += 1
-            tenue.derniere_fois_portee = timezone.now().date()
-            tenue.save()
+            tenue.porter()
         self.message_user(request, f"Portage incrémenté pour {queryset.count()} tenue(s).")
     incrementer_portage_tenue.short_description = "Incrémenter le nombre de portages"
 
@@ -589,6 +589,7 @@ class AnnonceVenteAdmin(admin.ModelAdmin):
 
     def marquer_reservee(self, request, queryset):
         queryset.filter(statut='en_vente').update(statut='reservee')
+        recherche_annonces.indexer(queryset)  # update() ne déclenche pas les signaux
         self.message_user(request, f"{queryset.filter(statut='reservee').count()} annonce(s) marquée(s) comme réservée(s).")
     marquer_reservee.short_description = "Marquer comme réservée"
 
@@ -603,6 +604,7 @@ class AnnonceVenteAdmin(admin.ModelAdmin):
 
     def marquer_retiree(self, request, queryset):
         queryset.update(statut='retiree')
+        recherche_annonces.indexer(queryset)
         self.message_user(request, f"{queryset.filter(statut='retiree').count()} annonce(s) retirée(s) de la vente.")
     marquer_retiree.short_description = "Retirer de la vente"
 
@@ -621,7 +623,7 @@ class ParametresSiteAdmin(admin.ModelAdmin):
             'fields': ('inscription_ouverte', 'validation_inscription', 'messages_actifs', 'annonces_actives', 'amitie_active')
         }),
         ('Limitations', {
-            'fields': ('max_vetements_par_user', 'max_tenues_par_user', 'max_valises_par_user', 'taille_max_image')
+            'fields': ('max_vetements_par_user', 'max_tenues_par_user', 'max_valises_par_user', 'taille_max_image', 'quota_stockage')
         }),
         ('Modération', {
             'fields': ('moderation_active', 'moderation_messages', 'moderation_annonces')
@@ -646,6 +648,24 @@ class ParametresSiteAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(UtilisationStockage, site=restricted_admin_site)
+class UtilisationStockageAdmin(admin.ModelAdmin):
+    """Consultation de l'espace occupé par utilisateur (recalculé par recalculer_quotas)"""
+
+    list_display = ['utilisateur', 'get_mo', 'nombre_fichiers', 'date_mise_a_jour']
+    search_fields = ['utilisateur__username']
+    ordering = ['-octets']
+    readonly_fields = ['utilisateur', 'octets', 'nombre_fichiers', 'date_mise_a_jour']
+
+    def get_mo(self, obj):
+        return f"{obj.octets / (1024 * 1024):.1f} Mo"
+    get_mo.short_description = 'Espace utilisé'
+    get_mo.admin_order_field = 'octets'
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(RapportModeration, site=restricted_admin_site)
 class RapportModerationAdmin(admin.ModelAdmin):
     """Administration des rapports de modération"""
@@ -0,0 +1,65 @@
+"""
+Cache des statistiques des utilisateurs, indexé par la version de leur
+garde-robe (StatistiquesUtilisateur.version, qui change à chaque écriture
+de Vetement, Tenue, Valise ou EvenementTenue).
+
+    stats = StatistiquesUtilisateur.pour(request.user)
+    valeur = en_cache(stats, 'statistiques', lambda: calculer_statistiques(request.user))
+
+Quand la version change, une seule requête recalcule la valeur (verrou
+posé par cache.add) ; pendant ce temps, les autres requêtes reçoivent
+l'ancienne valeur, ou attendent le résultat s'il n'y en a pas encore.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+# Durée de vie du verrou de recalcul (secondes), si le processus meurt pendant le calcul
+DUREE_VERROU = 30
+
+# Attente maximale d'un recalcul en cours, quand aucune ancienne valeur n'existe
+ATTENTE_MAX = 5
+INTERVALLE_ATTENTE = 0.05
+
+
+def cle_cache(utilisateur_id, nom):
+    return f'statistiques:{nom}:{utilisateur_id}'
+
+
+def en_cache(statistiques, nom, calcul):
+    """
+    Valeur nom de l'utilisateur de statistiques (StatistiquesUtilisateur),
+    recalculée par calcul() si elle date d'une version antérieure de la
+    garde-robe.
+    """
+    cle = cle_cache(statistiques.utilisateur_id, nom)
+    version = statistiques.version
+    entree = cache.get(cle)
+    if entree is not None and entree[0] >= version:
+        return entree[1]
+
+    verrou = f'{cle}:verrou:{version}'
+    if cache.add(verrou, True, DUREE_VERROU):
+        try:
+            valeur = calcul()
+            courante = cache.get(cle)
+            # Ne pas écraser le résultat d'un recalcul plus récent
+            if courante is None or courante[0] < version:
+                cache.set(cle, (version, valeur), settings.STATISTIQUES_CACHE_TTL)
+        finally:
+            cache.delete(verrou)
+        return valeur
+
+    if entree is not None:
+        return entree[1]  # Recalcul en cours dans une autre requête
+
+    limite = time.monotonic() + ATTENTE_MAX
+    while time.monotonic() < limite:
+        time.sleep(INTERVALLE_ATTENTE)
+        entree = cache.get(cle)
+        if entree is not None and entree[0] >= version:
+            return entree[1]
+    return calcul()
@@ -0,0 +1,137 @@
+"""
+Facettes de la liste des vêtements : nombre de vêtements pour chaque
+valeur de chaque filtre (catégorie, genre, saison, état, favori, à laver).
+
+    filtres = filtres_actifs(request.GET)
+    comptes = compter_facettes(vetements, filtres, StatistiquesUtilisateur.pour(request.user))
+    vetements = filtrer(vetements, filtres)
+
+Le compte d'une valeur tient compte de tous les filtres actifs sauf celui
+de sa propre facette : avec « Hiver » et « Favoris » cochés, la liste des
+saisons donne le nombre de favoris de chaque saison.
+
+Une seule requête groupée compte les vêtements par combinaison des valeurs
+des six facettes ; les comptes de chaque facette sont des sommes sur ces
+combinaisons, quel que soit le nombre de facettes et de valeurs. La table
+des combinaisons ne dépend pas des filtres de facettes : elle est mise en
+cache par version de la garde-robe (et par recherche), et sert tant que
+l'utilisateur ne fait que cocher des filtres.
+"""
+
+import hashlib
+from collections import Counter
+from dataclasses import dataclass
+
+from django.db.models import Count
+
+from .cache_statistiques import en_cache
+from .models import Vetement
+
+
+# (paramètre de la requête, champ du vêtement)
+FACETTES = (
+    ('categorie', 'categorie_id'),
+    ('genre', 'genre'),
+    ('saison', 'saison'),
+    ('etat', 'etat'),
+    ('favori', 'favori'),
+    ('a_laver', 'a_laver'),
+)
+
+# Facettes cochées ou non : seul le compte des vêtements concernés s'affiche
+FACETTES_BOOLEENNES = ('favori', 'a_laver')
+
+
+@dataclass
+class Option:
+    """Une valeur d'une facette à choix, avec son compte"""
+
+    valeur: object
+    libelle: str
+    nombre: int
+    active: bool = False
+
+
+def filtres_actifs(parametres):
+    """Filtres de facettes de parametres (request.GET) : {facette: valeur}"""
+    filtres = {}
+    for facette, _ in FACETTES:
+        valeur = parametres.get(facette)
+        if not valeur:
+            continue
+        if facette in FACETTES_BOOLEENNES:
+            filtres[facette] = True
+        elif facette == 'categorie':
+            try:
+                filtres[facette] = int(valeur)
+            except ValueError:
+                pass  # Identifiant illisible : filtre ignoré
+        else:
+            filtres[facette] = valeur
+    return filtres
+
+
+def filtrer(vetements, filtres):
+    """vetements restreints aux filtres de facettes"""
+    champs = dict(FACETTES)
+    return vetements.filter(**{champs[facette]: valeur for facette, valeur in filtres.items()})
+
+
+def combinaisons(vetements):
+    """[(valeur de chaque facette..., nombre)] : vêtements par combinaison, en une requête groupée"""
+    colonnes = [champ for _, champ in FACETTES]
+    return [tuple(ligne) for ligne in vetements.order_by().values_list(*colonnes).annotate(nombre=Count('pk'))]
+
+
+def compter(table, filtres):
+    """{facette: Counter(valeur: nombre)}, chaque facette comptée avec tous les filtres sauf le sien"""
+    noms = [facette for facette, _ in FACETTES]
+    comptes = {facette: Counter() for facette in noms}
+    for *valeurs, nombre in table:
+        ligne = dict(zip(noms, valeurs))
+        ecartes = [facette for facette, valeur in filtres.items() if ligne[facette] != valeur]
+        if not ecartes:
+            for facette in noms:
+                comptes[facette][ligne[facette]] += nombre
+        elif len(ecartes) == 1:
+            # Écartée par un seul filtre : compte seulement pour la facette de ce filtre
+            comptes[ecartes[0]][ligne[ecartes[0]]] += nombre
+    return comptes
+
+
+def compter_facettes(vetements, filtres, statistiques=None, recherche=''):
+    """
+    Comptes des facettes de vetements (queryset non restreint par les
+    filtres de facettes). Avec statistiques (StatistiquesUtilisateur du
+    propriétaire), la table des combinaisons est mise en cache jusqu'à la
+    prochaine modification de la garde-robe ; recherche distingue les
+    tables de querysets filtrés par une recherche plein texte.
+    """
+    if statistiques is None:
+        return compter(combinaisons(vetements), filtres)
+    nom = 'facettes'
+    if recherche:
+        nom += ':' + hashlib.sha1(recherche.encode()).hexdigest()
+    return compter(en_cache(statistiques, nom, lambda: combinaisons(vetements)), filtres)
+
+
+def options_facettes(comptes, filtres, categories):
+    """
+    Options de chaque facette pour le formulaire de filtres : liste
+    d'Option pour les facettes à choix, nombre de vêtements cochés pour
+    les facettes booléennes
+    """
+    libelles = {
+        'categorie': [(categorie.pk, categorie.nom) for categorie in categories],
+        'genre': Vetement.GENRE_CHOICES,
+        'saison': Vetement.SAISON_CHOICES,
+        'etat': Vetement.ETAT_CHOICES,
+    }
+    options = {
+        facette: [Option(valeur, libelle, comptes[facette][valeur], filtres.get(facette) == valeur)
+                  for valeur, libelle in choix]
+        for facette, choix in libelles.items()
+    }
+    for facette in FACETTES_BOOLEENNES:
+        options[facette] = comptes[facette][True]
+    return options
@@ -1,9 +1,143 @@
+import json
+import time
+import uuid
+from urllib.parse import quote, urlencode
+
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from .models import Valise, Vetement, Tenue, Categorie, Couleur, Taille, EvenementTenue
+from django.core.files.uploadedfile import UploadedFile
+from .images import normalize_image
+from .signatures import upload_params, verify_receipt
+from .models import Valise, Vetement, Tenue, Categorie, Couleur, Taille, EvenementTenue, ParametresSite, UtilisationStockage
 from datetime import date
 
 
+def taille_max_image():
+    """Taille maximum d'une photo, en octets (paramètres du site)"""
+    parametres = ParametresSite.objects.first()
+    return (parametres.taille_max_image if parametres else 5) * 1024 * 1024
+
+
+def quota_stockage():
+    """Quota de stockage par utilisateur, en octets (None : illimité)"""
+    parametres = ParametresSite.objects.first()
+    quota = parametres.quota_stockage if parametres else 500
+    return quota * 1024 * 1024 if quota else None
+
+
+class ImageIngestForm(forms.ModelForm):
+    """
+    Formulaire de base pour les modèles avec photo : la photo envoyée est
+    normalisée (orientation, métadonnées, dimensions, compression) avant
+    d'être enregistrée, puis refusée si elle dépasse la taille maximum
+    définie dans les paramètres du site.
+
+    Avec l'envoi direct (MEDIA_UPLOAD_URL), le navigateur normalise la photo
+    et l'envoie lui-même au serveur média ; le formulaire ne transmet que le
+    reçu signé du récepteur, dans image_directe.
+
+    Avec utilisateur, la photo est aussi refusée si elle dépasse le quota
+    de stockage restant (compteurs d'UtilisationStockage, sans accès au
+    storage).
+    """
+
+    image_directe = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def __init__(self, *args, utilisateur=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.utilisateur = utilisateur
+
+    def quota_restant(self):
+        """Octets encore disponibles pour la photo de ce formulaire (None : pas de quota)"""
+        if self.utilisateur is None:
+            return None
+        quota = quota_stockage()
+        if quota is None:
+            return None
+        # La photo remplacée libère sa place
+        liberee = (self.instance.image_taille or 0) if self.instance.pk and self.instance.image else 0
+        return quota - UtilisationStockage.octets_utilises(self.utilisateur.pk) + liberee
+
+    def _verifier_quota(self, taille):
+        restant = self.quota_restant()
+        if restant is not None and taille > restant:
+            raise ValidationError(
+                f"Quota de stockage atteint : cette photo fait {taille / (1024 * 1024):.1f} Mo, "
+                f"il reste {max(restant, 0) / (1024 * 1024):.1f} Mo. Supprimez des photos pour libérer de la place."
+            )
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image  # Pas de nouvelle photo
+
+        normalized = normalize_image(
+            image,
+            max_dimension=settings.IMAGE_MAX_DIMENSION,
+            quality=settings.IMAGE_JPEG_QUALITY,
+        )
+
+        taille_max = taille_max_image()
+        if normalized.size > taille_max:
+            raise ValidationError(
+                f"L'image est trop volumineuse ({normalized.size / (1024 * 1024):.1f} Mo après "
+                f"compression, maximum {taille_max // (1024 * 1024)} Mo)."
+            )
+        self._verifier_quota(normalized.size)
+        return normalized
+
+    def clean_image_directe(self):
+        recu = self.cleaned_data.get('image_directe')
+        if not recu:
+            return None
+        try:
+            recu = json.loads(recu)
+            valide = verify_receipt(
+                settings.MEDIA_UPLOAD_SECRET, recu['nom'], recu['taille'], recu['sha256'], recu['recu']
+            )
+        except (ValueError, TypeError, KeyError):
+            valide = False
+        upload_to = self._meta.model._meta.get_field('image').upload_to
+        if not valide or not recu['nom'].startswith(upload_to):
+            raise ValidationError("L'envoi de la photo n'a pas pu être vérifié, veuillez la renvoyer.")
+        self._verifier_quota(int(recu['taille']))
+        return recu
+
+    def direct_upload(self):
+        """
+        URL signée pour envoyer une nouvelle photo au serveur média, et
+        réglages de normalisation côté navigateur ; None si l'envoi direct
+        n'est pas configuré ou si le quota est épuisé (le formulaire classique
+        affiche alors l'erreur).
+        """
+        if not (settings.MEDIA_UPLOAD_URL and settings.MEDIA_UPLOAD_SECRET):
+            return None
+        taille_max = taille_max_image()
+        restant = self.quota_restant()
+        if restant is not None:
+            if restant <= 0:
+                return None
+            taille_max = min(taille_max, restant)
+        upload_to = self._meta.model._meta.get_field('image').upload_to
+        name = f"{upload_to}{uuid.uuid4().hex}.jpg"
+        params = upload_params(
+            settings.MEDIA_UPLOAD_SECRET, name, taille_max, time.time() + settings.MEDIA_UPLOAD_TTL
+        )
+        return {
+            'url': f"{settings.MEDIA_UPLOAD_URL.rstrip('/')}/{quote(name)}?{urlencode(params)}",
+            'dimension_max': settings.IMAGE_MAX_DIMENSION,
+            'qualite': settings.IMAGE_JPEG_QUALITY / 100,
+        }
+
+    def save(self, commit=True):
+        recu = self.cleaned_data.get('image_directe')
+        if recu:
+            # Photo déjà sur le serveur média : seul son nom est enregistré
+            self.instance.attach_image(recu['nom'], recu['taille'])
+        return super().save(commit=commit)
+
+
 class ValiseForm(forms.ModelForm):
     """Formulaire pour créer/modifier une valise"""
     
@@ -137,7 +271,7 @@ class ValiseStatutForm(forms.ModelForm):
         }
 
 
-class VetementForm(forms.ModelForm):
+class VetementForm(ImageIngestForm):
     """Formulaire pour créer/modifier un vêtement"""
 
     class Meta:
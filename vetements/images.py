@@ -0,0 +1,230 @@
+"""
+Traitement des photos : normalisation à l'envoi et dérivés (vignettes)
+pour les pages en grille.
+
+À l'envoi, normalize_image() applique l'orientation EXIF, supprime les
+métadonnées, réduit la photo à une dimension maximum et la recompresse,
+avant qu'elle n'atteigne le storage.
+
+Chaque photo de Vetement ou Tenue est déclinée en plusieurs largeurs fixes,
+en WebP et en JPEG, enregistrées à côté de l'original via le storage
+configuré :
+
+    vetements/chemise.jpg -> vetements/chemise_160w.webp, vetements/chemise_160w.jpg, ...
+
+Les dérivés sont générés en tâche de fond après l'enregistrement d'une
+nouvelle photo, ou à la demande par les filtres de image_tags lorsqu'ils
+manquent (photos antérieures au pipeline). Le résultat de la génération
+est transmis à un callback, qui le note sur les objets (image_vignettes).
+"""
+
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+# Largeurs générées, en pixels
+VARIANT_WIDTHS = (160, 480, 1024)
+
+# Format -> (format Pillow, extension, options d'encodage)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def _flatten(image):
+    """Aplatir la transparence sur fond blanc (JPEG n'a pas de canal alpha)"""
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    rgba = image.convert('RGBA')
+    background.paste(rgba, mask=rgba.getchannel('A'))
+    return background
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def normalize_image(uploaded, max_dimension=2048, quality=85):
+    """
+    Normaliser une photo envoyée : orientation EXIF appliquée, métadonnées
+    supprimées, plus grand côté réduit à max_dimension, recompression en
+    JPEG (ou en PNG si la photo a de la transparence).
+    Retourne un ContentFile nommé d'après le fichier d'origine.
+    """
+    uploaded.seek(0)
+    with Image.open(uploaded) as source:
+        image = ImageOps.exif_transpose(source)
+        image.load()
+
+    # thumbnail() conserve les proportions et n'agrandit jamais
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    buffer = BytesIO()
+    root, _ = os.path.splitext(os.path.basename(uploaded.name))
+    if _has_alpha(image):
+        image.convert('RGBA').save(buffer, 'PNG', optimize=True)
+        name = f"{root}.png"
+    else:
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        # Ni EXIF ni ICC : rien n'est recopié depuis l'original
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+        name = f"{root}.jpg"
+    return ContentFile(buffer.getvalue(), name=name)
+
+
+def image_metadata(fileobj):
+    """
+    Métadonnées d'une photo, nommées comme les champs image_* de Vetement
+    et Tenue : dimensions (après orientation EXIF), poids en octets, format
+    et couleur moyenne (#rrggbb) servant de fond d'attente dans les listes.
+    """
+    fileobj.seek(0)
+    with Image.open(fileobj) as image:
+        image_format = image.format or ''
+        largeur, hauteur = image.size
+        if image.getexif().get(0x0112) in (5, 6, 7, 8):
+            # Photo tournée d'un quart de tour à l'affichage
+            largeur, hauteur = hauteur, largeur
+
+        # Décodage à échelle réduite (JPEG) : seule la couleur moyenne compte
+        image.draft('RGB', (64, 64))
+        rouge, vert, bleu = image.convert('RGB').resize((1, 1), Image.BOX).getpixel((0, 0))
+
+    taille = getattr(fileobj, 'size', None)
+    if taille is None:
+        taille = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(0)
+
+    return {
+        'image_largeur': largeur,
+        'image_hauteur': hauteur,
+        'image_taille': taille,
+        'image_format': image_format.lower(),
+        'image_couleur': f"#{rouge:02x}{vert:02x}{bleu:02x}",
+    }
+
+
+def empty_image_metadata():
+    """Valeurs des champs image_* pour un objet sans photo"""
+    return {
+        'image_largeur': None,
+        'image_hauteur': None,
+        'image_taille': None,
+        'image_format': '',
+        'image_couleur': '',
+    }
+
+
+def variant_name(name, width, fmt='jpeg'):
+    """Nom du dérivé de name à la largeur width dans le format fmt"""
+    root, _ = os.path.splitext(name)
+    return f"{root}_{width}w.{VARIANT_FORMATS[fmt][1]}"
+
+
+# <racine>_<largeur>w.<ext>, voir variant_name()
+VARIANT_RE = re.compile(r'^(?P<root>.+)_\d+w\.[a-z]+$')
+
+
+def variant_root(name):
+    """Racine (nom sans extension) de la photo dont name est un dérivé, None si name n'en est pas un"""
+    match = VARIANT_RE.match(name)
+    return match.group('root') if match else None
+
+
+def variant_names(name):
+    """Noms de tous les dérivés de name (le dernier est écrit en dernier)"""
+    return [
+        variant_name(name, width, fmt)
+        for width in VARIANT_WIDTHS
+        for fmt in VARIANT_FORMATS
+    ]
+
+
+def generate_variants(name, storage=None):
+    """
+    Générer tous les dérivés de la photo name.
+    Les dérivés déjà présents sont remplacés. Retourne les noms écrits.
+    """
+    storage = storage or default_storage
+
+    with storage.open(name) as f:
+        with Image.open(f) as source:
+            image = ImageOps.exif_transpose(source)
+            image.load()
+    if image.mode not in ('RGB', 'L'):
+        image = _flatten(image)
+
+    written = []
+    for width in VARIANT_WIDTHS:
+        resized = image.copy()
+        # thumbnail() n'agrandit jamais une photo plus petite que width
+        resized.thumbnail((width, width * 10), Image.LANCZOS)
+        for fmt, (pil_format, _, options) in VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+            target = variant_name(name, width, fmt)
+            storage.delete(target)
+            written.append(storage.save(target, ContentFile(buffer.getvalue())))
+    return written
+
+
+def variants_ready(name, storage=None):
+    """Vérifier que les dérivés de name existent (le dernier écrit fait foi)"""
+    storage = storage or default_storage
+    return storage.exists(variant_names(name)[-1])
+
+
+# Génération en tâche de fond, une seule fois par photo à la fois
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-variants')
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+
+
+def _generate_in_background(name, callback=None):
+    ready = False
+    try:
+        generate_variants(name)
+        ready = True
+    except Exception:
+        logger.exception("Échec de la génération des dérivés de %s", name)
+    try:
+        if callback is not None:
+            callback(name, ready)
+    except Exception:
+        logger.exception("Échec de l'enregistrement de l'état des dérivés de %s", name)
+    finally:
+        connections.close_all()  # Connexions de ce thread de génération
+        with _scheduled_lock:
+            _scheduled.discard(name)
+
+
+def variants_pending(name):
+    """Vrai si la génération des dérivés de name est prévue ou en cours"""
+    with _scheduled_lock:
+        return name in _scheduled
+
+
+def schedule_variants(name, callback=None):
+    """
+    Planifier la génération des dérivés de name (sans effet si déjà
+    prévue) ; callback(name, ready) reçoit ensuite son résultat
+    """
+    with _scheduled_lock:
+        if name in _scheduled:
+            return
+        _scheduled.add(name)
+    _executor.submit(_generate_in_background, name, callback)
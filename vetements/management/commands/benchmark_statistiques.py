@@ -0,0 +1,104 @@
+"""
+Mesure le calcul de la page statistiques sur des garde-robes générées,
+pour vérifier que le nombre de requêtes reste constant quand la
+garde-robe grandit.
+
+    python manage.py benchmark_statistiques
+    python manage.py benchmark_statistiques --vetements 100 1000 10000 --categories 30
+
+Les données sont créées dans une transaction annulée à la fin : la base
+n'est pas modifiée.
+"""
+
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from vetements.models import Categorie, Couleur, Portage, Vetement
+from vetements.statistiques import calculer_statistiques
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mesure le nombre de requêtes et la durée du calcul des statistiques"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vetements', type=int, nargs='+', default=[100, 1000, 10000],
+                            help="Tailles de garde-robe mesurées (défaut: 100 1000 10000)")
+        parser.add_argument('--categories', type=int, default=20,
+                            help="Nombre de catégories (défaut: 20)")
+        parser.add_argument('--repetitions', type=int, default=3,
+                            help="Calculs par taille, la meilleure durée est retenue (défaut: 3)")
+
+    def handle(self, *args, **options):
+        if min(options['vetements']) < 1 or options['categories'] < 1 or options['repetitions'] < 1:
+            raise CommandError("--vetements, --categories et --repetitions doivent être positifs")
+
+        resultats = []
+        try:
+            with transaction.atomic():
+                for taille in sorted(options['vetements']):
+                    resultats.append(self._mesurer(taille, options))
+                raise Rollback
+        except Rollback:
+            pass
+
+        requetes = {nombre for _, nombre, _ in resultats}
+        verdict = "constant" if len(requetes) == 1 else "variable"
+        self.stdout.write(self.style.SUCCESS(f"Nombre de requêtes {verdict} : {sorted(requetes)}"))
+
+    def _mesurer(self, taille, options):
+        rng = random.Random(taille)
+        suffixe = f'bench-{taille}'
+        utilisateur = User.objects.create_user(username=f'statistiques-{suffixe}')
+        categories = Categorie.objects.bulk_create(
+            [Categorie(nom=f'{suffixe}-categorie-{i}') for i in range(options['categories'])]
+        )
+        couleurs = Couleur.objects.bulk_create([Couleur(nom=f'{suffixe}-couleur-{i}') for i in range(12)])
+        aujourd_hui = timezone.now().date()
+
+        vetements = Vetement.objects.bulk_create([
+            Vetement(
+                proprietaire=utilisateur,
+                nom=f'Vêtement {i}',
+                categorie=rng.choice(categories),
+                couleur=rng.choice(couleurs + [None]),
+                genre='unisexe',
+                saison=rng.choice(Vetement.SAISON_CHOICES)[0],
+                prix_achat=Decimal(rng.randint(0, 20000)) / 100 if rng.random() < 0.8 else None,
+                nombre_portage=rng.choice([0, 0, 1, 2, 5, 10, 40]),
+                derniere_utilisation=aujourd_hui - timedelta(days=rng.randint(0, 500)) if rng.random() < 0.7 else None,
+            )
+            for i in range(taille)
+        ], batch_size=1000)
+        # Historique des portages correspondant aux compteurs
+        Portage.objects.bulk_create([
+            Portage(proprietaire=utilisateur, vetement=vetement,
+                    date=aujourd_hui - timedelta(days=rng.randint(0, 500)))
+            for vetement in vetements
+            for _ in range(vetement.nombre_portage)
+        ], batch_size=2000)
+
+        durees = []
+        for _ in range(options['repetitions']):
+            with CaptureQueriesContext(connection) as requetes:
+                debut = time.perf_counter()
+                calculer_statistiques(utilisateur)
+                durees.append(time.perf_counter() - debut)
+
+        duree = min(durees)
+        self.stdout.write(
+            f"{taille:7} vêtements, {options['categories']} catégories : "
+            f"{len(requetes)} requête(s), {duree * 1000:.1f} ms"
+        )
+        return taille, len(requetes), duree
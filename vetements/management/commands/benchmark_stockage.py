@@ -0,0 +1,203 @@
+"""
+Mesure les performances d'UnraidSFTPStorage contre un serveur SFTP local
+(vetements.sftp_local), sans avoir besoin du serveur Unraid.
+
+    python manage.py benchmark_stockage --latence 20 --sortie bench.json
+    python manage.py benchmark_stockage --latence 20 --comparer bench.json
+
+Le storage est configuré comme en production (variables UNRAID_*), seuls
+l'hôte, les identifiants et les répertoires locaux (cache, staging) sont
+remplacés. Scénarios :
+
+- envois : rafale de save() concurrents (get_available_name compris)
+- lectures : open().read() concurrents sur des photos déjà présentes
+- exists : get_available_name() sur des noms déjà pris, comme lors d'envois
+  successifs de « photo.jpg »
+- listdir : listing d'un répertoire d'environ N fichiers
+
+Pour chaque scénario : opérations par seconde, latences p50/p95/p99,
+nombre de connexions SSH établies et de requêtes SFTP reçues.
+"""
+
+import json
+import os
+import platform
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+
+from vetements.sftp_local import LocalSFTPServer
+from vetements.storage import UnraidSFTPStorage
+
+
+SCENARIOS = ('envois', 'lectures', 'exists', 'listdir')
+
+COMPARED_METRICS = (
+    ('ops/s', lambda result: result['ops_par_seconde']),
+    ('p95 ms', lambda result: result['latence_ms']['p95']),
+)
+
+
+def percentile(values, p):
+    """Percentile au rang le plus proche (values triées)"""
+    if not values:
+        return 0.0
+    rank = max(1, min(len(values), round(p / 100 * len(values) + 0.5)))
+    return values[rank - 1]
+
+
+def run_scenario(operation, count, concurrency):
+    """Exécuter operation(i) count fois ; retourne (durée totale, latences triées, erreurs)"""
+    def timed(i):
+        started = time.perf_counter()
+        operation(i)
+        return time.perf_counter() - started
+
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(timed, i) for i in range(count)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    return time.perf_counter() - started, sorted(latencies), errors
+
+
+class Command(BaseCommand):
+    help = "Mesure les performances du storage SFTP contre un serveur SFTP local"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latence', type=float, default=10,
+                            help="Latence simulée par aller-retour, en millisecondes (défaut: 10)")
+        parser.add_argument('--operations', type=int, default=100,
+                            help="Opérations par scénario (défaut: 100)")
+        parser.add_argument('--concurrence', type=int, default=4,
+                            help="Opérations simultanées (défaut: 4)")
+        parser.add_argument('--taille', type=int, default=200,
+                            help="Taille des photos envoyées et lues, en Ko (défaut: 200)")
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                            help="Scénarios à exécuter (défaut: tous)")
+        parser.add_argument('--sortie', help="Écrire les résultats dans ce fichier JSON")
+        parser.add_argument('--comparer', help="Résultats JSON d'une version précédente à comparer")
+
+    def handle(self, *args, **options):
+        if options['operations'] < 1:
+            raise CommandError("--operations doit être positif")
+        previous = None
+        if options['comparer']:
+            try:
+                with open(options['comparer'], encoding='utf-8') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Impossible de lire {options['comparer']} : {e}")
+
+        with tempfile.TemporaryDirectory(prefix='garde-robe-bench-') as workdir:
+            with LocalSFTPServer(os.path.join(workdir, 'serveur'), latency=options['latence'] / 1000) as server:
+                storage = self._storage(server, workdir)
+                try:
+                    results = self._run_all(storage, server, options)
+                finally:
+                    upload_queue = storage._get_upload_queue()
+                    if upload_queue is not None:
+                        upload_queue.join()
+                    if storage.pool_enabled:
+                        storage._get_pool().close()
+
+        report = {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'configuration': {
+                'latence_ms': options['latence'],
+                'operations': options['operations'],
+                'concurrence': options['concurrence'],
+                'taille_ko': options['taille'],
+                'pool': storage.pool_enabled,
+                'pool_size': storage.pool_size,
+                'cache': storage.cache_enabled,
+                'stat_cache_ttl': storage.stat_cache_ttl,
+                'write_behind': storage.write_behind,
+            },
+            'scenarios': results,
+        }
+        if options['sortie']:
+            with open(options['sortie'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Résultats écrits dans {options['sortie']}")
+        if previous is not None:
+            self._compare(previous, report)
+
+    def _storage(self, server, workdir):
+        storage = server.configure(UnraidSFTPStorage())
+        storage.cache_dir = os.path.join(workdir, 'cache')
+        storage.staging_dir = os.path.join(workdir, 'staging')
+        # Pas de MediaBlob créés dans la base pendant la mesure
+        storage.content_addressed = False
+        return storage
+
+    def _run_all(self, storage, server, options):
+        count, concurrency = options['operations'], options['concurrence']
+        payload = os.urandom(options['taille'] * 1024)
+        results = {}
+
+        def measure(scenario, operation):
+            handshakes, requests = server.handshakes, server.requests
+            duration, latencies, errors = run_scenario(operation, count, concurrency)
+            results[scenario] = {
+                'operations': count,
+                'erreurs': errors,
+                'duree_s': round(duration, 3),
+                'ops_par_seconde': round(len(latencies) / duration, 1) if duration else 0.0,
+                'latence_ms': {
+                    name: round(percentile(latencies, p) * 1000, 2)
+                    for name, p in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))
+                },
+                'handshakes': server.handshakes - handshakes,
+                'requetes_sftp': server.requests - requests,
+            }
+            self._print(scenario, results[scenario])
+
+        # Jeu de photos lues par les scénarios lectures, exists et listdir
+        names = [storage._save(f'bench/photos/photo_{i}.jpg', ContentFile(payload)) for i in range(count)]
+        upload_queue = storage._get_upload_queue()
+        if upload_queue is not None:
+            upload_queue.join()
+
+        for scenario in options['scenarios']:
+            if scenario == 'envois':
+                measure(scenario, lambda i: storage.save(f'bench/envois/photo_{i}.jpg', ContentFile(payload)))
+            elif scenario == 'lectures':
+                def read(i):
+                    with storage.open(names[i]) as f:
+                        f.read()
+                measure(scenario, read)
+            elif scenario == 'exists':
+                measure(scenario, lambda i: storage.get_available_name(names[i]))
+            elif scenario == 'listdir':
+                measure(scenario, lambda i: storage.listdir('bench/photos'))
+        return results
+
+    def _print(self, scenario, result):
+        latence = result['latence_ms']
+        self.stdout.write(
+            f"{scenario:10} {result['ops_par_seconde']:8.1f} ops/s  "
+            f"p50 {latence['p50']:7.1f} ms  p95 {latence['p95']:7.1f} ms  p99 {latence['p99']:7.1f} ms  "
+            f"{result['handshakes']} connexion(s), {result['requetes_sftp']} requête(s) SFTP"
+            + (f", {result['erreurs']} erreur(s)" if result['erreurs'] else '')
+        )
+
+    def _compare(self, previous, report):
+        self.stdout.write(f"Comparaison avec les résultats du {previous.get('date', '?')} :")
+        for scenario, result in report['scenarios'].items():
+            before = previous.get('scenarios', {}).get(scenario)
+            if not before:
+                continue
+            for label, metric in COMPARED_METRICS:
+                old, new = metric(before), metric(result)
+                change = (new - old) / old * 100 if old else 0.0
+                self.stdout.write(f"  {scenario:10} {label:7} {old:9.1f} -> {new:9.1f} ({change:+.0f}%)")
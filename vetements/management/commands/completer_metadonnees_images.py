@@ -0,0 +1,94 @@
+"""
+Complète les métadonnées (dimensions, poids, format, couleur moyenne) des
+photos enregistrées avant leur introduction. Le poids complété est
+reporté dans l'UtilisationStockage du propriétaire, dans la même
+transaction.
+
+    python manage.py completer_metadonnees_images --workers 8
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from vetements.images import image_metadata
+from vetements.models import Tenue, UtilisationStockage, Vetement
+
+
+class Command(BaseCommand):
+    help = "Renseigne les métadonnées des photos de vêtements et de tenues qui n'en ont pas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help="Nombre de photos traitées en parallèle (défaut: 4)",
+        )
+        parser.add_argument(
+            '--tout', action='store_true',
+            help="Recalculer aussi les photos qui ont déjà des métadonnées",
+        )
+
+    def handle(self, *args, **options):
+        total = echecs = 0
+        for model in (Vetement, Tenue):
+            queryset = model.objects.exclude(image='').exclude(image__isnull=True)
+            if not options['tout']:
+                queryset = queryset.filter(image_largeur__isnull=True)
+            rows = list(queryset.values_list('pk', 'image'))
+            if not rows:
+                continue
+
+            self.stdout.write(f"{model._meta.verbose_name_plural} : {len(rows)} photo(s) à traiter")
+            for name, erreur in self._traiter(model, rows, options['workers']):
+                if erreur is None:
+                    total += 1
+                else:
+                    echecs += 1
+                    self.stderr.write(f"  {name} : {erreur}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} photo(s) complétée(s), {echecs} échec(s)"
+        ))
+
+    def _traiter(self, model, rows, workers):
+        """Traiter les photos, en parallèle si workers > 1 ; produit (nom, erreur ou None)"""
+        if workers <= 1:
+            for pk, name in rows:
+                try:
+                    self._completer(model, pk, name)
+                    yield name, None
+                except Exception as e:
+                    yield name, e
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self._completer, model, pk, name): name
+                for pk, name in rows
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.exception()
+
+    @staticmethod
+    def _completer(model, pk, name):
+        field = model._meta.get_field('image')
+        try:
+            with field.storage.open(name) as f:
+                metadata = image_metadata(f)
+            with transaction.atomic():
+                ancienne = model.objects.select_for_update().filter(pk=pk, image=name).values_list(
+                    'proprietaire_id', 'image_taille'
+                ).first()
+                if ancienne is None:
+                    return  # Photo remplacée ou objet supprimé entre-temps : déjà compté par save()
+                proprietaire_id, ancienne_taille = ancienne
+                # update() : ne pas toucher date_modification ni relancer save()
+                model.objects.filter(pk=pk).update(**metadata)
+                # Le poids complété entre dans le quota du propriétaire (la photo y est déjà comptée)
+                UtilisationStockage.ajuster(proprietaire_id, (metadata['image_taille'] or 0) - (ancienne_taille or 0), 0)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                # Chaque thread ouvre sa propre connexion à la base
+                connection.close()
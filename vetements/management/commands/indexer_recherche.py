@@ -0,0 +1,32 @@
+"""
+Reconstruit les index de recherche : index plein texte des vêtements et
+documents de recherche des annonces en vente du marketplace.
+
+    python manage.py indexer_recherche
+
+Les index sont tenus à jour à chaque enregistrement ; cette commande sert
+après un bulk_create, un queryset.update(), un import ou une restauration
+de sauvegarde, qui ne déclenchent pas les signaux.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from vetements import recherche, recherche_annonces
+from vetements.models import Vetement
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les index de recherche des vêtements et des annonces"
+
+    def handle(self, *args, **options):
+        if recherche.moteur():
+            with transaction.atomic():
+                recherche.creer_index(connection)
+                total = recherche.reconstruire(Vetement)
+            self.stdout.write(f"{total} vêtement(s) indexé(s)")
+        else:
+            self.stdout.write(self.style.WARNING(f"Pas d'index plein texte pour la base {connection.vendor}"))
+
+        total = recherche_annonces.reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"{total} annonce(s) en vente indexée(s)"))
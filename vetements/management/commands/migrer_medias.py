@@ -0,0 +1,252 @@
+"""
+Copie les photos référencées en base d'un backend de stockage à un autre
+(par exemple du FileSystemStorage local vers UnraidSFTPStorage, ou l'inverse).
+
+    python manage.py migrer_medias \
+        --source django.core.files.storage.FileSystemStorage \
+        --destination vetements.storage.UnraidSFTPStorage \
+        --workers 4 --checkpoint migration.log --verifier sha256
+
+    python manage.py migrer_medias --source ... --destination ... --dry-run
+"""
+
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from django.utils.module_loading import import_string
+
+from vetements.images import variant_names
+
+
+def resolve_storage(value):
+    """Instancier un storage depuis son chemin Python ('default' pour le storage par défaut)"""
+    if not isinstance(value, str):
+        return value
+    if value == 'default':
+        return default_storage
+    try:
+        return import_string(value)()
+    except ImportError as e:
+        raise CommandError(f"Storage introuvable : {value} ({e})")
+
+
+def referenced_names(with_variants=False):
+    """Noms de tous les fichiers référencés par les FileField/ImageField de l'application"""
+    names = set()
+    for model in apps.get_app_config('vetements').get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField):
+                queryset = model.objects.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+                names.update(queryset.values_list(field.name, flat=True).iterator())
+    if with_variants:
+        for name in list(names):
+            names.update(variant_names(name))
+    return sorted(names)
+
+
+class HashingReader:
+    """Enveloppe de lecture qui calcule le SHA-256 des octets lus"""
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self.digest = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self.digest.update(data)
+        self.bytes_read += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        if offset != 0 or whence != 0:
+            raise OSError("HashingReader ne supporte que seek(0)")
+        self._file.seek(0)
+        self.digest = hashlib.sha256()
+        self.bytes_read = 0
+        return 0
+
+    def tell(self):
+        return self.bytes_read
+
+
+def file_digest(storage, name):
+    digest = hashlib.sha256()
+    with storage.open(name) as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """Journal des fichiers déjà copiés, pour reprendre une migration interrompue"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.done = {line.rstrip('\n') for line in f if line.strip()}
+            except FileNotFoundError:
+                pass
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def mark(self, name):
+        if self._file is None:
+            return
+        with self._lock:
+            self._file.write(name + '\n')
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class Command(BaseCommand):
+    help = "Copie les photos référencées d'un storage à un autre, avec reprise et vérification"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', required=True,
+                            help="Chemin Python du storage source ('default' pour le storage par défaut)")
+        parser.add_argument('--destination', required=True,
+                            help="Chemin Python du storage destination")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Copies en parallèle (défaut: 4, à garder <= UNRAID_SFTP_POOL_SIZE)")
+        parser.add_argument('--checkpoint',
+                            help="Fichier de reprise : les fichiers déjà copiés y sont notés et ignorés")
+        parser.add_argument('--verifier', choices=['taille', 'sha256'], default='taille',
+                            help="Vérification après copie (défaut: taille)")
+        parser.add_argument('--avec-derives', action='store_true',
+                            help="Copier aussi les vignettes existantes")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Comparer source et destination sans rien copier")
+
+    def handle(self, *args, **options):
+        self.source = resolve_storage(options['source'])
+        self.destination = resolve_storage(options['destination'])
+        self.verifier = options['verifier']
+
+        # Lire en flux sans remplir le cache disque, écrire de façon synchrone
+        if hasattr(self.source, 'cache_enabled'):
+            self.source.cache_enabled = False
+        if hasattr(self.destination, 'write_behind'):
+            self.destination.write_behind = False
+
+        names = referenced_names(with_variants=options['avec_derives'])
+        if options['dry_run']:
+            self._diff(names, options['workers'])
+            return
+
+        checkpoint = Checkpoint(options['checkpoint'])
+        try:
+            todo = [name for name in names if name not in checkpoint.done]
+            self.stdout.write(
+                f"{len(names)} fichier(s) référencé(s), {len(names) - len(todo)} déjà copié(s)"
+            )
+            self._copy_all(todo, checkpoint, options['workers'])
+        finally:
+            checkpoint.close()
+
+    def _run(self, names, operation, workers):
+        """Appliquer operation(name) en parallèle ; produit (nom, résultat, erreur)"""
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(operation, name): name for name in names}
+            for future in as_completed(futures):
+                error = future.exception()
+                yield futures[future], (None if error else future.result()), error
+
+    def _diff(self, names, workers):
+        def compare(name):
+            if not self.source.exists(name):
+                return 'absent de la source'
+            if not self.destination.exists(name):
+                return 'manquant'
+            if self.source.size(name) != self.destination.size(name):
+                return 'différent'
+            if self.verifier == 'sha256' and file_digest(self.source, name) != file_digest(self.destination, name):
+                return 'différent'
+            return 'identique'
+
+        counts = {}
+        for name, status, error in self._run(names, compare, workers):
+            status = 'erreur' if error else status
+            counts[status] = counts.get(status, 0) + 1
+            if status != 'identique':
+                self.stdout.write(f"  {status:20} {name}" + (f" ({error})" if error else ''))
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items()))
+        self.stdout.write(f"Comparaison de {len(names)} fichier(s) : {summary or 'rien à comparer'}")
+
+    def _copy(self, name):
+        """Copier name ; retourne le nombre d'octets copiés (0 si déjà présent et identique)"""
+        if not self.source.exists(name):
+            return None  # Vignette jamais générée, ou fichier perdu
+
+        size = self.source.size(name)
+        if self.destination.exists(name):
+            if self.destination.size(name) == size and (
+                self.verifier == 'taille'
+                or file_digest(self.source, name) == file_digest(self.destination, name)
+            ):
+                return 0
+            self.destination.delete(name)
+
+        with self.source.open(name) as f:
+            reader = HashingReader(f)
+            # _save() et non save() : conserver le nom exact, sans renommage
+            # (get_available_name) ni adressage par contenu
+            saved = self.destination._save(name, File(reader, name=name))
+        if saved != name:
+            raise CommandError(f"la destination a renommé le fichier en {saved}")
+
+        if self.destination.size(name) != reader.bytes_read:
+            raise CommandError("taille différente après copie")
+        if self.verifier == 'sha256' and file_digest(self.destination, name) != reader.digest.hexdigest():
+            raise CommandError("empreinte SHA-256 différente après copie")
+        return reader.bytes_read
+
+    def _copy_all(self, names, checkpoint, workers):
+        started = time.monotonic()
+        copied = skipped = missing = failed = total_bytes = 0
+
+        for index, (name, result, error) in enumerate(self._run(names, self._copy, workers), 1):
+            if error is not None:
+                failed += 1
+                self.stderr.write(f"  échec {name} : {error}")
+                continue
+            if result is None:
+                # Pas de checkpoint : le fichier sera recherché à nouveau s'il est restauré
+                missing += 1
+                self.stderr.write(f"  absent de la source {name}")
+                continue
+            checkpoint.mark(name)
+            if result == 0:
+                skipped += 1
+            else:
+                copied += 1
+                total_bytes += result
+
+            if index % 100 == 0:
+                self._progress(index, len(names), total_bytes, started)
+
+        self._progress(len(names), len(names), total_bytes, started)
+        self.stdout.write(self.style.SUCCESS(
+            f"{copied} copié(s), {skipped} déjà présent(s), {missing} absent(s) de la source, {failed} échec(s)"
+        ))
+
+    def _progress(self, done, total, total_bytes, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f"  {done}/{total} fichiers, {total_bytes / (1024 * 1024):.1f} Mo en {elapsed:.1f}s "
+            f"({done / elapsed:.1f} fichiers/s, {total_bytes / (1024 * 1024) / elapsed:.2f} Mo/s)"
+        )
@@ -0,0 +1,177 @@
+"""
+Supprime (ou met en quarantaine) les fichiers médias qui ne sont plus
+référencés en base : photos remplacées dans vetement_edit, vêtements et
+tenues supprimés, et leurs vignettes.
+
+    python manage.py nettoyer_medias_orphelins                 # rapport seul
+    python manage.py nettoyer_medias_orphelins --quarantaine   # déplacer sous .quarantaine/
+    python manage.py nettoyer_medias_orphelins --supprimer --delai-grace 48
+
+L'arborescence distante est parcourue en flux et les orphelins traités par
+lots : la mémoire utilisée ne dépend que du nombre de noms référencés
+(conservés sous forme d'empreintes de 16 octets), pas du nombre de fichiers.
+"""
+
+import hashlib
+import os
+import time
+from datetime import datetime
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from vetements.images import variant_root
+from vetements.management.commands.migrer_medias import resolve_storage
+from vetements.models import MediaBlob
+
+
+QUARANTINE_DIR = '.quarantaine'
+
+
+def _key(value):
+    return hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+
+
+class ReferenceSet:
+    """Noms référencés en base, et leurs racines (pour reconnaître les vignettes)"""
+
+    def __init__(self):
+        self._names = set()
+        self._roots = set()
+
+    def add(self, name):
+        self._names.add(_key(name))
+        self._roots.add(_key(os.path.splitext(name)[0]))
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        if _key(name) in self._names:
+            return True
+        root = variant_root(name)
+        return root is not None and _key(root) in self._roots
+
+
+def load_references():
+    references = ReferenceSet()
+    for model in apps.get_app_config('vetements').get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField):
+                queryset = model.objects.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+                for name in queryset.values_list(field.name, flat=True).iterator(chunk_size=2000):
+                    references.add(name)
+    return references
+
+
+def iter_files(storage, path=''):
+    """Produit (nom, taille, mtime) pour chaque fichier du storage, en flux"""
+    if hasattr(storage, 'walk'):
+        for name, attrs in storage.walk(path):
+            yield name, attrs.st_size or 0, attrs.st_mtime or 0
+        return
+
+    dirs, files = storage.listdir(path)
+    for filename in files:
+        name = os.path.join(path, filename) if path else filename
+        yield name, storage.size(name), storage.get_modified_time(name).timestamp()
+    for directory in dirs:
+        yield from iter_files(storage, os.path.join(path, directory) if path else directory)
+
+
+class Command(BaseCommand):
+    help = "Supprime ou met en quarantaine les médias qui ne sont plus référencés en base"
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument('--supprimer', action='store_true',
+                            help="Supprimer les orphelins")
+        action.add_argument('--quarantaine', action='store_true',
+                            help=f"Déplacer les orphelins sous {QUARANTINE_DIR}/<date>/")
+        parser.add_argument('--delai-grace', type=float, default=24,
+                            help="Ignorer les fichiers modifiés depuis moins de N heures (défaut: 24)")
+        parser.add_argument('--lot', type=int, default=500,
+                            help="Nombre de fichiers traités par lot (défaut: 500)")
+        parser.add_argument('--repertoire', default='',
+                            help="Limiter le parcours à un sous-répertoire (ex: vetements)")
+        parser.add_argument('--storage', default=default_storage,
+                            help="Chemin Python du storage à nettoyer (défaut: storage par défaut)")
+
+    def handle(self, *args, **options):
+        storage = resolve_storage(options['storage'])
+        if options['lot'] < 1:
+            raise CommandError("--lot doit être positif")
+
+        references = load_references()
+        self.stdout.write(f"{len(references)} fichier(s) référencé(s) en base")
+
+        if options['supprimer']:
+            action = 'supprimé(s)'
+        elif options['quarantaine']:
+            action = 'mis en quarantaine'
+        else:
+            action = 'à nettoyer (rapport seul)'
+        quarantine_prefix = os.path.join(QUARANTINE_DIR, datetime.now().strftime('%Y%m%d-%H%M%S'))
+        limit = time.time() - options['delai_grace'] * 3600
+
+        scanned = orphans = reclaimed = recent = 0
+        batch = []
+
+        def flush():
+            nonlocal reclaimed
+            if not batch:
+                return
+            names = [name for name, _ in batch]
+            sizes = dict(batch)
+            if options['supprimer']:
+                done = self._delete(storage, names)
+            elif options['quarantaine']:
+                done = self._quarantine(storage, names, quarantine_prefix)
+            else:
+                done = names
+            if options['supprimer'] or options['quarantaine']:
+                # Références périmées du stockage adressé par contenu
+                MediaBlob.objects.filter(nom__in=done).delete()
+            reclaimed += sum(sizes[name] for name in done)
+            batch.clear()
+
+        for name, size, mtime in iter_files(storage, options['repertoire']):
+            scanned += 1
+            if name.split('/', 1)[0] == QUARANTINE_DIR or name in references:
+                continue
+            if mtime > limit:
+                recent += 1  # Envoi peut-être en cours d'enregistrement
+                continue
+            orphans += 1
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"  {name} ({size} octets)")
+            batch.append((name, size))
+            if len(batch) >= options['lot']:
+                flush()
+        flush()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{scanned} fichier(s) parcouru(s), {orphans} orphelin(s) {action}, "
+            f"{recent} récent(s) ignoré(s), {reclaimed / (1024 * 1024):.1f} Mo récupéré(s)"
+        ))
+
+    @staticmethod
+    def _delete(storage, names):
+        if hasattr(storage, 'delete_many'):
+            return storage.delete_many(names)
+        for name in names:
+            storage.delete(name)
+        return names
+
+    @staticmethod
+    def _quarantine(storage, names, prefix):
+        moves = [(name, os.path.join(prefix, name)) for name in names]
+        if hasattr(storage, 'move_many'):
+            return storage.move_many(moves)
+        for old, new in moves:
+            with storage.open(old) as f:
+                storage.save(new, f)
+            storage.delete(old)
+        return names
@@ -0,0 +1,97 @@
+"""
+Reconstruit les compteurs d'UtilisationStockage (espace occupé par les
+photos de chaque utilisateur) à partir du storage.
+
+    python manage.py recalculer_quotas
+    python manage.py recalculer_quotas --dry-run
+
+Les compteurs sont tenus à jour à chaque envoi et suppression ; cette
+commande corrige les dérives (photos supprimées à la main, anciennes
+photos sans taille connue). Les tailles sont lues en un seul parcours des
+répertoires de photos, sans requête par fichier, puis les photos dont
+image_taille diffère sont corrigées par lots.
+"""
+
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from vetements.management.commands.migrer_medias import resolve_storage
+from vetements.management.commands.nettoyer_medias_orphelins import iter_files
+from vetements.models import Tenue, UtilisationStockage, Vetement
+
+
+MODELS = (Vetement, Tenue)
+
+
+class Command(BaseCommand):
+    help = "Recalcule l'espace de stockage utilisé par chaque utilisateur"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--storage', default=default_storage,
+                            help="Chemin Python du storage à parcourir (défaut: storage par défaut)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Afficher les écarts sans rien modifier")
+
+    def handle(self, *args, **options):
+        storage = resolve_storage(options['storage'])
+
+        sizes = {}
+        for model in MODELS:
+            directory = model._meta.get_field('image').upload_to.rstrip('/')
+            try:
+                for name, size, _ in iter_files(storage, directory):
+                    sizes[name] = size
+            except FileNotFoundError:
+                pass  # Aucune photo envoyée dans ce répertoire
+        self.stdout.write(f"{len(sizes)} fichier(s) parcouru(s)")
+
+        totals = defaultdict(lambda: [0, 0])
+        missing = 0
+        for model in MODELS:
+            corrections = []
+            rows = model.objects.exclude(image='').exclude(image__isnull=True).values_list(
+                'pk', 'proprietaire_id', 'image', 'image_taille'
+            )
+            for pk, proprietaire_id, image, image_taille in rows.iterator(chunk_size=2000):
+                size = sizes.get(image)
+                if size is None:
+                    missing += 1
+                    if options['verbosity'] >= 2:
+                        self.stdout.write(f"  Photo absente du storage : {image}")
+                    continue
+                totals[proprietaire_id][0] += size
+                totals[proprietaire_id][1] += 1
+                if size != image_taille:
+                    corrections.append(model(pk=pk, image_taille=size))
+            if corrections and not options['dry_run']:
+                model.objects.bulk_update(corrections, ['image_taille'], batch_size=500)
+            self.stdout.write(f"{model._meta.verbose_name_plural} : {len(corrections)} taille(s) corrigée(s)")
+
+        changed = 0
+        current = {
+            row.utilisateur_id: row for row in UtilisationStockage.objects.all()
+        }
+        with transaction.atomic():
+            for utilisateur_id in set(current) | set(totals):
+                octets, nombre_fichiers = totals.get(utilisateur_id, (0, 0))
+                row = current.get(utilisateur_id)
+                if row is not None and (row.octets, row.nombre_fichiers) == (octets, nombre_fichiers):
+                    continue
+                changed += 1
+                if options['verbosity'] >= 2:
+                    before = row.octets if row is not None else 0
+                    self.stdout.write(f"  Utilisateur {utilisateur_id} : {before} -> {octets} octets")
+                if not options['dry_run']:
+                    UtilisationStockage.objects.update_or_create(
+                        utilisateur_id=utilisateur_id,
+                        defaults={'octets': octets, 'nombre_fichiers': nombre_fichiers},
+                    )
+
+        prefix = "[dry-run] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{len(totals)} utilisateur(s) avec des photos, {changed} compteur(s) corrigé(s), "
+            f"{missing} photo(s) absente(s) du storage"
+        ))
@@ -0,0 +1,36 @@
+"""
+Reconstruit les statistiques de garde-robe (StatistiquesUtilisateur)
+depuis les tables, en quelques requêtes groupées.
+
+    python manage.py recalculer_statistiques
+    python manage.py recalculer_statistiques --utilisateur alice bob
+
+Les statistiques sont tenues à jour à chaque enregistrement ; cette
+commande sert après une mise à jour en masse (queryset.update(), import,
+restauration de sauvegarde) qui ne déclenche pas les signaux.
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from vetements.models import StatistiquesUtilisateur
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les statistiques de garde-robe des utilisateurs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--utilisateur', nargs='+',
+                            help="Noms des utilisateurs à recalculer (défaut: tous)")
+
+    def handle(self, *args, **options):
+        utilisateur_ids = None
+        if options['utilisateur']:
+            utilisateurs = dict(User.objects.filter(username__in=options['utilisateur']).values_list('username', 'pk'))
+            inconnus = set(options['utilisateur']) - set(utilisateurs)
+            if inconnus:
+                raise CommandError(f"Utilisateur(s) introuvable(s) : {', '.join(sorted(inconnus))}")
+            utilisateur_ids = utilisateurs.values()
+
+        total = StatistiquesUtilisateur.recalculer(utilisateur_ids)
+        self.stdout.write(self.style.SUCCESS(f"Statistiques recalculées pour {total} utilisateur(s)"))
@@ -0,0 +1,55 @@
+"""
+Rejoue le journal de réplication de TieredStorage et, avec --complet,
+vérifie que chaque fichier du niveau local existe aussi sur Unraid.
+
+    python manage.py reconcilier_medias             # rejouer le journal
+    python manage.py reconcilier_medias --complet   # + comparer les deux niveaux
+
+La réconciliation est aussi faite automatiquement au retour d'Unraid
+après une indisponibilité ; cette commande sert après une coupure longue,
+ou si le journal a été perdu.
+"""
+
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from vetements.management.commands.migrer_medias import resolve_storage
+
+
+class Command(BaseCommand):
+    help = "Rejoue le journal de réplication du stockage local vers Unraid"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--complet', action='store_true',
+                            help="Comparer aussi chaque fichier local avec Unraid")
+        parser.add_argument('--storage', default=default_storage,
+                            help="Chemin Python du storage (défaut: storage par défaut)")
+
+    def handle(self, *args, **options):
+        storage = resolve_storage(options['storage'])
+        if not hasattr(storage, '_get_replicator'):
+            raise CommandError("Le storage n'est pas un TieredStorage (vetements.storage.TieredStorage)")
+
+        replicator = storage._get_replicator()
+        if not replicator.health.check():
+            raise CommandError("Serveur distant injoignable, réconciliation impossible")
+
+        missing = 0
+        if options['complet']:
+            for root, _, files in os.walk(storage.local_root):
+                for filename in files:
+                    name = os.path.relpath(os.path.join(root, filename), storage.local_root)
+                    if replicator.journal.get(name) is None and not storage.replica.exists(name):
+                        replicator.journal.record('put', name)
+                        missing += 1
+            self.stdout.write(f"{missing} fichier(s) local(aux) absent(s) d'Unraid ajouté(s) au journal")
+
+        replayed = replicator.reconcile()
+        replicator.join()
+        remaining = len(replicator.journal.pending())
+        style = self.style.SUCCESS if not remaining else self.style.WARNING
+        self.stdout.write(style(
+            f"{replayed} réplication(s) rejouée(s), {remaining} encore en attente"
+        ))
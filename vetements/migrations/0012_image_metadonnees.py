@@ -0,0 +1,63 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vetements', '0011_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenue',
+            name='image_couleur',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Couleur moyenne de la photo'),
+        ),
+        migrations.AddField(
+            model_name='tenue',
+            name='image_format',
+            field=models.CharField(blank=True, editable=False, max_length=10, verbose_name='Format de la photo'),
+        ),
+        migrations.AddField(
+            model_name='tenue',
+            name='image_hauteur',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Hauteur de la photo (px)'),
+        ),
+        migrations.AddField(
+            model_name='tenue',
+            name='image_largeur',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Largeur de la photo (px)'),
+        ),
+        migrations.AddField(
+            model_name='tenue',
+            name='image_taille',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Poids de la photo (octets)'),
+        ),
+        migrations.AddField(
+            model_name='vetement',
+            name='image_couleur',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Couleur moyenne de la photo'),
+        ),
+        migrations.AddField(
+            model_name='vetement',
+            name='image_format',
+            field=models.CharField(blank=True, editable=False, max_length=10, verbose_name='Format de la photo'),
+        ),
+        migrations.AddField(
+            model_name='vetement',
+            name='image_hauteur',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Hauteur de la photo (px)'),
+        ),
+        migrations.AddField(
+            model_name='vetement',
+            name='image_largeur',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Largeur de la photo (px)'),
+        ),
+        migrations.AddField(
+            model_name='vetement',
+            name='image_taille',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Poids de la photo (octets)'),
+        ),
+    ]
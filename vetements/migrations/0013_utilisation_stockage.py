@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:37
+
+from collections import defaultdict
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def compteurs_initiaux(apps, schema_editor):
+    """
+    Compteurs des photos déjà enregistrées : nombre de photos et somme des
+    poids connus (recalculer_quotas complète ensuite les poids inconnus)
+    """
+    UtilisationStockage = apps.get_model('vetements', 'UtilisationStockage')
+    totaux = defaultdict(lambda: [0, 0])
+    for nom in ('Vetement', 'Tenue'):
+        lignes = apps.get_model('vetements', nom).objects.exclude(image='').exclude(image__isnull=True).values(
+            'proprietaire_id'
+        ).annotate(octets=models.Sum('image_taille'), nombre=models.Count('pk')).order_by()
+        for ligne in lignes:
+            total = totaux[ligne['proprietaire_id']]
+            total[0] += ligne['octets'] or 0
+            total[1] += ligne['nombre']
+    UtilisationStockage.objects.bulk_create([
+        UtilisationStockage(utilisateur_id=utilisateur_id, octets=octets, nombre_fichiers=nombre)
+        for utilisateur_id, (octets, nombre) in totaux.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('vetements', '0012_image_metadonnees'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parametressite',
+            name='quota_stockage',
+            field=models.IntegerField(default=500, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Quota de stockage par utilisateur (MB, 0 = illimité)'),
+        ),
+        migrations.CreateModel(
+            name='UtilisationStockage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('octets', models.BigIntegerField(default=0, verbose_name='Octets utilisés')),
+                ('nombre_fichiers', models.IntegerField(default=0, verbose_name='Nombre de photos')),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True, verbose_name='Dernière mise à jour')),
+                ('utilisateur', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='utilisation_stockage', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Utilisation du stockage',
+                'verbose_name_plural': 'Utilisations du stockage',
+            },
+        ),
+        migrations.RunPython(compteurs_initiaux, migrations.RunPython.noop),
+    ]
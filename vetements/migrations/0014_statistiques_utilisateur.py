@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('vetements', '0013_utilisation_stockage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiquesUtilisateur',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nb_vetements', models.IntegerField(default=0, verbose_name='Vêtements')),
+                ('nb_favoris', models.IntegerField(default=0, verbose_name='Favoris')),
+                ('nb_a_laver', models.IntegerField(default=0, verbose_name='À laver')),
+                ('nb_peu_portes', models.IntegerField(default=0, verbose_name='Peu portés')),
+                ('nb_jamais_portes', models.IntegerField(default=0, verbose_name='Jamais portés')),
+                ('total_depense', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Total dépensé (€)')),
+                ('total_portages', models.IntegerField(default=0, verbose_name='Total des portages')),
+                ('par_categorie', models.JSONField(blank=True, default=dict, verbose_name='Vêtements par catégorie')),
+                ('par_couleur', models.JSONField(blank=True, default=dict, verbose_name='Vêtements par couleur')),
+                ('nb_tenues', models.IntegerField(default=0, verbose_name='Tenues')),
+                ('nb_valises', models.IntegerField(default=0, verbose_name='Valises')),
+                ('nb_messages_recus', models.IntegerField(default=0, verbose_name='Messages reçus')),
+                ('nb_messages_envoyes', models.IntegerField(default=0, verbose_name='Messages envoyés')),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True, verbose_name='Dernière mise à jour')),
+                ('utilisateur', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistiques', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': "Statistiques d'un utilisateur",
+                'verbose_name_plural': 'Statistiques des utilisateurs',
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def historique_initial(apps, schema_editor):
+    """Seule date de portage connue avant l'historique : la dernière utilisation"""
+    Vetement = apps.get_model('vetements', 'Vetement')
+    Portage = apps.get_model('vetements', 'Portage')
+    lot = []
+    vetements = Vetement.objects.exclude(derniere_utilisation__isnull=True).values_list(
+        'pk', 'proprietaire_id', 'derniere_utilisation'
+    )
+    for pk, proprietaire_id, date in vetements.iterator(chunk_size=2000):
+        lot.append(Portage(vetement_id=pk, proprietaire_id=proprietaire_id, date=date))
+        if len(lot) >= 1000:
+            Portage.objects.bulk_create(lot)
+            lot = []
+    Portage.objects.bulk_create(lot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('vetements', '0014_statistiques_utilisateur'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Portage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('proprietaire', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='portages', to=settings.AUTH_USER_MODEL, verbose_name='Propriétaire')),
+                ('tenue', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='portages', to='vetements.tenue', verbose_name='Tenue')),
+                ('vetement', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='portages', to='vetements.vetement', verbose_name='Vêtement')),
+            ],
+            options={
+                'verbose_name': 'Portage',
+                'verbose_name_plural': 'Portages',
+                'indexes': [models.Index(fields=['proprietaire', 'date'], name='portage_proprietaire_date'), models.Index(fields=['vetement', 'date'], name='portage_vetement_date')],
+            },
+        ),
+        migrations.RunPython(historique_initial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:53
+
+from django.db import migrations, models
+import vetements.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vetements', '0015_portage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statistiquesutilisateur',
+            name='version',
+            field=models.BigIntegerField(default=vetements.models.version_initiale, editable=False, verbose_name='Version de la garde-robe'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+import vetements.recherche
+
+
+def creer_index(apps, schema_editor):
+    """Créer l'index plein texte selon la base et y indexer les vêtements existants"""
+    vetements.recherche.creer_index(schema_editor.connection)
+    vetements.recherche.reconstruire(apps.get_model('vetements', 'Vetement'), schema_editor.connection)
+
+
+def supprimer_index(apps, schema_editor):
+    vetements.recherche.supprimer_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vetements', '0016_version_statistiques'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexRecherche',
+            fields=[
+                ('vetement', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='index_recherche', serialize=False, to='vetements.vetement')),
+                ('document', vetements.recherche.DocumentRecherche()),
+            ],
+            options={
+                'db_table': 'vetements_recherche',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
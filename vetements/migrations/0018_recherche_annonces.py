@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import vetements.recherche_annonces
+
+
+def index_trigrammes(apps, schema_editor):
+    """Index pg_trgm sous PostgreSQL, puis documents des annonces en vente"""
+    if vetements.recherche_annonces.trigrammes_natifs(schema_editor.connection):
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            'CREATE INDEX documentannonce_texte_trgm ON vetements_documentannonce USING gin (texte gin_trgm_ops)'
+        )
+    vetements.recherche_annonces.reconstruire(apps, schema_editor.connection)
+
+
+def supprimer_index_trigrammes(apps, schema_editor):
+    if vetements.recherche_annonces.trigrammes_natifs(schema_editor.connection):
+        schema_editor.execute('DROP INDEX IF EXISTS documentannonce_texte_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vetements', '0017_recherche'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentAnnonce',
+            fields=[
+                ('annonce', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document_recherche', serialize=False, to='vetements.annoncevente', verbose_name='Annonce')),
+                ('texte', vetements.recherche_annonces.TexteRecherche(verbose_name='Texte')),
+                ('horodatage', models.BigIntegerField(verbose_name='Publication (secondes)')),
+            ],
+            options={
+                'verbose_name': 'Document de recherche',
+                'verbose_name_plural': 'Documents de recherche',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrigrammeAnnonce',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigramme', models.CharField(max_length=3, verbose_name='Trigramme')),
+                ('annonce', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='trigrammes', to='vetements.annoncevente', verbose_name='Annonce')),
+            ],
+            options={
+                'verbose_name': 'Trigramme',
+                'verbose_name_plural': 'Trigrammes',
+                'indexes': [models.Index(fields=['trigramme', 'annonce'], name='trigramme_annonce'), models.Index(fields=['annonce'], name='trigramme_par_annonce')],
+            },
+        ),
+        migrations.RunPython(index_trigrammes, supprimer_index_trigrammes),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('vetements', '0018_recherche_annonces'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='annoncevente',
+            index=models.Index(condition=models.Q(('statut', 'en_vente')), fields=['date_publication', 'id'], name='annonce_en_vente'),
+        ),
+        migrations.AddIndex(
+            model_name='annoncevente',
+            index=models.Index(fields=['vendeur', 'date_publication', 'id'], name='annonce_vendeur_date'),
+        ),
+        migrations.AddIndex(
+            model_name='evenementtenue',
+            index=models.Index(fields=['proprietaire', 'date', 'heure_debut'], name='evenement_proprietaire_date'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('archive_destinataire', False)), fields=['destinataire', 'date_envoi', 'id'], name='message_recus'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('archive_expediteur', False)), fields=['expediteur', 'date_envoi', 'id'], name='message_envoyes'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('archive_destinataire', False), ('lu', False)), fields=['destinataire'], name='message_non_lus'),
+        ),
+        migrations.AddIndex(
+            model_name='tenue',
+            index=models.Index(fields=['proprietaire', 'date_creation', 'id'], name='tenue_proprietaire_date'),
+        ),
+        migrations.AddIndex(
+            model_name='vetement',
+            index=models.Index(fields=['proprietaire', 'date_ajout', 'id'], name='vetement_proprietaire_date'),
+        ),
+        migrations.AddIndex(
+            model_name='vetement',
+            index=models.Index(condition=models.Q(('a_laver', True)), fields=['proprietaire', 'date_ajout', 'id'], name='vetement_a_laver'),
+        ),
+        # Index des clés étrangères couverts par les index composites ci-dessus
+        migrations.AlterField(
+            model_name='annoncevente',
+            name='vendeur',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='annonces_vente', to=settings.AUTH_USER_MODEL, verbose_name='Vendeur'),
+        ),
+        migrations.AlterField(
+            model_name='evenementtenue',
+            name='proprietaire',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='evenements', to=settings.AUTH_USER_MODEL, verbose_name='Propriétaire'),
+        ),
+        migrations.AlterField(
+            model_name='tenue',
+            name='proprietaire',
+            field=models.ForeignKey(db_index=False, default=1, on_delete=django.db.models.deletion.CASCADE, related_name='tenues', to=settings.AUTH_USER_MODEL, verbose_name='Propriétaire'),
+        ),
+        migrations.AlterField(
+            model_name='vetement',
+            name='proprietaire',
+            field=models.ForeignKey(db_index=False, default=1, on_delete=django.db.models.deletion.CASCADE, related_name='vetements', to=settings.AUTH_USER_MODEL, verbose_name='Propriétaire'),
+        ),
+    ]
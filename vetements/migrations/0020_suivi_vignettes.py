@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vetements', '0019_index_requetes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenue',
+            name='image_vignettes',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Vignettes de la photo générées'),
+        ),
+        migrations.AddField(
+            model_name='tenue',
+            name='image_vignettes_echec',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Dernier échec de génération des vignettes'),
+        ),
+        migrations.AddField(
+            model_name='vetement',
+            name='image_vignettes',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Vignettes de la photo générées'),
+        ),
+        migrations.AddField(
+            model_name='vetement',
+            name='image_vignettes_echec',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Dernier échec de génération des vignettes'),
+        ),
+    ]
@@ -1,7 +1,114 @@
-from django.db import models
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import User
 
+from . import recherche, recherche_annonces
+from .images import empty_image_metadata, image_metadata, schedule_variants
+
+
+def au_plus_tard(champ, jour):
+    """Expression : la plus récente des dates champ (éventuellement vide) et jour"""
+    return Greatest(Coalesce(champ, Value(jour)), Value(jour))
+
+
+class ImageMetadataMixin(models.Model):
+    """
+    Métadonnées de la photo (champ image) conservées en base, pour que les
+    listes puissent afficher dimensions et couleur d'attente sans ouvrir
+    le fichier. Elles sont renseignées à l'envoi d'une nouvelle photo ;
+    la commande completer_metadonnees_images complète les plus anciennes.
+
+    Le poids des photos est aussi reporté dans UtilisationStockage du
+    propriétaire à chaque changement de photo, sans accès au storage.
+
+    image_vignettes note que les vignettes existent, image_vignettes_echec
+    la date du dernier échec de leur génération : les filtres de image_tags
+    n'interrogent le storage que pour les photos dont l'état est inconnu, et
+    ne relancent une génération en échec qu'après NOUVEL_ESSAI_VIGNETTES.
+    """
+    image_largeur = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Largeur de la photo (px)")
+    image_hauteur = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Hauteur de la photo (px)")
+    image_taille = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Poids de la photo (octets)")
+    image_format = models.CharField(max_length=10, blank=True, editable=False, verbose_name="Format de la photo")
+    image_couleur = models.CharField(max_length=7, blank=True, editable=False, verbose_name="Couleur moyenne de la photo")
+    image_vignettes = models.BooleanField(default=False, editable=False, verbose_name="Vignettes de la photo générées")
+    image_vignettes_echec = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Dernier échec de génération des vignettes")
+
+    NOUVEL_ESSAI_VIGNETTES = timedelta(hours=6)
+
+    class Meta:
+        abstract = True
+
+    def _update_image_metadata(self):
+        """Renseigner les champs image_* avant l'enregistrement, retourne True si la photo est nouvelle"""
+        if not self.image:
+            if self.image_largeur is not None:
+                for field, value in empty_image_metadata().items():
+                    setattr(self, field, value)
+            return False
+        if self.image._committed:
+            return False
+        try:
+            metadata = image_metadata(self.image.file)
+        except Exception:
+            # Photo illisible : enregistrée sans métadonnées, complétées plus tard
+            metadata = empty_image_metadata()
+        for field, value in metadata.items():
+            setattr(self, field, value)
+        return True
+
+    def attach_image(self, name, size):
+        """
+        Associer une photo déjà déposée dans le storage (envoi direct au
+        serveur média) : seul le poids est connu, le reste des métadonnées
+        est complété par completer_metadonnees_images.
+        """
+        self.image = name
+        for field, value in empty_image_metadata().items():
+            setattr(self, field, value)
+        self.image_taille = size
+        self._image_attachee = True
+
+    def _image_modifiee(self):
+        """La photo est-elle remplacée, ajoutée ou retirée par cet enregistrement ?"""
+        if self.image:
+            return not self.image._committed or '_image_attachee' in self.__dict__
+        return self.image_taille is not None
+
+    def save(self, *args, **kwargs):
+        ancienne_taille, ancien_fichier = 0, 0
+        image_modifiee = self._image_modifiee()
+        if image_modifiee and self.pk:
+            ancienne = type(self).objects.filter(pk=self.pk).values('image', 'image_taille').first()
+            if ancienne and ancienne['image']:
+                ancienne_taille, ancien_fichier = ancienne['image_taille'] or 0, 1
+
+        nouvelle_image = self._update_image_metadata() or self.__dict__.pop('_image_attachee', False)
+        if image_modifiee:
+            self.image_vignettes, self.image_vignettes_echec = False, None
+        super().save(*args, **kwargs)
+        if image_modifiee:
+            UtilisationStockage.ajuster(
+                self.proprietaire_id,
+                (self.image_taille or 0) - ancienne_taille,
+                (1 if self.image else 0) - ancien_fichier,
+            )
+        if nouvelle_image:
+            # Vignettes générées en tâche de fond une fois la photo enregistrée
+            name = self.image.name
+            transaction.on_commit(lambda: schedule_variants(name, noter_vignettes))
+
+
 # Create your models here.
 
 class Categorie(models.Model):
@@ -54,7 +161,7 @@ class Taille(models.Model):
         return self.nom
 
 
-class Vetement(models.Model):
+class Vetement(ImageMetadataMixin):
     """Vêtement dans la garde-robe"""
     GENRE_CHOICES = [
         ('homme', 'Homme'),
@@ -80,7 +187,7 @@ class Vetement(models.Model):
     ]
 
     # Propriétaire
-    proprietaire = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vetements', verbose_name="Propriétaire", default=1)
+    proprietaire = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vetements', db_index=False, verbose_name="Propriétaire", default=1)
 
     # Informations principales
     nom = models.CharField(max_length=200, verbose_name="Nom", help_text="Ex: T-shirt bleu Nike")
@@ -129,6 +236,15 @@ class Vetement(models.Model):
         verbose_name = "Vêtement"
         verbose_name_plural = "Vêtements"
         ordering = ['-date_ajout']
+        indexes = [
+            # Listes par propriétaire dans l'ordre d'affichage (pagination par curseur)
+            models.Index(fields=['proprietaire', 'date_ajout', 'id'], name='vetement_proprietaire_date'),
+            # Partiel : seuls les vêtements à laver (entretien, filtre de la liste)
+            models.Index(fields=['proprietaire', 'date_ajout', 'id'], condition=Q(a_laver=True), name='vetement_a_laver'),
+        ]
+
+    # En dessous de ce nombre de portages, un vêtement est « peu porté »
+    SEUIL_PEU_PORTE = 3
 
     def __str__(self):
         return self.nom
@@ -143,18 +259,23 @@ class Vetement(models.Model):
     @property
     def peu_porte(self):
         """Vérifie si le vêtement est peu porté (moins de 3 fois)"""
-        return self.nombre_portage < 3
+        return self.nombre_portage < self.SEUIL_PEU_PORTE
 
     @property
     def besoin_entretien(self):
         """Vérifie si le vêtement nécessite un entretien"""
         return self.a_laver or self.a_repasser or self.etat == 'reparer'
 
+    def porter(self, jour=None):
+        """Enregistrer un portage du vêtement (aujourd'hui par défaut)"""
+        Portage.enregistrer([self], jour)
+        self.refresh_from_db(fields=['nombre_portage', 'derniere_utilisation'])
 
-class Tenue(models.Model):
+
+class Tenue(ImageMetadataMixin):
     """Tenue composée de plusieurs vêtements"""
     # Propriétaire
-    proprietaire = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tenues', verbose_name="Propriétaire", default=1)
+    proprietaire = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tenues', db_index=False, verbose_name="Propriétaire", default=1)
 
     nom = models.CharField(max_length=200, verbose_name="Nom de la tenue", help_text="Ex: Bureau casual, Soirée été")
     description = models.TextField(blank=True, verbose_name="Description")
@@ -184,10 +305,103 @@ class Tenue(models.Model):
         verbose_name = "Tenue"
         verbose_name_plural = "Tenues"
         ordering = ['-date_creation']
+        indexes = [
+            models.Index(fields=['proprietaire', 'date_creation', 'id'], name='tenue_proprietaire_date'),
+        ]
 
     def __str__(self):
         return self.nom
 
+    def porter(self, jour=None):
+        """Enregistrer un portage de la tenue et de chacun de ses vêtements (aujourd'hui par défaut)"""
+        jour = jour or timezone.localdate()
+        with transaction.atomic():
+            Portage.enregistrer(self.vetements.values_list('pk', flat=True), jour, tenue=self)
+            Tenue.objects.filter(pk=self.pk).update(
+                nombre_fois_portee=F('nombre_fois_portee') + 1,
+                derniere_fois_portee=au_plus_tard('derniere_fois_portee', jour),
+            )
+        self.refresh_from_db(fields=['nombre_fois_portee', 'derniere_fois_portee'])
+
+
+def noter_vignettes(name, ready):
+    """Noter sur les vêtements et tenues dont la photo est name le résultat de la génération de ses vignettes"""
+    valeurs = {'image_vignettes': True, 'image_vignettes_echec': None} if ready else {'image_vignettes_echec': timezone.now()}
+    for modele in (Vetement, Tenue):
+        # update() : ni signaux ni nouvelle version de la garde-robe
+        modele.objects.filter(image=name).update(**valeurs)
+
+
+class Portage(models.Model):
+    """
+    Historique des portages : une ligne par vêtement porté et par jour,
+    jamais modifiée. Les index composites (propriétaire, date) et
+    (vêtement, date) servent les séries temporelles des statistiques par
+    parcours d'intervalle. nombre_portage et derniere_utilisation du
+    vêtement restent les compteurs de référence.
+    """
+    proprietaire = models.ForeignKey(User, on_delete=models.CASCADE, related_name='portages', db_index=False, verbose_name="Propriétaire")
+    vetement = models.ForeignKey(Vetement, on_delete=models.CASCADE, related_name='portages', db_index=False, verbose_name="Vêtement")
+    tenue = models.ForeignKey(Tenue, on_delete=models.SET_NULL, null=True, blank=True, related_name='portages', verbose_name="Tenue")
+    date = models.DateField(verbose_name="Date")
+
+    class Meta:
+        verbose_name = "Portage"
+        verbose_name_plural = "Portages"
+        indexes = [
+            models.Index(fields=['proprietaire', 'date'], name='portage_proprietaire_date'),
+            models.Index(fields=['vetement', 'date'], name='portage_vetement_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.vetement} porté le {self.date.strftime('%d/%m/%Y')}"
+
+    @classmethod
+    def enregistrer(cls, vetements, jour=None, tenue=None):
+        """
+        Enregistrer un portage de chaque vêtement de vetements (instances ou
+        identifiants) à jour, aujourd'hui par défaut : un seul insert dans
+        l'historique et une seule mise à jour des compteurs par F().
+        Retourne le nombre de portages enregistrés.
+        """
+        jour = jour or timezone.localdate()
+        ids = {getattr(vetement, 'pk', vetement) for vetement in vetements}
+        if not ids:
+            return 0
+        with transaction.atomic():
+            avant = list(Vetement.objects.select_for_update().filter(pk__in=ids).values(
+                'pk', *StatistiquesUtilisateur.CHAMPS_VETEMENT
+            ))
+            cls.objects.bulk_create([
+                cls(vetement_id=valeurs['pk'], proprietaire_id=valeurs['proprietaire_id'], tenue=tenue, date=jour)
+                for valeurs in avant
+            ])
+            Vetement.objects.filter(pk__in=ids).update(
+                nombre_portage=F('nombre_portage') + 1,
+                derniere_utilisation=au_plus_tard('derniere_utilisation', jour),
+            )
+            # update() ne déclenche pas les signaux des statistiques
+            StatistiquesUtilisateur.ajuster_vetements([
+                (valeurs, dict(valeurs, nombre_portage=valeurs['nombre_portage'] + 1)) for valeurs in avant
+            ])
+        return len(avant)
+
+
+class IndexRecherche(models.Model):
+    """
+    Index de recherche plein texte des vêtements (voir recherche.py) : table
+    créée par migration selon la base (tsvector et index GIN sous PostgreSQL,
+    table virtuelle FTS5 sous SQLite), déclarée ici pour les jointures
+    (Vetement.objects.filter(index_recherche__document__correspond=...)).
+    """
+    vetement = models.OneToOneField(Vetement, on_delete=models.DO_NOTHING, primary_key=True, db_constraint=False,
+                                    related_name='index_recherche')
+    document = recherche.DocumentRecherche()
+
+    class Meta:
+        managed = False
+        db_table = recherche.TABLE
+
 
 class Valise(models.Model):
     """Valise/bagage pour les voyages"""
@@ -371,6 +585,15 @@ class Message(models.Model):
         verbose_name = "Message"
         verbose_name_plural = "Messages"
         ordering = ['-date_envoi']
+        indexes = [
+            # Partiels : boîte de réception et messages envoyés non archivés, des plus récents aux plus anciens
+            models.Index(fields=['destinataire', 'date_envoi', 'id'], condition=Q(archive_destinataire=False),
+                         name='message_recus'),
+            models.Index(fields=['expediteur', 'date_envoi', 'id'], condition=Q(archive_expediteur=False),
+                         name='message_envoyes'),
+            # Partiel : messages non lus (compteur affiché sur toutes les pages)
+            models.Index(fields=['destinataire'], condition=Q(lu=False, archive_destinataire=False), name='message_non_lus'),
+        ]
 
     def __str__(self):
         return f"{self.sujet} - De {self.expediteur.username} à {self.destinataire.username}"
@@ -418,7 +641,7 @@ class AnnonceVente(models.Model):
     ]
 
     vetement = models.OneToOneField(Vetement, on_delete=models.CASCADE, related_name='annonce_vente', verbose_name="Vêtement")
-    vendeur = models.ForeignKey(User, on_delete=models.CASCADE, related_name='annonces_vente', verbose_name="Vendeur")
+    vendeur = models.ForeignKey(User, on_delete=models.CASCADE, related_name='annonces_vente', db_index=False, verbose_name="Vendeur")
 
     prix_vente = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)], verbose_name="Prix de vente (€)")
     description_vente = models.TextField(blank=True, verbose_name="Description pour la vente", help_text="Informations supplémentaires pour l'acheteur")
@@ -436,6 +659,11 @@ class AnnonceVente(models.Model):
         verbose_name = "Annonce de vente"
         verbose_name_plural = "Annonces de vente"
         ordering = ['-date_publication']
+        indexes = [
+            # Partiel : le marketplace ne lit que les annonces en vente, des plus récentes aux plus anciennes
+            models.Index(fields=['date_publication', 'id'], condition=Q(statut='en_vente'), name='annonce_en_vente'),
+            models.Index(fields=['vendeur', 'date_publication', 'id'], name='annonce_vendeur_date'),
+        ]
 
     def __str__(self):
         return f"{self.vetement.nom} - {self.prix_vente}€ ({self.get_statut_display()})"
@@ -446,6 +674,41 @@ class AnnonceVente(models.Model):
         return self.statut == 'en_vente'
 
 
+class DocumentAnnonce(models.Model):
+    """
+    Document de recherche d'une annonce en vente (voir recherche_annonces.py) :
+    texte normalisé du vêtement et de l'annonce, et date de publication en
+    secondes pour le calcul de fraîcheur. Supprimé quand l'annonce n'est
+    plus en vente.
+    """
+    annonce = models.OneToOneField(AnnonceVente, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='document_recherche', verbose_name="Annonce")
+    texte = recherche_annonces.TexteRecherche(verbose_name="Texte")
+    horodatage = models.BigIntegerField(verbose_name="Publication (secondes)")
+
+    class Meta:
+        verbose_name = "Document de recherche"
+        verbose_name_plural = "Documents de recherche"
+
+
+class TrigrammeAnnonce(models.Model):
+    """
+    Trigrammes du document de recherche d'une annonce en vente, pour la
+    recherche approchée sur les bases sans pg_trgm
+    """
+    annonce = models.ForeignKey(AnnonceVente, on_delete=models.CASCADE, related_name='trigrammes',
+                                db_index=False, verbose_name="Annonce")
+    trigramme = models.CharField(max_length=3, verbose_name="Trigramme")
+
+    class Meta:
+        verbose_name = "Trigramme"
+        verbose_name_plural = "Trigrammes"
+        indexes = [
+            models.Index(fields=['trigramme', 'annonce'], name='trigramme_annonce'),
+            models.Index(fields=['annonce'], name='trigramme_par_annonce'),
+        ]
+
+
 class FavoriAnnonce(models.Model):
     """Système de favoris pour les annonces"""
     utilisateur = models.ForeignKey(User, on_delete=models.CASCADE, related_name='annonces_favorites', verbose_name="Utilisateur")
@@ -572,6 +835,7 @@ class ParametresSite(models.Model):
     max_tenues_par_user = models.IntegerField(default=200, validators=[MinValueValidator(1)], verbose_name="Max tenues par utilisateur")
     max_valises_par_user = models.IntegerField(default=50, validators=[MinValueValidator(1)], verbose_name="Max valises par utilisateur")
     taille_max_image = models.IntegerField(default=5, validators=[MinValueValidator(1)], verbose_name="Taille max image (MB)")
+    quota_stockage = models.IntegerField(default=500, validators=[MinValueValidator(0)], verbose_name="Quota de stockage par utilisateur (MB, 0 = illimité)")
     
     # Modération
     moderation_active = models.BooleanField(default=False, verbose_name="Modération activée")
@@ -704,7 +968,7 @@ class EvenementTenue(models.Model):
     ]
 
     # Propriétaire
-    proprietaire = models.ForeignKey(User, on_delete=models.CASCADE, related_name='evenements', verbose_name="Propriétaire")
+    proprietaire = models.ForeignKey(User, on_delete=models.CASCADE, related_name='evenements', db_index=False, verbose_name="Propriétaire")
 
     # Informations de l'événement
     titre = models.CharField(max_length=200, verbose_name="Titre", help_text="Ex: Réunion client, Dîner restaurant")
@@ -741,6 +1005,9 @@ class EvenementTenue(models.Model):
         verbose_name = "Événement"
         verbose_name_plural = "Événements"
         ordering = ['date', 'heure_debut']
+        indexes = [
+            models.Index(fields=['proprietaire', 'date', 'heure_debut'], name='evenement_proprietaire_date'),
+        ]
 
     def __str__(self):
         return f"{self.titre} - {self.date.strftime('%d/%m/%Y')}"
@@ -762,3 +1029,424 @@ class EvenementTenue(models.Model):
         """Vérifie si l'événement est à venir"""
         from datetime import date
         return self.date > date.today()
+
+
+class MediaBlob(models.Model):
+    """
+    Fichier stocké sous un nom dérivé de son contenu (stockage adressé par
+    contenu). Plusieurs envois identiques partagent le même fichier ;
+    references compte les envois encore actifs pour ne supprimer le fichier
+    qu'une fois le dernier retiré.
+    """
+    nom = models.CharField(max_length=255, unique=True, verbose_name="Nom du fichier")
+    references = models.PositiveIntegerField(default=0, verbose_name="Nombre de références")
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+
+    class Meta:
+        verbose_name = "Fichier média"
+        verbose_name_plural = "Fichiers médias"
+
+    def __str__(self):
+        return f"{self.nom} ({self.references})"
+
+
+class UtilisationStockage(models.Model):
+    """
+    Espace occupé par les photos (Vetement et Tenue) d'un utilisateur,
+    tenu à jour à chaque changement de photo (ImageMetadataMixin) et à
+    chaque suppression. Le quota se vérifie ainsi sans interroger le
+    storage ; recalculer_quotas reconstruit les compteurs depuis le storage.
+    """
+    utilisateur = models.OneToOneField(User, on_delete=models.CASCADE, related_name='utilisation_stockage', verbose_name="Utilisateur")
+    octets = models.BigIntegerField(default=0, verbose_name="Octets utilisés")
+    nombre_fichiers = models.IntegerField(default=0, verbose_name="Nombre de photos")
+    date_mise_a_jour = models.DateTimeField(auto_now=True, verbose_name="Dernière mise à jour")
+
+    class Meta:
+        verbose_name = "Utilisation du stockage"
+        verbose_name_plural = "Utilisations du stockage"
+
+    def __str__(self):
+        return f"{self.utilisateur.username} : {self.octets / (1024 * 1024):.1f} Mo"
+
+    @classmethod
+    def ajuster(cls, utilisateur_id, octets, nombre_fichiers):
+        """Ajouter octets et nombre_fichiers (éventuellement négatifs) aux compteurs de l'utilisateur"""
+        if not (octets or nombre_fichiers) or utilisateur_id is None:
+            return
+        mis_a_jour = cls.objects.filter(utilisateur_id=utilisateur_id).update(
+            octets=F('octets') + octets,
+            nombre_fichiers=F('nombre_fichiers') + nombre_fichiers,
+        )
+        if not mis_a_jour and (octets > 0 or nombre_fichiers > 0):
+            # Pas de création pour une baisse : l'utilisateur est peut-être
+            # en cours de suppression (cascade), recalculer_quotas rattrape
+            cls.objects.get_or_create(utilisateur_id=utilisateur_id)
+            cls.objects.filter(utilisateur_id=utilisateur_id).update(
+                octets=F('octets') + octets,
+                nombre_fichiers=F('nombre_fichiers') + nombre_fichiers,
+            )
+
+    @classmethod
+    def octets_utilises(cls, utilisateur_id):
+        return cls.objects.filter(utilisateur_id=utilisateur_id).values_list('octets', flat=True).first() or 0
+
+
+@receiver(post_delete, sender=Vetement)
+@receiver(post_delete, sender=Tenue)
+def liberer_stockage(sender, instance, **kwargs):
+    """Retirer la photo d'un vêtement ou d'une tenue supprimé(e) des compteurs du propriétaire"""
+    if instance.image:
+        UtilisationStockage.ajuster(instance.proprietaire_id, -(instance.image_taille or 0), -1)
+
+
+def version_initiale():
+    """
+    Première version de la garde-robe d'un utilisateur : l'heure en
+    microsecondes, pour qu'une ligne recréée ne retrouve pas en cache les
+    valeurs d'une ancienne ligne de même utilisateur.
+    """
+    return time.time_ns() // 1000
+
+
+class StatistiquesUtilisateur(models.Model):
+    """
+    Statistiques de la garde-robe d'un utilisateur, tenues à jour à chaque
+    enregistrement ou suppression de Vetement, Tenue, Valise et Message :
+    l'accueil et le profil les lisent en une seule requête, quelle que soit
+    la taille de la garde-robe.
+
+    La ligne est construite depuis les tables à la première lecture
+    (pour), puis ajustée par les signaux ci-dessous ;
+    recalculer_statistiques la reconstruit après des mises à jour en masse.
+    Les répartitions sont indexées par identifiant de catégorie ou de
+    couleur.
+
+    version change à chaque écriture de Vetement, Tenue, Valise ou
+    EvenementTenue de l'utilisateur : elle sert de clé aux statistiques
+    mises en cache (vetements.cache_statistiques).
+    """
+    utilisateur = models.OneToOneField(User, on_delete=models.CASCADE, related_name='statistiques', verbose_name="Utilisateur")
+
+    nb_vetements = models.IntegerField(default=0, verbose_name="Vêtements")
+    nb_favoris = models.IntegerField(default=0, verbose_name="Favoris")
+    nb_a_laver = models.IntegerField(default=0, verbose_name="À laver")
+    nb_peu_portes = models.IntegerField(default=0, verbose_name="Peu portés")
+    nb_jamais_portes = models.IntegerField(default=0, verbose_name="Jamais portés")
+    total_depense = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Total dépensé (€)")
+    total_portages = models.IntegerField(default=0, verbose_name="Total des portages")
+    par_categorie = models.JSONField(default=dict, blank=True, verbose_name="Vêtements par catégorie")
+    par_couleur = models.JSONField(default=dict, blank=True, verbose_name="Vêtements par couleur")
+
+    nb_tenues = models.IntegerField(default=0, verbose_name="Tenues")
+    nb_valises = models.IntegerField(default=0, verbose_name="Valises")
+    nb_messages_recus = models.IntegerField(default=0, verbose_name="Messages reçus")
+    nb_messages_envoyes = models.IntegerField(default=0, verbose_name="Messages envoyés")
+
+    version = models.BigIntegerField(default=version_initiale, editable=False, verbose_name="Version de la garde-robe")
+    date_mise_a_jour = models.DateTimeField(auto_now=True, verbose_name="Dernière mise à jour")
+
+    # Champs d'un vêtement dont dépendent les statistiques
+    CHAMPS_VETEMENT = ('proprietaire_id', 'categorie_id', 'couleur_id', 'favori', 'a_laver', 'nombre_portage', 'prix_achat')
+    COMPTEURS = (
+        'nb_vetements', 'nb_favoris', 'nb_a_laver', 'nb_peu_portes', 'nb_jamais_portes', 'total_depense',
+        'total_portages', 'nb_tenues', 'nb_valises', 'nb_messages_recus', 'nb_messages_envoyes',
+    )
+    REPARTITIONS = ('par_categorie', 'par_couleur')
+
+    class Meta:
+        verbose_name = "Statistiques d'un utilisateur"
+        verbose_name_plural = "Statistiques des utilisateurs"
+
+    def __str__(self):
+        return f"Statistiques de {self.utilisateur.username}"
+
+    @classmethod
+    def pour(cls, utilisateur):
+        """Statistiques de l'utilisateur, construites depuis les tables si elles n'existent pas encore"""
+        statistiques = cls.objects.filter(utilisateur=utilisateur).first()
+        if statistiques is None:
+            try:
+                cls.recalculer([utilisateur.pk])
+            except IntegrityError:
+                pass  # Construites en même temps par une autre requête
+            statistiques = cls.objects.get(utilisateur=utilisateur)
+        return statistiques
+
+    @classmethod
+    def invalider(cls, *utilisateur_ids):
+        """Changer la version de la garde-robe des utilisateurs (statistiques en cache périmées)"""
+        cls.objects.filter(utilisateur_id__in=utilisateur_ids).update(version=F('version') + 1)
+
+    def top_categories(self, limite=5):
+        """Catégories les plus représentées : [{'categorie__nom', 'count'}]"""
+        top = sorted(self.par_categorie.items(), key=lambda item: -item[1])[:limite]
+        noms = dict(Categorie.objects.filter(pk__in=[int(pk) for pk, _ in top]).values_list('pk', 'nom'))
+        return [{'categorie__nom': noms[int(pk)], 'count': count} for pk, count in top if int(pk) in noms]
+
+    @staticmethod
+    def contribution(valeurs):
+        """Compteurs et répartitions apportés par un vêtement (valeurs de CHAMPS_VETEMENT)"""
+        nombre_portage = valeurs['nombre_portage'] or 0
+        compteurs = {
+            'nb_vetements': 1,
+            'nb_favoris': int(bool(valeurs['favori'])),
+            'nb_a_laver': int(bool(valeurs['a_laver'])),
+            'nb_peu_portes': int(nombre_portage < Vetement.SEUIL_PEU_PORTE),
+            'nb_jamais_portes': int(nombre_portage == 0),
+            'total_depense': Decimal(str(valeurs['prix_achat'] or 0)),
+            'total_portages': nombre_portage,
+        }
+        repartitions = {
+            'par_categorie': {valeurs['categorie_id']: 1},
+            'par_couleur': {valeurs['couleur_id']: 1} if valeurs['couleur_id'] is not None else {},
+        }
+        return compteurs, repartitions
+
+    @classmethod
+    def ajuster(cls, utilisateur_id, compteurs, repartitions=None):
+        """
+        Ajouter compteurs ({champ: delta}) et repartitions ({champ: {clé: delta}})
+        aux statistiques de l'utilisateur, en changeant sa version. Sans ligne
+        existante, rien n'est fait : elle sera construite complète à la
+        première lecture.
+        """
+        compteurs = {champ: delta for champ, delta in compteurs.items() if delta}
+        repartitions = {
+            champ: {str(cle): delta for cle, delta in deltas.items() if delta}
+            for champ, deltas in (repartitions or {}).items()
+        }
+        repartitions = {champ: deltas for champ, deltas in repartitions.items() if deltas}
+        if utilisateur_id is None or not (compteurs or repartitions):
+            return
+
+        if not repartitions:
+            cls.objects.filter(utilisateur_id=utilisateur_id).update(
+                date_mise_a_jour=timezone.now(),
+                version=F('version') + 1,
+                **{champ: F(champ) + delta for champ, delta in compteurs.items()},
+            )
+            return
+
+        # Les répartitions (JSON) se modifient ligne verrouillée
+        with transaction.atomic():
+            statistiques = cls.objects.select_for_update().filter(utilisateur_id=utilisateur_id).first()
+            if statistiques is None:
+                return
+            for champ, delta in compteurs.items():
+                setattr(statistiques, champ, getattr(statistiques, champ) + delta)
+            for champ, deltas in repartitions.items():
+                repartition = getattr(statistiques, champ)
+                for cle, delta in deltas.items():
+                    total = repartition.get(cle, 0) + delta
+                    if total > 0:
+                        repartition[cle] = total
+                    else:
+                        repartition.pop(cle, None)
+            statistiques.version = F('version') + 1
+            statistiques.save(update_fields=[*compteurs, *repartitions, 'version', 'date_mise_a_jour'])
+
+    @classmethod
+    def ajuster_vetement(cls, avant, apres):
+        """Reporter le passage d'un vêtement de l'état avant à l'état apres (valeurs de CHAMPS_VETEMENT, ou None)"""
+        cls.ajuster_vetements([(avant, apres)])
+
+    @classmethod
+    def ajuster_vetements(cls, changements):
+        """Reporter plusieurs changements (avant, apres) de vêtements, en une mise à jour par utilisateur"""
+        par_utilisateur = defaultdict(lambda: (Counter(), defaultdict(Counter)))
+        for avant, apres in changements:
+            for valeurs, signe in ((avant, -1), (apres, 1)):
+                if valeurs is None:
+                    continue
+                compteurs, repartitions = cls.contribution(valeurs)
+                cumul_compteurs, cumul_repartitions = par_utilisateur[valeurs['proprietaire_id']]
+                for champ, valeur in compteurs.items():
+                    cumul_compteurs[champ] += signe * valeur
+                for champ, repartition in repartitions.items():
+                    for cle, valeur in repartition.items():
+                        cumul_repartitions[champ][cle] += signe * valeur
+        for utilisateur_id, (compteurs, repartitions) in par_utilisateur.items():
+            cls.ajuster(utilisateur_id, compteurs, repartitions)
+
+    @classmethod
+    def recalculer(cls, utilisateur_ids=None):
+        """
+        Reconstruire les statistiques depuis les tables, pour tous les
+        utilisateurs ou ceux de utilisateur_ids, en quelques requêtes
+        groupées ; retourne le nombre d'utilisateurs traités.
+        """
+        utilisateurs = User.objects.all()
+        vetements, tenues, valises, messages = (
+            Vetement.objects.all(), Tenue.objects.all(), Valise.objects.all(), Message.objects.all()
+        )
+        if utilisateur_ids is not None:
+            utilisateur_ids = list(utilisateur_ids)
+            utilisateurs = utilisateurs.filter(pk__in=utilisateur_ids)
+            vetements = vetements.filter(proprietaire_id__in=utilisateur_ids)
+            tenues = tenues.filter(proprietaire_id__in=utilisateur_ids)
+            valises = valises.filter(proprietaire_id__in=utilisateur_ids)
+            messages = messages.filter(Q(expediteur_id__in=utilisateur_ids) | Q(destinataire_id__in=utilisateur_ids))
+        statistiques = {pk: cls(utilisateur_id=pk) for pk in utilisateurs.values_list('pk', flat=True)}
+
+        def reporter(lignes, cle):
+            for ligne in lignes:
+                stats = statistiques.get(ligne.pop(cle))
+                if stats is not None:
+                    for champ, valeur in ligne.items():
+                        setattr(stats, champ, valeur or 0)
+
+        reporter(vetements.order_by().values('proprietaire_id').annotate(
+            nb_vetements=Count('pk'),
+            nb_favoris=Count('pk', filter=Q(favori=True)),
+            nb_a_laver=Count('pk', filter=Q(a_laver=True)),
+            nb_peu_portes=Count('pk', filter=Q(nombre_portage__lt=Vetement.SEUIL_PEU_PORTE)),
+            nb_jamais_portes=Count('pk', filter=Q(nombre_portage=0)),
+            total_depense=Sum('prix_achat'),
+            total_portages=Sum('nombre_portage'),
+        ), 'proprietaire_id')
+        reporter(tenues.order_by().values('proprietaire_id').annotate(nb_tenues=Count('pk')), 'proprietaire_id')
+        reporter(valises.order_by().values('proprietaire_id').annotate(nb_valises=Count('pk')), 'proprietaire_id')
+        reporter(messages.order_by().values('expediteur_id').annotate(nb_messages_envoyes=Count('pk')), 'expediteur_id')
+        reporter(messages.order_by().values('destinataire_id').annotate(nb_messages_recus=Count('pk')), 'destinataire_id')
+
+        for champ, cle in (('par_categorie', 'categorie_id'), ('par_couleur', 'couleur_id')):
+            lignes = vetements.order_by().exclude(**{f'{cle}__isnull': True}).values_list('proprietaire_id', cle).annotate(n=Count('pk'))
+            for proprietaire_id, valeur, n in lignes:
+                if proprietaire_id in statistiques:
+                    getattr(statistiques[proprietaire_id], champ)[str(valeur)] = n
+
+        maintenant = timezone.now()
+        with transaction.atomic():
+            existantes = dict(cls.objects.filter(utilisateur_id__in=statistiques).values_list('utilisateur_id', 'pk'))
+            a_creer, a_modifier = [], []
+            for utilisateur_id, stats in statistiques.items():
+                stats.date_mise_a_jour = maintenant
+                if utilisateur_id in existantes:
+                    stats.pk = existantes[utilisateur_id]
+                    stats.version = F('version') + 1
+                    a_modifier.append(stats)
+                else:
+                    a_creer.append(stats)
+            cls.objects.bulk_create(a_creer, batch_size=500)
+            cls.objects.bulk_update(
+                a_modifier, [*cls.COMPTEURS, *cls.REPARTITIONS, 'version', 'date_mise_a_jour'], batch_size=500
+            )
+        return len(statistiques)
+
+
+def _valeurs_vetement(vetement):
+    return {champ: getattr(vetement, champ) for champ in StatistiquesUtilisateur.CHAMPS_VETEMENT}
+
+
+@receiver(pre_save, sender=Vetement)
+def memoriser_statistiques_vetement(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Lire l'état enregistré du vêtement avant sa modification"""
+    champs = {champ.removesuffix('_id') for champ in StatistiquesUtilisateur.CHAMPS_VETEMENT}
+    if raw or (update_fields is not None and not champs & set(update_fields)):
+        instance._statistiques_avant = False  # Rien à reporter
+    elif instance.pk is None:
+        instance._statistiques_avant = None  # Nouveau vêtement
+    else:
+        instance._statistiques_avant = Vetement.objects.filter(pk=instance.pk).values(
+            *StatistiquesUtilisateur.CHAMPS_VETEMENT
+        ).first()
+
+
+@receiver(post_save, sender=Vetement)
+def statistiques_vetement_enregistre(sender, instance, raw=False, **kwargs):
+    avant = instance.__dict__.pop('_statistiques_avant', None)
+    if raw or avant is False:
+        return
+    StatistiquesUtilisateur.ajuster_vetement(avant, _valeurs_vetement(instance))
+    if avant is not None and avant['proprietaire_id'] != instance.proprietaire_id:
+        StatistiquesUtilisateur.invalider(avant['proprietaire_id'])
+
+
+@receiver(post_delete, sender=Vetement)
+def statistiques_vetement_supprime(sender, instance, **kwargs):
+    StatistiquesUtilisateur.ajuster_vetement(_valeurs_vetement(instance), None)
+
+
+@receiver(post_save, sender=Tenue)
+@receiver(post_save, sender=Valise)
+@receiver(post_delete, sender=Tenue)
+@receiver(post_delete, sender=Valise)
+def statistiques_tenue_valise(sender, instance, created=None, raw=False, **kwargs):
+    """Compter les tenues et valises créées (created) ou supprimées (created absent)"""
+    if raw or created is False:
+        return
+    champ = 'nb_tenues' if sender is Tenue else 'nb_valises'
+    StatistiquesUtilisateur.ajuster(instance.proprietaire_id, {champ: 1 if created else -1})
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def statistiques_message(sender, instance, created=None, raw=False, **kwargs):
+    if raw or created is False:
+        return
+    delta = 1 if created else -1
+    StatistiquesUtilisateur.ajuster(instance.expediteur_id, {'nb_messages_envoyes': delta})
+    StatistiquesUtilisateur.ajuster(instance.destinataire_id, {'nb_messages_recus': delta})
+
+
+@receiver(pre_delete, sender=Couleur)
+def memoriser_proprietaires_couleur(sender, instance, **kwargs):
+    """
+    Propriétaires des vêtements de la couleur supprimée : ses vêtements en
+    sont détachés (SET_NULL) par une mise à jour sans signal
+    """
+    instance._proprietaires_statistiques = set(
+        Vetement.objects.filter(couleur=instance).order_by().values_list('proprietaire_id', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=Couleur)
+def recalculer_statistiques_couleur(sender, instance, **kwargs):
+    """Reconstruire par_couleur (et changer la version) une fois les vêtements détachés de la couleur"""
+    proprietaires = instance.__dict__.pop('_proprietaires_statistiques', None)
+    if proprietaires:
+        StatistiquesUtilisateur.recalculer(proprietaires)
+
+
+@receiver(post_save, sender=Vetement)
+@receiver(post_save, sender=Tenue)
+@receiver(post_save, sender=Valise)
+@receiver(post_save, sender=EvenementTenue)
+@receiver(post_delete, sender=Vetement)
+@receiver(post_delete, sender=Tenue)
+@receiver(post_delete, sender=Valise)
+@receiver(post_delete, sender=EvenementTenue)
+def invalider_statistiques(sender, instance, raw=False, **kwargs):
+    """Toute écriture dans la garde-robe périme les statistiques en cache du propriétaire"""
+    if not raw:
+        StatistiquesUtilisateur.invalider(instance.proprietaire_id)
+
+
+@receiver(post_save, sender=Vetement)
+def indexer_vetement(sender, instance, update_fields=None, **kwargs):
+    """Tenir l'index de recherche plein texte à jour"""
+    if update_fields is None or {nom for nom, _, _ in recherche.CHAMPS_INDEXES} & set(update_fields):
+        recherche.indexer([instance])
+
+
+@receiver(post_delete, sender=Vetement)
+def desindexer_vetement(sender, instance, **kwargs):
+    recherche.desindexer([instance.pk])
+
+
+@receiver(post_save, sender=AnnonceVente)
+def indexer_annonce(sender, instance, raw=False, **kwargs):
+    """Tenir le document de recherche de l'annonce à jour (supprimé si elle n'est plus en vente)"""
+    if not raw:
+        recherche_annonces.indexer([instance])
+
+
+@receiver(post_save, sender=Vetement)
+def indexer_annonce_vetement(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Le document d'une annonce reprend le nom, la marque et la catégorie du vêtement"""
+    if raw or (update_fields is not None and not {'nom', 'marque', 'categorie'} & set(update_fields)):
+        return
+    annonces = AnnonceVente.objects.filter(vetement=instance, statut='en_vente')
+    if annonces:
+        recherche_annonces.indexer(annonces)
@@ -0,0 +1,183 @@
+"""
+Pagination par curseur (keyset) des longues listes.
+
+    page = paginer(request, Vetement.objects.filter(...).order_by('-date_ajout'), par_page=20)
+    render(request, 'liste.html', {'vetements': page, 'page': page})
+    {% load pagination_tags %}{% pagination_curseur page %}
+
+Une page ne se lit pas par OFFSET mais à partir du dernier élément de la
+page précédente : WHERE (date, id) < (date du curseur, id du curseur)
+ORDER BY date DESC, id DESC LIMIT n + 1, servi par un index sur l'ordre.
+La centième page coûte donc autant que la première. Les curseurs sont
+signés (django.core.signing) : opaques et non falsifiables ; un curseur
+invalide ramène à la première page.
+
+L'ordre est celui du queryset (champs ou annotations, pk ajouté en
+dernier pour départager). Le nombre total d'éléments n'est calculé que
+sur demande : compte='exact' (COUNT(*)) ou compte='estime' (estimation
+du planificateur sous PostgreSQL, comptage plafonné ailleurs).
+"""
+
+import json
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+
+
+SEL = 'vetements.pagination'
+
+# Au-delà, le compte estimé sans PostgreSQL s'affiche « PLAFOND_COMPTE+ »
+PLAFOND_COMPTE = 1000
+
+
+@dataclass
+class PageCurseur:
+    """Une page de résultats, itérable comme une liste"""
+
+    objets: list = field(default_factory=list)
+    curseur: Optional[str] = None  # Curseur de cette page (None pour la première)
+    suivant: Optional[str] = None
+    precedent: Optional[str] = None
+    compte: Optional[int] = None
+    compte_approche: bool = False  # Estimation du planificateur
+    compte_plafonne: bool = False  # Au moins compte éléments
+
+    def __iter__(self):
+        return iter(self.objets)
+
+    def __len__(self):
+        return len(self.objets)
+
+    def __bool__(self):
+        return bool(self.objets)
+
+    def __getitem__(self, index):
+        return self.objets[index]
+
+    @property
+    def a_autres_pages(self):
+        return bool(self.suivant or self.precedent)
+
+
+def ordre_de(queryset):
+    """Champs d'ordre du queryset, pk compris : [(nom, décroissant)]"""
+    noms = list(queryset.query.order_by or queryset.model._meta.ordering)
+    ordre = []
+    for nom in noms:
+        if not isinstance(nom, str) or nom == '?':
+            raise ValueError(f"Ordre non paginable par curseur : {nom!r}")
+        ordre.append((nom.lstrip('-'), nom.startswith('-')))
+    if not any(nom in ('pk', 'id') for nom, _ in ordre):
+        ordre.append(('pk', ordre[0][1] if ordre else True))
+    return ordre
+
+
+def _convertisseur(queryset, nom):
+    """Fonction qui relit une valeur du curseur avec le type du champ (ou de l'annotation)"""
+    if nom in queryset.query.annotations:
+        return queryset.query.annotations[nom].output_field.to_python
+    if nom == 'pk':
+        return queryset.model._meta.pk.to_python
+    return queryset.model._meta.get_field(nom).to_python
+
+
+def _valeur(objet, nom):
+    return objet.pk if nom == 'pk' else getattr(objet, nom)
+
+
+def _serialiser(valeur):
+    """Valeur JSON exacte (DjangoJSONEncoder tronque les microsecondes, qui départagent les dates)"""
+    if isinstance(valeur, date):
+        return valeur.isoformat()
+    if isinstance(valeur, Decimal):
+        return str(valeur)
+    return valeur
+
+
+def _signer(objet, ordre, sens):
+    valeurs = [_serialiser(_valeur(objet, nom)) for nom, _ in ordre]
+    return signing.dumps({'v': valeurs, 's': sens}, salt=SEL, compress=True)
+
+
+def _lire(curseur, queryset, ordre):
+    """(valeurs, sens) d'un curseur signé, ou None s'il est absent ou invalide"""
+    if not curseur:
+        return None
+    try:
+        contenu = signing.loads(curseur, salt=SEL)
+        valeurs = [_convertisseur(queryset, nom)(valeur) for (nom, _), valeur in zip(ordre, contenu['v'], strict=True)]
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+    return valeurs, contenu['s']
+
+
+def _apres(ordre, valeurs, inverse=False):
+    """Condition « strictement après valeurs » dans l'ordre (ou avant si inverse)"""
+    condition = Q()
+    egalites = {}
+    for (nom, decroissant), valeur in zip(ordre, valeurs):
+        operateur = 'lt' if decroissant != inverse else 'gt'
+        condition |= Q(**egalites, **{f'{nom}__{operateur}': valeur})
+        egalites[nom] = valeur
+    return condition
+
+
+def estimer_compte(queryset):
+    """
+    (nombre, approché, plafonné) : estimation du planificateur sous
+    PostgreSQL, comptage plafonné à PLAFOND_COMPTE ailleurs
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows']), True, False
+    nombre = queryset.order_by()[:PLAFOND_COMPTE + 1].count()
+    return min(nombre, PLAFOND_COMPTE), False, nombre > PLAFOND_COMPTE
+
+
+def paginer_queryset(queryset, curseur=None, par_page=20, compte=None):
+    """Page de queryset commençant après (ou finissant avant) curseur"""
+    ordre = ordre_de(queryset)
+    # Ordre complet, pk compris, dès la première page : celui des curseurs et des index
+    queryset = queryset.order_by(*[f"{'-' if decroissant else ''}{nom}" for nom, decroissant in ordre])
+    lu = _lire(curseur, queryset, ordre)
+    page = PageCurseur(curseur=curseur if lu else None)
+
+    if lu is None:
+        lignes = list(queryset[:par_page + 1])
+        page.objets = lignes[:par_page]
+        if len(lignes) > par_page:
+            page.suivant = _signer(page.objets[-1], ordre, 'apres')
+    elif lu[1] == 'avant':
+        inverse = [f"{'' if decroissant else '-'}{nom}" for nom, decroissant in ordre]
+        lignes = list(queryset.filter(_apres(ordre, lu[0], inverse=True)).order_by(*inverse)[:par_page + 1])
+        page.objets = lignes[:par_page][::-1]
+        if page.objets:
+            page.suivant = _signer(page.objets[-1], ordre, 'apres')
+            if len(lignes) > par_page:
+                page.precedent = _signer(page.objets[0], ordre, 'avant')
+    else:
+        lignes = list(queryset.filter(_apres(ordre, lu[0]))[:par_page + 1])
+        page.objets = lignes[:par_page]
+        if page.objets:
+            page.precedent = _signer(page.objets[0], ordre, 'avant')
+            if len(lignes) > par_page:
+                page.suivant = _signer(page.objets[-1], ordre, 'apres')
+
+    if lu and not page.objets:
+        return paginer_queryset(queryset, None, par_page, compte)  # Éléments du curseur supprimés depuis
+
+    if compte == 'exact':
+        page.compte = queryset.count()
+    elif compte == 'estime':
+        page.compte, page.compte_approche, page.compte_plafonne = estimer_compte(queryset)
+    return page
+
+
+def paginer(request, queryset, par_page=20, compte=None):
+    """Page de queryset désignée par le paramètre curseur de la requête"""
+    return paginer_queryset(queryset, request.GET.get('curseur'), par_page, compte)
@@ -0,0 +1,322 @@
+"""
+Recherche dans la garde-robe : index plein texte et syntaxe de champs.
+
+    vetements = rechercher(Vetement.objects.filter(proprietaire=user), 'pull rayé couleur:noir saison:hiver')
+
+Les termes champ:valeur (couleur, categorie, taille, marque, saison, genre,
+etat) deviennent des filtres sur les colonnes du vêtement. Les autres mots
+sont cherchés dans l'index plein texte (nom, marque et description), sans
+tenir compte des accents ni des pluriels, et les résultats sont classés
+par pertinence (le nom pèse plus que la marque, elle-même plus que la
+description) :
+- PostgreSQL : table vetements_recherche (tsvector, configuration
+  'french', index GIN) ;
+- SQLite : table virtuelle FTS5 vetements_recherche, mots racinisés en
+  Python (FTS5 n'a pas de racinisation française).
+Sur les autres bases, les mots sont cherchés par icontains.
+
+L'index est tenu à jour à chaque enregistrement ou suppression d'un
+vêtement ; python manage.py indexer_recherche le reconstruit (après un
+bulk_create, par exemple).
+"""
+
+import re
+import shlex
+import unicodedata
+from dataclasses import dataclass, field
+
+from django.db import connection, models
+from django.db.models import FloatField, Func, Lookup, Q, Value
+
+
+TABLE = 'vetements_recherche'
+
+# Champs indexés, avec leur poids PostgreSQL et leur poids bm25 SQLite
+CHAMPS_INDEXES = (('nom', 'A', 10.0), ('marque', 'B', 4.0), ('description', 'C', 1.0))
+
+# Poids bm25 des colonnes de la table FTS5 (vetement_id, puis CHAMPS_INDEXES)
+POIDS_BM25 = (0.0, *(poids for _, _, poids in CHAMPS_INDEXES))
+
+# Suffixes retirés par raciner, du plus long au plus court
+SUFFIXES = (('euses', 'eu'), ('euse', 'eu'), ('eaux', 'eau'), ('aux', 'al'), ('es', ''), ('s', ''), ('x', ''), ('e', ''))
+
+# Mots ignorés dans les requêtes (la configuration 'french' de PostgreSQL les ignore aussi)
+MOTS_VIDES = {'a', 'au', 'aux', 'avec', 'de', 'des', 'du', 'en', 'et', 'la', 'le', 'les', 'pour', 'un', 'une'}
+
+TAILLE_LOT = 500
+
+
+def normaliser(texte):
+    """Texte en minuscules et sans accents"""
+    decompose = unicodedata.normalize('NFKD', texte or '')
+    return ''.join(c for c in decompose if not unicodedata.combining(c)).lower()
+
+
+def mots(texte):
+    return re.findall(r'[^\W_]+', normaliser(texte))
+
+
+def raciner(mot):
+    """Racine française approximative d'un mot normalisé (pluriel et féminin retirés)"""
+    racine = None
+    while racine != mot:
+        racine = mot
+        for suffixe, remplacement in SUFFIXES:
+            if mot.endswith(suffixe) and len(mot) - len(suffixe) >= 3:
+                mot = mot[:-len(suffixe)] + remplacement
+                break
+    return mot
+
+
+def moteur(connexion=None):
+    """'postgresql', 'sqlite' ou None si la base n'a pas d'index plein texte"""
+    vendor = (connexion or connection).vendor
+    return vendor if vendor in ('postgresql', 'sqlite') else None
+
+
+# Syntaxe champ:valeur
+
+def _choix(choices):
+    """Filtre sur un champ à choix : la clé ou le libellé, sans accents"""
+    valeurs = {}
+    for cle, libelle in choices:
+        valeurs[normaliser(cle)] = cle
+        valeurs[normaliser(libelle)] = cle
+    return lambda champ, valeur: Q(**{champ: valeurs[normaliser(valeur)]}) if normaliser(valeur) in valeurs else None
+
+
+def _nom(modele_nom):
+    """Filtre sur une table de référence (Couleur, Categorie, Taille), par son nom sans accents"""
+    def filtre(champ, valeur):
+        from . import models
+        modele = getattr(models, modele_nom)
+        ids = [pk for pk, nom in modele.objects.values_list('pk', 'nom') if normaliser(nom) == normaliser(valeur)]
+        return Q(**{f'{champ}_id__in': ids}) if ids else None
+    return filtre
+
+
+def _filtres():
+    from .models import Vetement
+    return {
+        'couleur': _nom('Couleur'),
+        'categorie': _nom('Categorie'),
+        'taille': _nom('Taille'),
+        'marque': lambda champ, valeur: Q(marque__iexact=valeur),
+        'saison': _choix(Vetement.SAISON_CHOICES),
+        'genre': _choix(Vetement.GENRE_CHOICES),
+        'etat': _choix(Vetement.ETAT_CHOICES),
+    }
+
+
+@dataclass
+class Requete:
+    """Requête analysée : mots libres et filtres [(champ, valeur)]"""
+
+    termes: list = field(default_factory=list)
+    filtres: list = field(default_factory=list)
+
+
+def analyser_requete(texte):
+    """
+    Séparer les termes champ:valeur (valeur entre guillemets si elle contient
+    des espaces : marque:"comptoir des cotonniers") des mots libres
+    """
+    try:
+        elements = shlex.split(texte or '')
+    except ValueError:
+        elements = (texte or '').split()  # Guillemet non fermé
+    champs = _filtres()
+    requete = Requete()
+    for element in elements:
+        champ, separateur, valeur = element.partition(':')
+        champ = normaliser(champ)
+        if separateur and champ in champs and valeur:
+            requete.filtres.append((champ, valeur))
+        else:
+            requete.termes.extend(mots(element))
+    requete.termes = [terme for terme in requete.termes if terme not in MOTS_VIDES] or requete.termes
+    return requete
+
+
+def filtrer_champs(queryset, filtres):
+    """Appliquer les filtres [(champ, valeur)] ; une valeur inconnue ne trouve rien"""
+    champs = _filtres()
+    for champ, valeur in filtres:
+        condition = champs[champ](champ, valeur)
+        if condition is None:
+            return queryset.none()
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+# Index plein texte
+
+def _requete_fts(termes):
+    """Expression MATCH FTS5 : toutes les racines, en préfixe"""
+    return ' AND '.join(f'"{raciner(terme)}"*' for terme in termes)
+
+
+def _requete_tsquery(termes):
+    """Expression to_tsquery : tous les mots, en préfixe"""
+    return ' & '.join(f'{terme}:*' for terme in termes)
+
+
+class DocumentRecherche(models.Field):
+    """
+    Document plein texte de IndexRecherche : colonne tsvector sous
+    PostgreSQL, colonne cachée de la table FTS5 (du nom de la table) sous
+    SQLite. Seuls le lookup correspond et Pertinence l'utilisent.
+    """
+
+    def db_type(self, connection):
+        return 'tsvector'
+
+
+@DocumentRecherche.register_lookup
+class Correspond(Lookup):
+    """document__correspond=expression (syntaxe MATCH FTS5 ou to_tsquery selon la base)"""
+    lookup_name = 'correspond'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        if connection.vendor == 'sqlite':
+            table = connection.ops.quote_name(self.lhs.alias)
+            return f'{table}.{connection.ops.quote_name(TABLE)} MATCH {rhs}', rhs_params
+        return f"{lhs} @@ to_tsquery('french', {rhs})", (*lhs_params, *rhs_params)
+
+
+class Pertinence(Func):
+    """Pertinence d'un document pour une requête plein texte (plus grande = meilleure)"""
+    output_field = FloatField()
+
+    def __init__(self, document, expression):
+        super().__init__(document, Value(expression))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        table = connection.ops.quote_name(self.source_expressions[0].alias)
+        poids = ', '.join(str(poids) for poids in POIDS_BM25)
+        return f'-bm25({table}, {poids})', ()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        document, document_params = compiler.compile(self.source_expressions[0])
+        expression, expression_params = compiler.compile(self.source_expressions[1])
+        return f"ts_rank({document}, to_tsquery('french', {expression}))", (*document_params, *expression_params)
+
+
+def filtrer_texte(queryset, termes):
+    """Vêtements de queryset contenant tous les termes, annotés de leur pertinence"""
+    if moteur():
+        expression = _requete_fts(termes) if moteur() == 'sqlite' else _requete_tsquery(termes)
+        return queryset.filter(index_recherche__document__correspond=expression).annotate(
+            pertinence=Pertinence('index_recherche__document', expression)
+        )
+    condition = Q()
+    for terme in termes:
+        condition &= Q(nom__icontains=terme) | Q(marque__icontains=terme) | Q(description__icontains=terme)
+    return queryset.filter(condition)
+
+
+def rechercher(queryset, texte):
+    """
+    Vêtements de queryset correspondant à la requête texte, les plus
+    pertinents en premier (puis dans l'ordre de queryset)
+    """
+    requete = analyser_requete(texte)
+    queryset = filtrer_champs(queryset, requete.filtres)
+    if not requete.termes:
+        return queryset
+    queryset = filtrer_texte(queryset, requete.termes)
+    if 'pertinence' in queryset.query.annotations:
+        queryset = queryset.order_by('-pertinence', *queryset.query.order_by)
+    return queryset
+
+
+def creer_index(connexion):
+    with connexion.cursor() as cursor:
+        if moteur(connexion) == 'sqlite':
+            # rowid = vetement_id : vetement_id sert aux jointures, rowid aux suppressions
+            colonnes = ', '.join(nom for nom, _, _ in CHAMPS_INDEXES)
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(vetement_id UNINDEXED, "
+                f"{colonnes}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+        elif moteur(connexion) == 'postgresql':
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+                'vetement_id bigint PRIMARY KEY REFERENCES vetements_vetement (id) ON DELETE CASCADE '
+                'DEFERRABLE INITIALLY DEFERRED, document tsvector NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_document ON {TABLE} USING gin (document)')
+
+
+def supprimer_index(connexion):
+    if moteur(connexion):
+        with connexion.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def indexer_lignes(lignes, connexion=None):
+    """
+    Indexer (ou réindexer) les vêtements lignes : [(id, nom, marque, description)]
+    """
+    connexion = connexion or connection
+    lignes = list(lignes)
+    if not lignes or not moteur(connexion):
+        return
+    with connexion.cursor() as cursor:
+        for debut in range(0, len(lignes), TAILLE_LOT):
+            lot = lignes[debut:debut + TAILLE_LOT]
+            if moteur(connexion) == 'sqlite':
+                _supprimer(cursor, connexion, [ligne[0] for ligne in lot])
+                cursor.executemany(
+                    f'INSERT INTO {TABLE} (rowid, vetement_id, nom, marque, description) VALUES (%s, %s, %s, %s, %s)',
+                    [(pk, pk, *(' '.join(raciner(mot) for mot in mots(texte)) for texte in textes))
+                     for pk, *textes in lot],
+                )
+            else:
+                document = ' || '.join(
+                    f"setweight(to_tsvector('french', %s), '{poids}')" for _, poids, _ in CHAMPS_INDEXES
+                )
+                cursor.executemany(
+                    f'INSERT INTO {TABLE} (vetement_id, document) VALUES (%s, {document}) '
+                    'ON CONFLICT (vetement_id) DO UPDATE SET document = EXCLUDED.document',
+                    [(pk, *(normaliser(texte) for texte in textes)) for pk, *textes in lot],
+                )
+
+
+def _supprimer(cursor, connexion, ids):
+    colonne = 'rowid' if moteur(connexion) == 'sqlite' else 'vetement_id'
+    marques = ', '.join(['%s'] * len(ids))
+    cursor.execute(f'DELETE FROM {TABLE} WHERE {colonne} IN ({marques})', ids)
+
+
+def indexer(vetements):
+    indexer_lignes((v.pk, v.nom, v.marque, v.description) for v in vetements)
+
+
+def desindexer(ids):
+    ids = list(ids)
+    if ids and moteur():
+        with connection.cursor() as cursor:
+            _supprimer(cursor, connection, ids)
+
+
+def reconstruire(modele, connexion=None):
+    """Réindexer tous les vêtements de modele (Vetement, ou le modèle historique d'une migration)"""
+    connexion = connexion or connection
+    if not moteur(connexion):
+        return 0
+    with connexion.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    lignes = modele.objects.using(connexion.alias).values_list('pk', 'nom', 'marque', 'description').order_by('pk')
+    total = 0
+    lot = []
+    for ligne in lignes.iterator(chunk_size=2000):
+        lot.append(ligne)
+        if len(lot) == 2000:
+            indexer_lignes(lot, connexion)
+            total += len(lot)
+            lot = []
+    indexer_lignes(lot, connexion)
+    return total + len(lot)
@@ -0,0 +1,170 @@
+"""
+Recherche approchée dans le marketplace, tolérante aux fautes de frappe
+("jeen" trouve "jean", "nikee" trouve "Nike").
+
+    annonces = rechercher(AnnonceVente.objects.filter(statut='en_vente'), 'jeen levis')
+
+Chaque annonce en vente a un document de recherche (DocumentAnnonce) :
+nom, marque et catégorie du vêtement et description de la vente, en
+minuscules et sans accents. Un mot de la requête ressemble à un mot du
+document quand ils partagent assez de trigrammes (suites de trois
+lettres, comme pg_trgm) :
+- PostgreSQL : word_similarity de pg_trgm, servie par un index GIN
+  gin_trgm_ops sur DocumentAnnonce.texte ;
+- autres bases : trigrammes calculés en Python et stockés dans
+  TrigrammeAnnonce, indexée par (trigramme, annonce).
+Les résultats sont classés par score : similarité multipliée par la
+fraîcheur de l'annonce (1 le jour de la publication, 1/2 après
+DEMI_VIE_JOURS jours).
+
+Les documents sont tenus à jour à chaque enregistrement d'annonce ou de
+vêtement ; python manage.py indexer_recherche les reconstruit.
+"""
+
+import math
+import time
+
+from django.apps import apps as global_apps
+from django.db import connection, models, transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Func, Lookup, OuterRef, Subquery, Value
+
+from .recherche import mots, normaliser
+
+
+# Similarité minimale (part des trigrammes de la requête trouvés dans le document)
+SEUIL_SIMILARITE = 0.3
+
+# Âge (en jours) auquel la fraîcheur d'une annonce est divisée par deux
+DEMI_VIE_JOURS = 30
+
+# Granularité de l'horloge des scores (secondes) : les scores, donc l'ordre
+# des pages, ne bougent pas d'une page à l'autre
+PAS_HORLOGE = 3600
+
+
+def trigrammes(texte):
+    """Trigrammes des mots de texte, complétés par des espaces comme pg_trgm"""
+    resultat = set()
+    for mot in mots(texte):
+        complete = f'  {mot} '
+        resultat.update(complete[i:i + 3] for i in range(len(complete) - 2))
+    return resultat
+
+
+def trigrammes_natifs(connexion=None):
+    """Vrai si la base calcule elle-même les trigrammes (pg_trgm)"""
+    return (connexion or connection).vendor == 'postgresql'
+
+
+class TexteRecherche(models.TextField):
+    """Texte de DocumentAnnonce, avec le lookup ressemble (pg_trgm)"""
+
+
+@TexteRecherche.register_lookup
+class Ressemble(Lookup):
+    """texte__ressemble=requete : un extrait de texte ressemble à requete (opérateur <% de pg_trgm)"""
+    lookup_name = 'ressemble'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{rhs} <% {lhs}', (*rhs_params, *lhs_params)
+
+
+class SimilariteMots(Func):
+    function = 'word_similarity'
+    output_field = FloatField()
+
+
+def _document(annonce):
+    vetement = annonce.vetement
+    parties = (vetement.nom, vetement.marque, vetement.categorie.nom, annonce.description_vente)
+    return normaliser(' '.join(partie for partie in parties if partie))
+
+
+def indexer(annonces, apps=global_apps, connexion=None):
+    """
+    Créer, mettre à jour ou supprimer le document de recherche de chaque
+    annonce de annonces (queryset ou liste), selon qu'elle est en vente
+    """
+    connexion = connexion or connection
+    AnnonceVente = apps.get_model('vetements', 'AnnonceVente')
+    DocumentAnnonce = apps.get_model('vetements', 'DocumentAnnonce')
+    TrigrammeAnnonce = apps.get_model('vetements', 'TrigrammeAnnonce')
+
+    ids = [annonce.pk for annonce in annonces]
+    en_vente = list(AnnonceVente.objects.using(connexion.alias).filter(
+        pk__in=ids, statut='en_vente'
+    ).select_related('vetement__categorie'))
+    documents = [
+        DocumentAnnonce(annonce_id=annonce.pk, texte=_document(annonce),
+                        horodatage=int(annonce.date_publication.timestamp()))
+        for annonce in en_vente
+    ]
+    with transaction.atomic(using=connexion.alias):
+        DocumentAnnonce.objects.using(connexion.alias).filter(annonce_id__in=ids).delete()
+        DocumentAnnonce.objects.using(connexion.alias).bulk_create(documents, batch_size=500)
+        if not trigrammes_natifs(connexion):
+            TrigrammeAnnonce.objects.using(connexion.alias).filter(annonce_id__in=ids).delete()
+            TrigrammeAnnonce.objects.using(connexion.alias).bulk_create([
+                TrigrammeAnnonce(annonce_id=document.annonce_id, trigramme=trigramme)
+                for document in documents for trigramme in trigrammes(document.texte)
+            ], batch_size=1000)
+    return len(documents)
+
+
+def reconstruire(apps=global_apps, connexion=None):
+    """Reconstruire les documents de toutes les annonces en vente"""
+    connexion = connexion or connection
+    AnnonceVente = apps.get_model('vetements', 'AnnonceVente')
+    annonces = AnnonceVente.objects.using(connexion.alias)
+    with transaction.atomic(using=connexion.alias):
+        apps.get_model('vetements', 'TrigrammeAnnonce').objects.using(connexion.alias).all().delete()
+        apps.get_model('vetements', 'DocumentAnnonce').objects.using(connexion.alias).all().delete()
+        ids = list(annonces.filter(statut='en_vente').values_list('pk', flat=True))
+        total = 0
+        for debut in range(0, len(ids), 1000):
+            total += indexer(annonces.filter(pk__in=ids[debut:debut + 1000]), apps, connexion)
+    return total
+
+
+def rechercher(annonces, texte, maintenant=None):
+    """
+    Annonces de annonces ressemblant à texte, annotées de similarite et
+    score, les meilleurs scores en premier
+    """
+    requete = ' '.join(mots(texte))
+    if not requete:
+        return annonces
+    maintenant = maintenant or time.time() // PAS_HORLOGE * PAS_HORLOGE
+
+    if trigrammes_natifs():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)",
+                           [str(SEUIL_SIMILARITE)])
+        annonces = annonces.filter(document_recherche__texte__ressemble=requete).annotate(
+            similarite=SimilariteMots(Value(requete), F('document_recherche__texte'))
+        )
+    else:
+        cherches = trigrammes(requete)
+        communs = _trigrammes_communs(cherches)
+        minimum = math.ceil(SEUIL_SIMILARITE * len(cherches))
+        annonces = annonces.filter(
+            pk__in=communs.filter(communs__gte=minimum).values('annonce_id')
+        ).annotate(similarite=ExpressionWrapper(
+            Subquery(communs.filter(annonce_id=OuterRef('pk')).values('communs')) * Value(1.0) / Value(len(cherches)),
+            output_field=FloatField(),
+        ))
+
+    age = (Value(float(maintenant)) - F('document_recherche__horodatage')) / Value(DEMI_VIE_JOURS * 86400.0)
+    return annonces.annotate(score=ExpressionWrapper(
+        F('similarite') / (Value(1.0) + age), output_field=FloatField()
+    )).order_by('-score', '-pk')
+
+
+def _trigrammes_communs(cherches):
+    """Nombre de trigrammes de cherches dans le document de chaque annonce"""
+    TrigrammeAnnonce = global_apps.get_model('vetements', 'TrigrammeAnnonce')
+    return TrigrammeAnnonce.objects.filter(trigramme__in=cherches).values('annonce_id').annotate(
+        communs=Count('pk')
+    ).order_by()
@@ -0,0 +1,242 @@
+"""
+Serveur SFTP local, en processus, qui remplace le serveur Unraid pour les
+mesures et les tests : paramiko côté serveur, fichiers dans un répertoire
+local, latence réseau simulée.
+
+    with LocalSFTPServer(root, latency=0.02) as server:
+        storage = UnraidSFTPStorage()
+        server.configure(storage)
+        storage.save('vetements/chemise.jpg', content)
+        server.handshakes, server.requests
+
+Chaque requête SFTP attend `latency` secondes avant d'être traitée (un
+aller-retour) ; l'établissement d'une session SSH en attend plusieurs.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+
+import paramiko
+from paramiko.sftp import SFTP_OK
+
+
+# Allers-retours d'une connexion SSH + ouverture du canal SFTP
+HANDSHAKE_ROUND_TRIPS = 4
+
+# Les clients ferment leurs sessions sans prévenir le serveur (fermeture du
+# pool) : les « Connection reset by peer » côté serveur ne sont pas des erreurs
+TRANSPORT_LOGGER = f'{__name__}.transport'
+logging.getLogger(TRANSPORT_LOGGER).setLevel(logging.CRITICAL)
+
+
+class _LocalSFTPHandle(paramiko.SFTPHandle):
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            paramiko.SFTPServer.set_file_attr(self.filename, attr)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+
+class _LocalSFTPInterface(paramiko.SFTPServerInterface):
+    """Opérations SFTP sur un répertoire local, avec latence simulée"""
+
+    def __init__(self, server, root, local_server):
+        super().__init__(server)
+        self.root = root
+        self.local_server = local_server
+
+    def _local(self, path):
+        self.local_server._request()
+        return os.path.join(self.root, self.canonicalize(path).lstrip('/'))
+
+    def list_folder(self, path):
+        path = self._local(path)
+        try:
+            return [
+                paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(path, filename)), filename)
+                for filename in os.listdir(path)
+            ]
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        path = self._local(path)
+        try:
+            fd = os.open(path, flags | getattr(os, 'O_BINARY', 0), 0o666)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        handle = _LocalSFTPHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(self._local(oldpath), self._local(newpath))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        try:
+            paramiko.SFTPServer.set_file_attr(self._local(path), attr)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+
+class _PasswordServer(paramiko.ServerInterface):
+    def __init__(self, local_server):
+        self.local_server = local_server
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        # Négociation des clés et authentification : plusieurs allers-retours
+        time.sleep(self.local_server.latency * HANDSHAKE_ROUND_TRIPS)
+        if (username, password) == (self.local_server.username, self.local_server.password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED_OR_UNSUPPORTED
+
+
+class LocalSFTPServer:
+    """Serveur SFTP sur 127.0.0.1 (port libre), fichiers servis depuis root"""
+
+    def __init__(self, root, latency=0.0, username='garde-robe', password='garde-robe'):
+        self.root = root
+        self.latency = latency
+        self.username = username
+        self.password = password
+        self.host_key = paramiko.ECDSAKey.generate()
+        self.port = None
+
+        self.handshakes = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._socket = None
+        self._thread = None
+        self._transports = []
+        self._stopped = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _request(self):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(('127.0.0.1', 0))
+        self._socket.listen(64)
+        self._socket.settimeout(0.2)
+        self.port = self._socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept_loop, name='sftp-local', daemon=True)
+        self._thread.start()
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                client, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            client.settimeout(None)
+
+            transport = paramiko.Transport(client)
+            transport.set_log_channel(TRANSPORT_LOGGER)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler(
+                'sftp', paramiko.SFTPServer, _LocalSFTPInterface, root=self.root, local_server=self
+            )
+            with self._lock:
+                self.handshakes += 1
+                self._transports.append(transport)
+            # Avec un Event, start_server() rend la main sans attendre la négociation
+            transport.start_server(event=threading.Event(), server=_PasswordServer(self))
+
+    def stop(self):
+        self._stopped.set()
+        if self._socket is not None:
+            self._socket.close()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            transports, self._transports = self._transports, []
+        for transport in transports:
+            transport.close()
+
+    def configure(self, storage, remote_path='/media/'):
+        """Faire pointer un UnraidSFTPStorage vers ce serveur"""
+        storage.host = '127.0.0.1'
+        storage.port = self.port
+        storage.username = self.username
+        storage.password = self.password
+        storage.key_path = None
+        storage.remote_path = remote_path
+        os.makedirs(os.path.join(self.root, remote_path.strip('/')), exist_ok=True)
+        return storage
@@ -0,0 +1,84 @@
+"""
+Signatures HMAC partagées entre Django et le serveur média.
+
+Ce module ne dépend pas de Django : il est aussi importé par le récepteur
+d'envois qui tourne sur Unraid (vetements.upload_receiver). Chaque
+signature porte un usage ('upload', 'receipt', ...) pour qu'une signature
+valable pour un usage ne le soit pas pour un autre.
+"""
+
+import base64
+import hashlib
+import hmac
+import time
+
+
+def sign(secret, purpose, *parts):
+    """Signature HMAC-SHA256 (base64 URL, sans remplissage) de purpose et parts"""
+    message = '\n'.join([purpose] + [str(part) for part in parts]).encode('utf-8')
+    digest = hmac.new(secret.encode('utf-8'), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def check(secret, signature, purpose, *parts):
+    """Vérifier signature en temps constant"""
+    if not secret or not isinstance(signature, str):
+        return False
+    return hmac.compare_digest(sign(secret, purpose, *parts), signature)
+
+
+def upload_params(secret, name, max_bytes, expires):
+    """Paramètres de requête d'une URL d'envoi direct de name, valable jusqu'à expires (timestamp)"""
+    expires = int(expires)
+    return {
+        'expires': expires,
+        'max': max_bytes,
+        'signature': sign(secret, 'upload', name, max_bytes, expires),
+    }
+
+
+def verify_upload(secret, name, expires, max_bytes, signature, now=None):
+    """Vérifier les paramètres d'une URL d'envoi direct (signature et expiration)"""
+    try:
+        expires, max_bytes = int(expires), int(max_bytes)
+    except (TypeError, ValueError):
+        return False
+    if expires < (time.time() if now is None else now):
+        return False
+    return check(secret, signature, 'upload', name, max_bytes, expires)
+
+
+def upload_receipt(secret, name, size, sha256):
+    """Reçu remis par le récepteur après un envoi réussi"""
+    return sign(secret, 'receipt', name, int(size), sha256)
+
+
+def verify_receipt(secret, name, size, sha256, receipt):
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        return False
+    return check(secret, receipt, 'receipt', name, size, sha256)
+
+
+def media_url_params(secret, name, ttl, now=None):
+    """
+    Paramètres de requête d'une URL de photo signée, valable au moins ttl
+    secondes. L'expiration est arrondie à une fenêtre de ttl secondes :
+    l'URL d'une photo ne change qu'une fois par fenêtre, ce qui laisse
+    les navigateurs la garder en cache.
+    """
+    now = time.time() if now is None else now
+    expires = (int(now) // ttl + 2) * ttl
+    return {'expires': expires, 'signature': sign(secret, 'media', name, expires)}
+
+
+def verify_media_url(secret, name, expires, signature, now=None):
+    """Vérifier la signature et l'expiration d'une URL de photo"""
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < (time.time() if now is None else now):
+        return False
+    return check(secret, signature, 'media', name, expires)
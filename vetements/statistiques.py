@@ -0,0 +1,217 @@
+"""
+Statistiques détaillées de la garde-robe (page statistiques).
+
+Tout est calculé par un petit nombre fixe de requêtes groupées : agrégats
+conditionnels (Sum/Count avec filter=), regroupement par période de
+l'historique des portages (serie_portages) et coût par portage calculé
+en SQL. Le nombre de requêtes ne dépend ni du nombre de vêtements ni du
+nombre de catégories.
+
+    statistiques = calculer_statistiques(request.user)
+    render(request, 'vetements/statistiques.html', statistiques.contexte())
+"""
+
+from dataclasses import dataclass, field, fields
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Optional
+
+from django.db.models import Avg, Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import Portage, Vetement
+
+
+# Nombre de mois du graphique d'utilisation
+NOMBRE_MOIS = 12
+
+# Portages minimum pour figurer parmi les vêtements les plus rentables
+PORTAGES_MIN_RENTABLE = 5
+
+# Coût par portage, pour les vêtements qui ont un prix et ont été portés
+COUT_PAR_PORTAGE = Cast('prix_achat', FloatField()) / F('nombre_portage')
+AVEC_COUT = Q(prix_achat__gt=0, nombre_portage__gt=0)
+
+# Périodes des séries de portages
+TRONCATURES = {'jour': TruncDay, 'semaine': TruncWeek, 'mois': TruncMonth}
+
+
+@dataclass
+class StatistiquesGardeRobe:
+    """Résultat de calculer_statistiques"""
+
+    total_vetements: int = 0
+    total_depense: Decimal = Decimal(0)
+    total_portages: int = 0
+    cout_moyen_portage: Optional[float] = None
+    nb_jamais_portes: int = 0
+    nb_anciens: int = 0
+    vetements_recents: int = 0
+    taux_rotation: float = 0.0
+    valeur_portee: Decimal = Decimal(0)
+    valeur_non_portee: Decimal = Decimal(0)
+
+    par_categorie: list = field(default_factory=list)
+    par_couleur: list = field(default_factory=list)
+    par_saison: list = field(default_factory=list)
+    couleurs_dominantes: list = field(default_factory=list)
+    cout_par_categorie: list = field(default_factory=list)
+    utilisation_mensuelle: list = field(default_factory=list)
+    labels_mois: list = field(default_factory=list)
+
+    plus_portes: list = field(default_factory=list)
+    peu_portes: list = field(default_factory=list)
+    plus_rentables: list = field(default_factory=list)
+
+    @property
+    def alertes(self):
+        """Alertes affichées en haut de la page (vêtements jamais ou plus portés)"""
+        alertes = []
+        if self.nb_jamais_portes:
+            alertes.append({
+                'type': 'warning',
+                'titre': 'Vêtements jamais portés',
+                'message': f'{self.nb_jamais_portes} vêtement(s) n\'ont jamais été portés',
+                'count': self.nb_jamais_portes,
+                'icon': 'new_releases'
+            })
+        if self.nb_anciens:
+            alertes.append({
+                'type': 'info',
+                'titre': 'Pas portés depuis 6+ mois',
+                'message': f'{self.nb_anciens} vêtement(s) n\'ont pas été portés depuis plus de 6 mois',
+                'count': self.nb_anciens,
+                'icon': 'schedule'
+            })
+        return alertes
+
+    def contexte(self):
+        """Variables du template statistiques.html"""
+        contexte = {champ.name: getattr(self, champ.name) for champ in fields(self)}
+        contexte['alertes'] = self.alertes
+        return contexte
+
+
+def debuts_de_mois(aujourd_hui, nombre=NOMBRE_MOIS):
+    """Premiers jours des nombre derniers mois, du plus ancien au mois courant"""
+    annee, mois = aujourd_hui.year, aujourd_hui.month
+    debuts = []
+    for _ in range(nombre):
+        debuts.append(date(annee, mois, 1))
+        annee, mois = (annee - 1, 12) if mois == 1 else (annee, mois - 1)
+    return debuts[::-1]
+
+
+def debut_de_periode(jour, pas):
+    """Premier jour de la période (jour, semaine commençant le lundi, mois) contenant jour"""
+    if pas == 'semaine':
+        return jour - timedelta(days=jour.weekday())
+    if pas == 'mois':
+        return jour.replace(day=1)
+    return jour
+
+
+def periode_suivante(debut, pas):
+    if pas == 'semaine':
+        return debut + timedelta(days=7)
+    if pas == 'mois':
+        return (debut + timedelta(days=31)).replace(day=1)
+    return debut + timedelta(days=1)
+
+
+def serie_portages(utilisateur, debut, fin, pas='mois'):
+    """
+    Portages de utilisateur par période ('jour', 'semaine' ou 'mois'), de
+    la période contenant debut jusqu'à fin (inclus), sans période manquante :
+    [{'periode': date, 'portages': nombre, 'vetements': vêtements différents}].
+    Une seule requête, servie par l'index (propriétaire, date) de Portage.
+    """
+    if pas not in TRONCATURES:
+        raise ValueError(f"Période inconnue : {pas}")
+    debut = debut_de_periode(debut, pas)
+    lignes = Portage.objects.filter(
+        proprietaire=utilisateur, date__gte=debut, date__lte=fin
+    ).annotate(periode=TRONCATURES[pas]('date')).values('periode').annotate(
+        portages=Count('pk'),
+        vetements=Count('vetement', distinct=True),
+    ).order_by()
+    par_periode = {ligne['periode']: ligne for ligne in lignes}
+
+    serie = []
+    periode = debut
+    while periode <= fin:
+        ligne = par_periode.get(periode, {})
+        serie.append({
+            'periode': periode,
+            'portages': ligne.get('portages', 0),
+            'vetements': ligne.get('vetements', 0),
+        })
+        periode = periode_suivante(periode, pas)
+    return serie
+
+
+def calculer_statistiques(utilisateur, aujourd_hui=None):
+    """Statistiques de la garde-robe d'utilisateur, en huit requêtes"""
+    aujourd_hui = aujourd_hui or timezone.localdate()
+    vetements = Vetement.objects.filter(proprietaire=utilisateur)
+    statistiques = StatistiquesGardeRobe()
+
+    # 1. Totaux, valeurs et compteurs des alertes : un seul agrégat conditionnel
+    totaux = vetements.aggregate(
+        total_vetements=Count('pk'),
+        total_depense=Sum('prix_achat'),
+        total_portages=Sum('nombre_portage'),
+        cout_moyen_portage=Avg(COUT_PAR_PORTAGE, filter=AVEC_COUT),
+        nb_jamais_portes=Count('pk', filter=Q(nombre_portage=0)),
+        nb_anciens=Count('pk', filter=Q(derniere_utilisation__lt=aujourd_hui - timedelta(days=180))
+                         & ~Q(nombre_portage=0)),
+        vetements_recents=Count('pk', filter=Q(derniere_utilisation__gte=aujourd_hui - timedelta(days=30))),
+        valeur_portee=Sum('prix_achat', filter=Q(nombre_portage__gt=0)),
+        valeur_non_portee=Sum('prix_achat', filter=Q(nombre_portage=0)),
+    )
+    for nom, valeur in totaux.items():
+        if valeur is not None:
+            setattr(statistiques, nom, valeur)
+    if statistiques.total_vetements:
+        statistiques.taux_rotation = statistiques.vetements_recents / statistiques.total_vetements * 100
+
+    # 2. Répartition par catégorie et coût moyen par portage de chaque catégorie
+    statistiques.par_categorie = list(vetements.values('categorie__nom').annotate(
+        count=Count('pk'),
+        cout_moyen=Avg(COUT_PAR_PORTAGE, filter=AVEC_COUT),
+        nb_couts=Count('pk', filter=AVEC_COUT),
+    ).order_by('-count', 'categorie__nom'))
+    statistiques.cout_par_categorie = sorted(
+        (
+            {'categorie': ligne['categorie__nom'], 'cout_moyen': ligne['cout_moyen'], 'count': ligne['nb_couts']}
+            for ligne in statistiques.par_categorie if ligne['nb_couts']
+        ),
+        key=lambda item: item['cout_moyen'],
+    )[:10]
+
+    # 3. Répartition par couleur (les vêtements sans couleur comptent dans le graphique)
+    par_couleur = list(vetements.values('couleur__nom', 'couleur__code_hex').annotate(
+        count=Count('pk')
+    ).order_by('-count', 'couleur__nom'))
+    statistiques.par_couleur = par_couleur[:10]
+    statistiques.couleurs_dominantes = [ligne for ligne in par_couleur if ligne['couleur__nom'] is not None][:5]
+
+    # 4. Répartition par saison
+    statistiques.par_saison = list(vetements.values('saison').annotate(count=Count('pk')).order_by('-count', 'saison'))
+
+    # 5. Portages de chacun des derniers mois
+    debuts = debuts_de_mois(aujourd_hui)
+    fin = periode_suivante(debuts[-1], 'mois') - timedelta(days=1)
+    serie = serie_portages(utilisateur, debuts[0], fin, 'mois')
+    statistiques.utilisation_mensuelle = [periode['portages'] for periode in serie]
+    statistiques.labels_mois = [debut.strftime('%b %Y') for debut in debuts]
+
+    # 6-8. Listes de vêtements affichées
+    avec_categorie = vetements.select_related('categorie')
+    statistiques.plus_portes = list(avec_categorie.filter(nombre_portage__gt=0).order_by('-nombre_portage')[:10])
+    statistiques.peu_portes = list(avec_categorie.filter(nombre_portage__lt=Vetement.SEUIL_PEU_PORTE))
+    statistiques.plus_rentables = list(avec_categorie.filter(
+        AVEC_COUT, nombre_portage__gte=PORTAGES_MIN_RENTABLE
+    ).annotate(cout=COUT_PAR_PORTAGE).order_by('cout')[:10])
+    return statistiques
@@ -2,17 +2,1079 @@
 Custom storage backend pour uploader les fichiers vers Unraid via SFTP
 """
 
+import hashlib
+import io
+import json
+import logging
 import os
+import queue
+import re
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import urlencode
 import paramiko
-from io import BytesIO
-from django.core.files.storage import Storage
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.core.files.utils import validate_file_name
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
 from django.utils.deconstruct import deconstructible
 from decouple import config
 
+from .signatures import media_url_params
+
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledConnection:
+    """Session SSH/SFTP conservée par le pool"""
+
+    __slots__ = ('ssh', 'sftp', 'created_at', 'last_used')
+
+    def __init__(self, ssh, sftp):
+        self.ssh = ssh
+        self.sftp = sftp
+        self.created_at = self.last_used = time.monotonic()
+
+    def is_alive(self):
+        transport = self.ssh.get_transport()
+        return transport is not None and transport.is_active()
+
+    def close(self):
+        for resource in (self.sftp, self.ssh):
+            try:
+                resource.close()
+            except Exception:
+                pass
+
+
+class SFTPConnectionPool:
+    """
+    Pool borné de sessions SFTP authentifiées, partagé entre les threads
+    d'un même processus.
+
+    - max_size : nombre maximum de sessions ouvertes simultanément
+    - idle_timeout : durée (s) au-delà de laquelle une session inactive est fermée
+    - health_check_interval : durée (s) d'inactivité après laquelle une session
+      est vérifiée par un aller-retour SFTP avant d'être réutilisée
+    - acquire_timeout : attente maximale (s) d'une session libre
+    """
+
+    def __init__(self, connect, max_size=4, idle_timeout=300,
+                 health_check_interval=30, acquire_timeout=30):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._available = threading.Condition(threading.Lock())
+        self._idle = []
+        self._in_use = 0
+        self._pid = os.getpid()
+
+        # Nombre de handshakes SSH effectués (utile pour les mesures)
+        self.handshakes = 0
+
+    def _reset_after_fork(self):
+        """Oublier les sessions héritées du processus parent (gunicorn --preload)"""
+        if self._pid != os.getpid():
+            # Ne pas fermer : les sockets appartiennent encore au parent
+            self._idle = []
+            self._in_use = 0
+            self._pid = os.getpid()
+
+    def _evict_idle(self):
+        """Retirer les sessions inactives depuis trop longtemps (verrou tenu)"""
+        now = time.monotonic()
+        expired = [c for c in self._idle if now - c.last_used > self.idle_timeout]
+        if expired:
+            self._idle = [c for c in self._idle if c not in expired]
+        return expired
+
+    def _is_healthy(self, conn):
+        if not conn.is_alive():
+            return False
+        if time.monotonic() - conn.last_used > self.health_check_interval:
+            try:
+                conn.sftp.normalize('.')
+            except Exception:
+                return False
+        return True
+
+    def _open(self):
+        ssh, sftp = self._connect()
+        self.handshakes += 1
+        return _PooledConnection(ssh, sftp)
+
+    def acquire(self):
+        """Obtenir une session (réutilisée si possible, sinon nouvelle)"""
+        deadline = time.monotonic() + self.acquire_timeout
+        conn = None
+        with self._available:
+            self._reset_after_fork()
+            while True:
+                expired = self._evict_idle()
+                for old in expired:
+                    old.close()
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._in_use < self.max_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise IOError("SFTP pool exhausted: no connection available")
+                self._available.wait(remaining)
+            self._in_use += 1
+
+        try:
+            if conn is not None and not self._is_healthy(conn):
+                conn.close()
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._available:
+                self._in_use -= 1
+                self._available.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard=False):
+        """Rendre une session au pool (ou la fermer si elle est inutilisable)"""
+        conn.last_used = time.monotonic()
+        with self._available:
+            if self._pid != os.getpid():
+                return
+            self._in_use -= 1
+            keep = not discard and conn.is_alive()
+            if keep:
+                self._idle.append(conn)
+            self._available.notify()
+        if not keep:
+            conn.close()
+
+    def run(self, operation):
+        """
+        Exécuter operation(sftp) avec une session du pool.
+        Si la session s'avère morte pendant l'opération, elle est
+        remplacée et l'opération est rejouée une fois.
+        """
+        for attempt in (1, 2):
+            conn = self.acquire()
+            try:
+                result = operation(conn.sftp)
+            except Exception:
+                alive = conn.is_alive()
+                self.release(conn, discard=not alive)
+                if alive or attempt == 2:
+                    raise
+                logger.warning("Session SFTP perdue, reconnexion")
+                continue
+            self.release(conn)
+            return result
+
+    def close(self):
+        """Fermer toutes les sessions inactives"""
+        with self._available:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+# Un pool par serveur, partagé par toutes les instances du storage du processus
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(key, factory):
+    """Retourner le pool associé à key, en le créant au besoin"""
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = factory()
+        return pool
+
+
+class RemoteStatCache:
+    """
+    Cache en mémoire des métadonnées distantes (stat et listdir_attr).
+
+    - ttl : durée de vie (s) d'un stat ou d'un listing connu
+    - negative_ttl : durée de vie (s) d'une absence constatée
+    - max_entries : nombre maximum de stats conservés
+
+    Un listing de répertoire alimente aussi le stat de chacun de ses
+    fichiers, si bien qu'un listdir suivi d'un size() par entrée ne coûte
+    qu'un aller-retour.
+    """
+
+    def __init__(self, ttl=60, negative_ttl=10, max_entries=10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._stats = OrderedDict()  # chemin -> (attrs ou None, expiration)
+        self._listings = {}          # répertoire -> (entrées, expiration)
+
+    @staticmethod
+    def _key(path):
+        return os.path.normpath(path)
+
+    def _store(self, path, attrs, ttl):
+        """Enregistrer un stat (verrou tenu)"""
+        self._stats[path] = (attrs, time.monotonic() + ttl)
+        self._stats.move_to_end(path)
+        while len(self._stats) > self.max_entries:
+            self._stats.popitem(last=False)
+
+    def get(self, path):
+        """
+        Retourner (trouvé, attrs). attrs vaut None si le fichier est connu
+        comme absent ; trouvé vaut False si rien n'est en cache.
+        """
+        path = self._key(path)
+        with self._lock:
+            cached = self._stats.get(path)
+            if cached is None:
+                return False, None
+            attrs, expires = cached
+            if expires < time.monotonic():
+                del self._stats[path]
+                return False, None
+            return True, attrs
+
+    def set(self, path, attrs):
+        path = self._key(path)
+        attrs.filename = os.path.basename(path)
+        with self._lock:
+            self._store(path, attrs, self.ttl)
+            self._update_listing(path, attrs)
+
+    def set_missing(self, path):
+        path = self._key(path)
+        with self._lock:
+            self._store(path, None, self.negative_ttl)
+            self._update_listing(path, None)
+
+    def _update_listing(self, path, attrs):
+        """Répercuter un ajout ou une suppression sur le listing parent (verrou tenu)"""
+        parent, filename = os.path.split(path)
+        cached = self._listings.get(parent)
+        if cached is None:
+            return
+        entries, expires = cached
+        entries = [entry for entry in entries if entry.filename != filename]
+        if attrs is not None:
+            entries.append(attrs)
+        self._listings[parent] = (entries, expires)
+
+    def get_listing(self, path):
+        path = self._key(path)
+        with self._lock:
+            cached = self._listings.get(path)
+            if cached is None:
+                return None
+            entries, expires = cached
+            if expires < time.monotonic():
+                del self._listings[path]
+                return None
+            return list(entries)
+
+    def set_listing(self, path, entries):
+        path = self._key(path)
+        with self._lock:
+            self._listings[path] = (list(entries), time.monotonic() + self.ttl)
+            for entry in entries:
+                self._store(os.path.join(path, entry.filename), entry, self.ttl)
+
+    def discard(self, path):
+        """Oublier tout ce qui est connu de path et de son répertoire parent"""
+        path = self._key(path)
+        with self._lock:
+            self._stats.pop(path, None)
+            self._listings.pop(os.path.dirname(path), None)
+
+
+# Un cache de métadonnées par serveur, partagé par toutes les instances du storage du processus
+_stat_caches = {}
+_stat_caches_lock = threading.Lock()
+
+
+def get_stat_cache(key, factory):
+    """Retourner le cache de métadonnées associé à key, en le créant au besoin"""
+    with _stat_caches_lock:
+        cache = _stat_caches.get(key)
+        if cache is None:
+            cache = _stat_caches[key] = factory()
+        return cache
+
+
+# Un cache disque par répertoire, partagé par toutes les instances du storage du processus
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_file_cache(directory, max_bytes):
+    """Retourner le cache local associé à directory, en le créant au besoin"""
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            cache = _caches[directory] = LocalFileCache(directory, max_bytes)
+        return cache
+
+
+class SFTPStreamingFile(io.RawIOBase):
+    """
+    Fichier distant en lecture seule, lu à la demande par morceaux.
+
+    Seules les plages demandées sont transférées : une lecture d'en-tête
+    (Pillow, get_image_dimensions) ne coûte que quelques Ko. Tant que les
+    lectures sont séquentielles, la fenêtre de lecture anticipée double à
+    chaque requête jusqu'à max_read_ahead, et ses morceaux sont demandés en
+    parallèle (readv). La mémoire occupée reste bornée par cette fenêtre,
+    quelle que soit la taille du fichier.
+
+    release(discard) est appelé à la fermeture pour rendre la session SFTP.
+    """
+
+    CHUNK_SIZE = 32 * 1024
+
+    def __init__(self, handle, size, release, max_read_ahead=1024 * 1024):
+        super().__init__()
+        self._handle = handle
+        self._release = release
+        self.size = size
+        self.max_read_ahead = max_read_ahead
+
+        self._pos = 0
+        self._buffer = b''
+        self._buffer_start = 0
+        self._read_ahead = self.CHUNK_SIZE
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError(f"negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def _fill(self, wanted):
+        """Charger dans le tampon la plage commençant à la position courante"""
+        buffer_end = self._buffer_start + len(self._buffer)
+        if self._pos == buffer_end and self._buffer:
+            # Lecture séquentielle : élargir la fenêtre
+            self._read_ahead = min(self._read_ahead * 2, self.max_read_ahead)
+        else:
+            self._read_ahead = self.CHUNK_SIZE
+
+        length = min(max(wanted, self._read_ahead), self.size - self._pos)
+        chunks = [
+            (offset, min(self.CHUNK_SIZE, self._pos + length - offset))
+            for offset in range(self._pos, self._pos + length, self.CHUNK_SIZE)
+        ]
+        self._buffer = b''.join(self._handle.readv(chunks))
+        self._buffer_start = self._pos
+
+    def readinto(self, b):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        wanted = len(b)
+        if wanted == 0 or self._pos >= self.size:
+            return 0
+
+        offset = self._pos - self._buffer_start
+        if not 0 <= offset < len(self._buffer):
+            self._fill(wanted)
+            offset = 0
+
+        data = self._buffer[offset:offset + wanted]
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        discard = False
+        try:
+            self._handle.close()
+        except Exception:
+            discard = True
+        finally:
+            self._buffer = b''
+            super().close()
+            self._release(discard)
+
+
+class LocalFileCache:
+    """
+    Cache disque local (read-through) des fichiers lus sur le serveur distant.
+
+    Les entrées sont indexées par (nom, taille, mtime) : une nouvelle version
+    du fichier distant produit une nouvelle clé et l'ancienne copie est
+    supprimée. Les fichiers les moins récemment lus sont évincés dès que le
+    budget max_bytes est dépassé. Les écritures passent par un fichier
+    temporaire renommé atomiquement, et les lecteurs concurrents d'un même
+    fichier partagent un seul téléchargement.
+    """
+
+    SUFFIX = '.cache'
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clé -> taille, ordre LRU
+        self._names = {}               # nom -> clé de la version en cache
+        self._inflight = {}            # clé -> threading.Event
+        self.current_bytes = 0
+
+        # Nombre de téléchargements effectués (utile pour les mesures)
+        self.downloads = 0
+
+        self._load()
+
+    def _load(self):
+        """Reprendre les fichiers déjà présents sur disque, du plus ancien au plus récent"""
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.SUFFIX):
+                stat = entry.stat()
+                found.append((stat.st_atime, entry.name[:-len(self.SUFFIX)], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.current_bytes += size
+        self._evict()
+
+    @staticmethod
+    def make_key(name, size, mtime):
+        return hashlib.sha256(f"{name}\0{size}\0{mtime}".encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _remove(self, key):
+        """Retirer une entrée de l'index et du disque (verrou tenu)"""
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self.current_bytes -= size
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Évincer les entrées les moins récemment utilisées (verrou tenu)"""
+        while self.current_bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._remove(key)
+
+    def _lookup(self, key):
+        """Retourner le chemin de l'entrée si elle est en cache (verrou tenu)"""
+        if key not in self._entries:
+            return None
+        path = self.path(key)
+        if not os.path.exists(path):
+            # Évincée par un autre processus partageant le répertoire
+            self.current_bytes -= self._entries.pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return path
+
+    def open(self, name, size, mtime, download):
+        """
+        Ouvrir la copie locale de name, en la téléchargeant au besoin via
+        download(fileobj). Retourne un fichier ouvert en lecture binaire.
+        """
+        key = self.make_key(name, size, mtime)
+        while True:
+            with self._lock:
+                path = self._lookup(key)
+                if path is not None:
+                    try:
+                        return open(path, 'rb')
+                    except FileNotFoundError:
+                        self.current_bytes -= self._entries.pop(key, 0)
+                pending = self._inflight.get(key)
+                if pending is None:
+                    pending = self._inflight[key] = threading.Event()
+                    break
+            # Un autre thread télécharge déjà ce fichier : attendre son résultat
+            pending.wait()
+            with self._lock:
+                if key not in self._entries:
+                    # Le téléchargement a échoué ou l'entrée dépasse le budget
+                    continue
+
+        try:
+            return self._fill(name, key, size, download)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.set()
+
+    def _fill(self, name, key, size, download):
+        """Télécharger dans un fichier temporaire puis le publier atomiquement"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                download(tmp)
+            self.downloads += 1
+            result = open(tmp_path, 'rb')
+            actual = os.path.getsize(tmp_path)
+            if actual > self.max_bytes:
+                # Trop gros pour le cache : servir le fichier sans le conserver
+                os.remove(tmp_path)
+                return result
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            previous = self._names.get(name)
+            if previous is not None and previous != key:
+                self._remove(previous)
+            self._names[name] = key
+            if key in self._entries:
+                self.current_bytes -= self._entries[key]
+            self._entries[key] = actual
+            self.current_bytes += actual
+            self._evict()
+        return result
+
+    def discard(self, name):
+        """Oublier la version en cache de name (après écriture ou suppression)"""
+        with self._lock:
+            key = self._names.pop(name, None)
+            if key is not None:
+                self._remove(key)
+
+
+class UploadQueue:
+    """
+    File d'envoi en arrière-plan (write-behind) vers le serveur distant.
+
+    Les fichiers sont d'abord déposés dans staging_dir, puis poussés par
+    des threads de fond via push(name, local_path). Un envoi en échec est
+    retenté jusqu'à max_attempts fois avec un délai exponentiel ; le
+    fichier reste en staging tant qu'il n'a pas été envoyé. Au démarrage,
+    les fichiers laissés en staging depuis plus de recover_after secondes
+    (processus redémarré, envoi abandonné) sont remis dans la file.
+    """
+
+    PART_SUFFIX = '.part'
+
+    def __init__(self, push, staging_dir, workers=2, max_attempts=5,
+                 backoff=2.0, recover_after=300):
+        self._push = push
+        self.staging_dir = staging_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.recover_after = recover_after
+        os.makedirs(staging_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._threads = []
+        self._pid = os.getpid()
+
+    def staged_path(self, name):
+        return os.path.join(self.staging_dir, name)
+
+    def is_staged(self, name):
+        return os.path.isfile(self.staged_path(name))
+
+    def stage(self, name, content):
+        """Déposer content en staging (écriture atomique) et planifier son envoi"""
+        path = self.staged_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=self.PART_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'temporary_file_path'):
+                    with open(content.temporary_file_path(), 'rb') as source:
+                        shutil.copyfileobj(source, tmp)
+                else:
+                    content.seek(0)
+                    shutil.copyfileobj(content, tmp)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.submit(name)
+
+    def cancel(self, name):
+        """Abandonner l'envoi de name (le worker ignorera l'entrée)"""
+        try:
+            os.remove(self.staged_path(name))
+        except OSError:
+            pass
+
+    def submit(self, name):
+        with self._lock:
+            recovered = self._start()
+            for pending in [name] + recovered:
+                if pending not in self._pending:
+                    self._pending.add(pending)
+                    self._queue.put(pending)
+
+    def _start(self):
+        """Démarrer les workers au premier envoi (verrou tenu), retourne les fichiers à reprendre"""
+        if self._pid != os.getpid():
+            # Les threads ne survivent pas à un fork
+            self._threads = []
+            self._pending = set()
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+        if self._threads:
+            return []
+
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f'sftp-upload-{index}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self._recover()
+
+    def _recover(self):
+        """Lister les fichiers restés en staging depuis trop longtemps"""
+        limit = time.time() - self.recover_after
+        names = []
+        for root, _, files in os.walk(self.staging_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if filename.endswith(self.PART_SUFFIX):
+                    continue
+                try:
+                    if os.path.getmtime(path) < limit:
+                        names.append(os.path.relpath(path, self.staging_dir))
+                except OSError:
+                    pass
+        return names
+
+    def _work(self):
+        while True:
+            name = self._queue.get()
+            try:
+                self._process(name)
+            except Exception:
+                logger.exception("Erreur inattendue lors de l'envoi de %s", name)
+            finally:
+                with self._lock:
+                    self._pending.discard(name)
+                self._queue.task_done()
+
+    def _process(self, name):
+        for attempt in range(1, self.max_attempts + 1):
+            path = self.staged_path(name)
+            if not os.path.isfile(path):
+                return  # Envoi annulé ou déjà effectué
+            try:
+                self._push(name, path)
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.error("Envoi de %s abandonné après %d essais : %s", name, attempt, e)
+                    return
+                delay = self.backoff * 2 ** (attempt - 1)
+                logger.warning("Envoi de %s échoué (%s), nouvel essai dans %.0fs", name, e, delay)
+                time.sleep(delay)
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return
+
+    def join(self):
+        """Attendre que tous les envois planifiés soient terminés"""
+        self._queue.join()
+
+
+# Une file d'envoi par répertoire de staging, partagée par toutes les instances du storage du processus
+_upload_queues = {}
+_upload_queues_lock = threading.Lock()
+
+
+def get_upload_queue(staging_dir, factory):
+    """Retourner la file d'envoi associée à staging_dir, en la créant au besoin"""
+    with _upload_queues_lock:
+        upload_queue = _upload_queues.get(staging_dir)
+        if upload_queue is None:
+            upload_queue = _upload_queues[staging_dir] = factory()
+        return upload_queue
+
+
+
+class ReplicationJournal:
+    """
+    Journal durable des réplications vers le tier distant.
+
+    Une entrée par fichier, dans un petit fichier JSON écrit de façon
+    atomique (et synchronisé sur disque) : le journal survit aux
+    redémarrages. La dernière opération demandée ('put' ou 'delete')
+    remplace la précédente ; complete() ne retire une entrée que si elle
+    n'a pas été remplacée entre-temps.
+    """
+
+    SUFFIX = '.json'
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.directory, hashlib.sha1(name.encode('utf-8')).hexdigest() + self.SUFFIX)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def record(self, operation, name):
+        entry = {'operation': operation, 'name': name, 'token': uuid.uuid4().hex, 'time': time.time()}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as tmp:
+                json.dump(entry, tmp)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            with self._lock:
+                os.replace(tmp_path, self._path(name))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return entry
+
+    def get(self, name):
+        return self._read(self._path(name))
+
+    def complete(self, entry):
+        """Retirer entry du journal, sauf si une opération plus récente l'a remplacée"""
+        with self._lock:
+            current = self.get(entry['name'])
+            if current is not None and current['token'] == entry['token']:
+                try:
+                    os.remove(self._path(entry['name']))
+                except OSError:
+                    pass
+
+    def pending(self):
+        """Entrées en attente, de la plus ancienne à la plus récente"""
+        entries = []
+        for filename in os.listdir(self.directory):
+            if filename.endswith(self.SUFFIX):
+                entry = self._read(os.path.join(self.directory, filename))
+                if entry is not None:
+                    entries.append(entry)
+        return sorted(entries, key=lambda entry: entry['time'])
+
+
+class ReplicaHealth:
+    """
+    État de santé du tier distant.
+
+    Un échec signalé par report_failure() le déclare indisponible : un
+    thread de fond le sonde alors toutes les interval secondes et, dès qu'il
+    répond, le déclare disponible et appelle on_recovery(). is_healthy()
+    ne fait aucun accès réseau : une requête n'attend jamais le serveur
+    distant pour savoir s'il répond.
+    """
+
+    def __init__(self, probe, interval=30, on_recovery=None):
+        self._probe = probe
+        self.interval = interval
+        self.on_recovery = on_recovery
+        self._healthy = threading.Event()
+        self._healthy.set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = os.getpid()
+
+    def is_healthy(self):
+        return self._healthy.is_set()
+
+    def report_failure(self, error=None):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Les threads ne survivent pas à un fork
+                self._thread = None
+                self._pid = os.getpid()
+            was_healthy = self._healthy.is_set()
+            self._healthy.clear()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._monitor, name='replica-health', daemon=True)
+                self._thread.start()
+        if was_healthy:
+            logger.warning("Serveur distant indisponible (%s), bascule sur le stockage local", error)
+
+    def check(self):
+        """Sonder immédiatement le tier distant ; retourne True s'il répond"""
+        try:
+            self._probe()
+        except Exception as e:
+            self.report_failure(e)
+            return False
+        return True
+
+    def _monitor(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self._probe()
+            except Exception:
+                continue
+            with self._lock:
+                self._healthy.set()
+                self._thread = None
+            logger.info("Serveur distant de nouveau disponible")
+            if self.on_recovery is not None:
+                try:
+                    self.on_recovery()
+                except Exception:
+                    logger.exception("Erreur lors de la réconciliation")
+            return
+
+
+class Replicator:
+    """
+    Workers de réplication : appliquent au tier distant les entrées du
+    journal via replicate(entry). Une entrée n'est retirée du journal
+    qu'après succès ; en cas d'échec, le tier distant est déclaré
+    indisponible et l'entrée sera rejouée par reconcile() à son retour.
+    Au démarrage, les entrées laissées par un processus précédent sont
+    rejouées.
+    """
+
+    def __init__(self, journal, replicate, health, workers=2):
+        self.journal = journal
+        self._replicate = replicate
+        self.health = health
+        self.workers = workers
+        health.on_recovery = self.reconcile
+
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._threads = []
+        self._pid = os.getpid()
+
+    def submit(self, name):
+        with self._lock:
+            names = [name] + self._start()
+            for pending in names:
+                if pending not in self._pending:
+                    self._pending.add(pending)
+                    self._queue.put(pending)
+
+    def reconcile(self):
+        """Rejouer toutes les entrées du journal ; retourne leur nombre"""
+        entries = self.journal.pending()
+        for entry in entries:
+            self.submit(entry['name'])
+        return len(entries)
+
+    def _start(self):
+        """Démarrer les workers au premier appel (verrou tenu), retourne les noms à reprendre"""
+        if self._pid != os.getpid():
+            self._threads = []
+            self._pending = set()
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+        if self._threads:
+            return []
+
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'replication-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return [entry['name'] for entry in self.journal.pending()]
+
+    def _work(self):
+        while True:
+            name = self._queue.get()
+            try:
+                entry = self.journal.get(name)
+                # Serveur indisponible : l'entrée reste au journal jusqu'à son retour
+                if entry is not None and self.health.is_healthy():
+                    self._process(entry)
+            except Exception:
+                logger.exception("Erreur inattendue lors de la réplication de %s", name)
+            finally:
+                with self._lock:
+                    self._pending.discard(name)
+                self._queue.task_done()
+
+    def _process(self, entry):
+        try:
+            self._replicate(entry)
+        except Exception as e:
+            self.health.report_failure(e)
+            return
+        self.journal.complete(entry)
+
+    def join(self):
+        """Attendre que toutes les réplications planifiées soient traitées"""
+        self._queue.join()
+
+
+# Un réplicateur par journal, partagé par toutes les instances du storage du processus
+_replicators = {}
+_replicators_lock = threading.Lock()
+
+
+def get_replicator(journal_dir, factory):
+    """Retourner le réplicateur associé à journal_dir, en le créant au besoin"""
+    with _replicators_lock:
+        replicator = _replicators.get(journal_dir)
+        if replicator is None:
+            replicator = _replicators[journal_dir] = factory()
+        return replicator
+
+class ContentAddressedStorageMixin:
+    """
+    Mode de stockage adressé par contenu.
+
+    Un fichier envoyé est nommé d'après l'empreinte SHA-256 de ses octets,
+    dans une arborescence répartie sur deux niveaux, en conservant le
+    répertoire d'upload_to et l'extension :
+
+        vetements/photo.jpg -> vetements/3f/a2/3fa2...c9.jpg
+
+    Le nom ne dépend que du contenu : aucune recherche de nom libre
+    (get_available_name) n'est nécessaire, deux envois identiques partagent
+    le même fichier et l'URL d'un fichier ne change jamais de contenu (elle
+    peut être mise en cache indéfiniment). Chaque envoi ajoute une référence
+    dans MediaBlob ; delete() retire une référence et ne supprime le fichier
+    qu'à la dernière.
+
+    Les noms déjà dérivés d'une empreinte (vignettes d'un fichier adressé
+    par contenu) sont enregistrés tels quels.
+    """
+
+    content_addressed = True
+
+    HASH_PREFIX_RE = re.compile(r'^[0-9a-f]{64}')
+    BLOB_NAME_RE = re.compile(r'^[0-9a-f]{64}(\.[0-9a-z]+)?$')
+
+    @staticmethod
+    def content_digest(content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def blob_name(name, digest):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest[2:4], digest + extension)
+
+    def is_blob(self, name):
+        """Vérifier que name est le nom d'un fichier adressé par contenu (et pas d'un dérivé)"""
+        return bool(self.BLOB_NAME_RE.match(os.path.basename(name)))
+
+    def save(self, name, content, max_length=None):
+        if not self.content_addressed:
+            return super().save(name, content, max_length=max_length)
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        if self.HASH_PREFIX_RE.match(os.path.basename(name)):
+            # Dérivé d'un fichier adressé par contenu : nom déterministe
+            validate_file_name(name, allow_relative_path=True)
+            return self._save(name, content)
+
+        name = self.blob_name(name, self.content_digest(content))
+        validate_file_name(name, allow_relative_path=True)
+        if not self.exists(name):
+            content.seek(0)
+            name = self._save(name, content)
+
+        from .models import MediaBlob
+        MediaBlob.objects.get_or_create(nom=name)
+        MediaBlob.objects.filter(nom=name).update(references=F('references') + 1)
+        return name
+
+    def release_blob(self, name):
+        """
+        Retirer une référence à name. Retourne True si le fichier peut être
+        supprimé (dernière référence, ou fichier non adressé par contenu).
+        """
+        if not (self.content_addressed and self.is_blob(name)):
+            return True
+        from .models import MediaBlob
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(nom=name).first()
+            if blob is not None:
+                if blob.references > 1:
+                    MediaBlob.objects.filter(pk=blob.pk).update(references=F('references') - 1)
+                    return False
+                blob.delete()
+        return True
+
+    def delete(self, name):
+        if self.release_blob(name):
+            super().delete(name)
+
+
+@deconstructible
+class ContentAddressedFileSystemStorage(ContentAddressedStorageMixin, FileSystemStorage):
+    """Stockage local adressé par contenu (développement, sans serveur Unraid)"""
+
 
 @deconstructible
-class UnraidSFTPStorage(Storage):
+class UnraidSFTPStorage(ContentAddressedStorageMixin, Storage):
     """
     Backend de stockage personnalisé pour uploader les fichiers
     vers le serveur nginx Unraid via SFTP.
@@ -25,6 +1087,33 @@ class UnraidSFTPStorage(Storage):
     - UNRAID_SFTP_KEY_PATH : Chemin vers clé SSH privée (optionnel)
     - UNRAID_MEDIA_PATH : Chemin distant (ex: /mnt/user/appdata/garde-robe/media/)
     - MEDIA_URL : URL publique nginx (ex: https://media.votredomaine.com/media/)
+
+    Pool de connexions (optionnel) :
+    - UNRAID_SFTP_POOL : Réutiliser les sessions SFTP entre requêtes (défaut: True)
+    - UNRAID_SFTP_POOL_SIZE : Nombre maximum de sessions par processus (défaut: 4)
+    - UNRAID_SFTP_POOL_IDLE_TIMEOUT : Fermeture des sessions inactives, en secondes (défaut: 300)
+
+    Cache local des fichiers lus (optionnel) :
+    - UNRAID_MEDIA_CACHE : Conserver sur disque les fichiers téléchargés (défaut: True)
+    - UNRAID_MEDIA_CACHE_DIR : Répertoire du cache (défaut: <tmp>/garde-robe-media-cache)
+    - UNRAID_MEDIA_CACHE_MAX_MB : Taille maximum du cache en Mo (défaut: 256)
+
+    Cache des métadonnées (exists, size, listdir) :
+    - UNRAID_SFTP_STAT_CACHE_TTL : Durée de vie d'un stat ou listing, en secondes (défaut: 60, 0 pour désactiver)
+    - UNRAID_SFTP_STAT_CACHE_NEGATIVE_TTL : Durée de vie d'une absence constatée, en secondes (défaut: 10)
+
+    Envoi en arrière-plan (write-behind, optionnel) :
+    - UNRAID_SFTP_WRITE_BEHIND : Déposer les uploads en local et les envoyer en tâche de fond (défaut: False)
+    - UNRAID_UPLOAD_STAGING_DIR : Répertoire de staging (défaut: <tmp>/garde-robe-upload-staging)
+    - UNRAID_UPLOAD_WORKERS : Nombre de threads d'envoi par processus (défaut: 2)
+    - UNRAID_UPLOAD_MAX_ATTEMPTS : Nombre d'essais avant abandon (défaut: 5)
+
+    Stockage adressé par contenu (optionnel, voir ContentAddressedStorageMixin) :
+    - UNRAID_CONTENT_ADDRESSED : Nommer les fichiers d'après l'empreinte de leur contenu (défaut: False)
+
+    URLs signées (optionnel, vérifiées par nginx, voir vetements.signatures) :
+    - MEDIA_SIGNING_SECRET : Secret partagé avec le serveur média (défaut: vide, URLs publiques)
+    - MEDIA_URL_TTL : Durée de validité minimum d'une URL, en secondes (défaut: 3600)
     """
 
     def __init__(self):
@@ -39,6 +1128,33 @@ class UnraidSFTPStorage(Storage):
         )
         self.base_url = config('MEDIA_URL', default='/media/')
 
+        self.pool_enabled = config('UNRAID_SFTP_POOL', default=True, cast=bool)
+        self.pool_size = config('UNRAID_SFTP_POOL_SIZE', default=4, cast=int)
+        self.pool_idle_timeout = config('UNRAID_SFTP_POOL_IDLE_TIMEOUT', default=300, cast=int)
+
+        self.cache_enabled = config('UNRAID_MEDIA_CACHE', default=True, cast=bool)
+        self.cache_dir = config(
+            'UNRAID_MEDIA_CACHE_DIR',
+            default=os.path.join(tempfile.gettempdir(), 'garde-robe-media-cache')
+        )
+        self.cache_max_bytes = config('UNRAID_MEDIA_CACHE_MAX_MB', default=256, cast=int) * 1024 * 1024
+
+        self.stat_cache_ttl = config('UNRAID_SFTP_STAT_CACHE_TTL', default=60, cast=int)
+        self.stat_cache_negative_ttl = config('UNRAID_SFTP_STAT_CACHE_NEGATIVE_TTL', default=10, cast=int)
+
+        self.write_behind = config('UNRAID_SFTP_WRITE_BEHIND', default=False, cast=bool)
+        self.staging_dir = config(
+            'UNRAID_UPLOAD_STAGING_DIR',
+            default=os.path.join(tempfile.gettempdir(), 'garde-robe-upload-staging')
+        )
+        self.upload_workers = config('UNRAID_UPLOAD_WORKERS', default=2, cast=int)
+        self.upload_max_attempts = config('UNRAID_UPLOAD_MAX_ATTEMPTS', default=5, cast=int)
+
+        self.content_addressed = config('UNRAID_CONTENT_ADDRESSED', default=False, cast=bool)
+
+        self.signing_secret = config('MEDIA_SIGNING_SECRET', default='')
+        self.url_ttl = config('MEDIA_URL_TTL', default=3600, cast=int)
+
     def _get_sftp_client(self):
         """Établir une connexion SFTP"""
         ssh = paramiko.SSHClient()
@@ -64,43 +1180,151 @@ class UnraidSFTPStorage(Storage):
         else:
             raise ValueError("SFTP credentials not configured (password or key required)")
 
+        # Garder la session ouverte à travers les NAT entre deux requêtes
+        ssh.get_transport().set_keepalive(30)
+
         return ssh, ssh.open_sftp()
 
-    def _save(self, name, content):
-        """Upload un fichier vers Unraid"""
+    def _get_pool(self):
+        key = (self.host, self.port, self.username, self.key_path)
+        return get_connection_pool(key, lambda: SFTPConnectionPool(
+            self._get_sftp_client,
+            max_size=self.pool_size,
+            idle_timeout=self.pool_idle_timeout,
+        ))
+
+    def _get_cache(self):
+        if not self.cache_enabled:
+            return None
+        return get_file_cache(self.cache_dir, self.cache_max_bytes)
+
+    def _get_stat_cache(self):
+        if self.stat_cache_ttl <= 0:
+            return None
+        key = (self.host, self.port, self.remote_path)
+        return get_stat_cache(key, lambda: RemoteStatCache(
+            ttl=self.stat_cache_ttl,
+            negative_ttl=self.stat_cache_negative_ttl,
+        ))
+
+    def _get_upload_queue(self):
+        if not self.write_behind:
+            return None
+        return get_upload_queue(self.staging_dir, lambda: UploadQueue(
+            self._push,
+            self.staging_dir,
+            workers=self.upload_workers,
+            max_attempts=self.upload_max_attempts,
+        ))
+
+    def _staged_path(self, name):
+        """Chemin local de name s'il attend encore d'être envoyé, sinon None"""
+        upload_queue = self._get_upload_queue()
+        if upload_queue is not None and upload_queue.is_staged(name):
+            return upload_queue.staged_path(name)
+        return None
+
+    def _run(self, operation):
+        """Exécuter operation(sftp) sur une session poolée ou éphémère"""
+        if self.pool_enabled:
+            return self._get_pool().run(operation)
+
         ssh, sftp = None, None
         try:
             ssh, sftp = self._get_sftp_client()
+            return operation(sftp)
+        finally:
+            if sftp:
+                sftp.close()
+            if ssh:
+                ssh.close()
 
-            # Construire le chemin complet
-            remote_file = os.path.join(self.remote_path, name)
-            remote_dir = os.path.dirname(remote_file)
+    def _remote(self, name):
+        return os.path.join(self.remote_path, name)
 
+    def _stat(self, name):
+        """stat distant, servi par le cache de métadonnées si possible"""
+        remote_file = self._remote(name)
+        stat_cache = self._get_stat_cache()
+        if stat_cache is not None:
+            found, attrs = stat_cache.get(remote_file)
+            if found:
+                if attrs is None:
+                    raise FileNotFoundError(remote_file)
+                return attrs
+
+        try:
+            attrs = self._run(lambda sftp: sftp.stat(remote_file))
+        except FileNotFoundError:
+            if stat_cache is not None:
+                stat_cache.set_missing(remote_file)
+            raise
+
+        if stat_cache is not None:
+            stat_cache.set(remote_file, attrs)
+        return attrs
+
+    def _save(self, name, content):
+        """Upload un fichier vers Unraid (ou le dépose en staging en mode write-behind)"""
+        upload_queue = self._get_upload_queue()
+        if upload_queue is None:
+            return self._upload(name, content)
+
+        try:
+            upload_queue.stage(name, content)
+        except OSError as e:
+            raise IOError(f"Error staging file for Unraid: {e}")
+        cache = self._get_cache()
+        if cache is not None:
+            cache.discard(name)
+        stat_cache = self._get_stat_cache()
+        if stat_cache is not None:
+            stat_cache.discard(self._remote(name))
+        return name
+
+    def _push(self, name, local_path):
+        """Envoyer un fichier déposé en staging (appelé par les workers d'UploadQueue)"""
+        with open(local_path, 'rb') as content:
+            self._upload(name, content)
+
+    def _upload(self, name, content):
+        """Envoyer content vers Unraid sous le nom name"""
+        remote_file = self._remote(name)
+
+        def upload(sftp):
             # Créer les répertoires si nécessaire
-            self._makedirs_sftp(sftp, remote_dir)
+            self._makedirs_sftp(sftp, os.path.dirname(remote_file))
 
             # Upload le fichier
             if hasattr(content, 'temporary_file_path'):
                 # Fichier temporaire sur disque
-                sftp.put(content.temporary_file_path(), remote_file)
+                attrs = sftp.put(content.temporary_file_path(), remote_file)
             else:
                 # Fichier en mémoire
                 content.seek(0)
-                sftp.putfo(content, remote_file)
+                attrs = sftp.putfo(content, remote_file)
 
             # Définir les permissions (lecture pour tous)
             sftp.chmod(remote_file, 0o644)
+            if attrs.st_mode is not None:
+                attrs.st_mode = (attrs.st_mode & ~0o777) | 0o644
+            return attrs
 
-            return name
-
+        stat_cache = self._get_stat_cache()
+        try:
+            attrs = self._run(upload)
         except Exception as e:
+            if stat_cache is not None:
+                stat_cache.discard(remote_file)
             raise IOError(f"Error uploading file to Unraid: {e}")
-
         finally:
-            if sftp:
-                sftp.close()
-            if ssh:
-                ssh.close()
+            cache = self._get_cache()
+            if cache is not None:
+                cache.discard(name)
+
+        if stat_cache is not None:
+            stat_cache.set(remote_file, attrs)
+        return name
 
     def _makedirs_sftp(self, sftp, path):
         """Créer récursivement les répertoires sur SFTP"""
@@ -123,102 +1347,370 @@ class UnraidSFTPStorage(Storage):
 
     def _open(self, name, mode='rb'):
         """Télécharger un fichier depuis Unraid (lecture)"""
-        ssh, sftp = None, None
-        try:
-            ssh, sftp = self._get_sftp_client()
-            remote_file = os.path.join(self.remote_path, name)
+        remote_file = self._remote(name)
 
-            # Télécharger dans un buffer mémoire
-            file_obj = BytesIO()
-            sftp.getfo(remote_file, file_obj)
-            file_obj.seek(0)
+        def download_to(file_obj):
+            def fetch(sftp):
+                # Repartir de zéro si l'opération est rejouée après une reconnexion
+                file_obj.seek(0)
+                file_obj.truncate()
+                sftp.getfo(remote_file, file_obj)
+            self._run(fetch)
 
-            return file_obj
+        staged = self._staged_path(name)
+        if staged is not None:
+            try:
+                return File(open(staged, 'rb'), name=name)
+            except FileNotFoundError:
+                pass  # Envoyé entre-temps
 
+        try:
+            attrs = self._stat(name)
+            cache = self._get_cache()
+            if cache is None:
+                return File(self._open_stream(remote_file, attrs.st_size), name=name)
+            return File(cache.open(name, attrs.st_size, attrs.st_mtime, download_to), name=name)
         except Exception as e:
             raise IOError(f"Error downloading file from Unraid: {e}")
 
+    def _lease(self):
+        """
+        Emprunter une session pour une durée indéterminée.
+        Retourne (sftp, release) ; release(discard) rend la session.
+        """
+        if self.pool_enabled:
+            pool = self._get_pool()
+            conn = pool.acquire()
+
+            def release(discard=False):
+                pool.release(conn, discard=discard or not conn.is_alive())
+            return conn.sftp, release
+
+        ssh, sftp = self._get_sftp_client()
+
+        def release(discard=False):
+            sftp.close()
+            ssh.close()
+        return sftp, release
+
+    def _open_stream(self, remote_file, size):
+        """Ouvrir remote_file en lecture par morceaux sur une session dédiée"""
+        sftp, release = self._lease()
+        try:
+            handle = sftp.open(remote_file, 'rb')
+        except Exception:
+            release(False)
+            raise
+        return SFTPStreamingFile(handle, size, release)
+
+    def walk(self, path=''):
+        """
+        Parcourir récursivement path en flux, sur une seule session.
+        Produit (nom relatif, SFTPAttributes) pour chaque fichier ; seule la
+        pile des répertoires restant à visiter est gardée en mémoire.
+        """
+        root = os.path.join(self.remote_path, path)
+        sftp, release = self._lease()
+        try:
+            stack = [root]
+            while stack:
+                directory = stack.pop()
+                for attrs in sftp.listdir_iter(directory):
+                    full_path = os.path.join(directory, attrs.filename)
+                    if stat.S_ISDIR(attrs.st_mode or 0):
+                        stack.append(full_path)
+                    else:
+                        yield os.path.relpath(full_path, self.remote_path), attrs
         finally:
-            if sftp:
-                sftp.close()
-            if ssh:
-                ssh.close()
+            release()
+
+    def delete_many(self, names):
+        """Supprimer plusieurs fichiers sur une seule session ; retourne les noms supprimés"""
+        def remove_all(sftp):
+            removed = []
+            for name in names:
+                try:
+                    sftp.remove(self._remote(name))
+                    removed.append(name)
+                except FileNotFoundError:
+                    pass
+            return removed
+
+        removed = self._run(remove_all)
+        self._forget(removed)
+        return removed
+
+    def move_many(self, moves):
+        """Renommer plusieurs fichiers (liste de (ancien, nouveau)) sur une seule session"""
+        def rename_all(sftp):
+            moved = []
+            for old, new in moves:
+                remote_new = self._remote(new)
+                self._makedirs_sftp(sftp, os.path.dirname(remote_new))
+                try:
+                    sftp.rename(self._remote(old), remote_new)
+                    moved.append(old)
+                except FileNotFoundError:
+                    pass
+            return moved
+
+        moved = self._run(rename_all)
+        self._forget(moved)
+        return moved
+
+    def _forget(self, names):
+        """Mettre les caches à jour après la disparition de names"""
+        cache = self._get_cache()
+        stat_cache = self._get_stat_cache()
+        for name in names:
+            if cache is not None:
+                cache.discard(name)
+            if stat_cache is not None:
+                stat_cache.set_missing(self._remote(name))
 
     def exists(self, name):
         """Vérifier si un fichier existe sur Unraid"""
-        ssh, sftp = None, None
+        if self._staged_path(name) is not None:
+            return True
         try:
-            ssh, sftp = self._get_sftp_client()
-            remote_file = os.path.join(self.remote_path, name)
-            sftp.stat(remote_file)
+            self._stat(name)
             return True
         except IOError:
             return False
-        finally:
-            if sftp:
-                sftp.close()
-            if ssh:
-                ssh.close()
 
     def delete(self, name):
         """Supprimer un fichier sur Unraid"""
-        ssh, sftp = None, None
+        if not self.release_blob(name):
+            return  # Fichier encore référencé par un autre envoi
+
+        remote_file = self._remote(name)
+        upload_queue = self._get_upload_queue()
+        if upload_queue is not None:
+            upload_queue.cancel(name)
+        cache = self._get_cache()
+        if cache is not None:
+            cache.discard(name)
+
+        stat_cache = self._get_stat_cache()
         try:
-            ssh, sftp = self._get_sftp_client()
-            remote_file = os.path.join(self.remote_path, name)
-            sftp.remove(remote_file)
-        except IOError:
+            self._run(lambda sftp: sftp.remove(remote_file))
+        except FileNotFoundError:
             pass  # Fichier n'existe pas
-        finally:
-            if sftp:
-                sftp.close()
-            if ssh:
-                ssh.close()
+        except IOError:
+            if stat_cache is not None:
+                stat_cache.discard(remote_file)
+            return
+        if stat_cache is not None:
+            stat_cache.set_missing(remote_file)
 
     def size(self, name):
         """Obtenir la taille d'un fichier"""
-        ssh, sftp = None, None
+        staged = self._staged_path(name)
+        if staged is not None:
+            try:
+                return os.path.getsize(staged)
+            except OSError:
+                pass
         try:
-            ssh, sftp = self._get_sftp_client()
-            remote_file = os.path.join(self.remote_path, name)
-            return sftp.stat(remote_file).st_size
+            return self._stat(name).st_size
         except IOError:
             return 0
-        finally:
-            if sftp:
-                sftp.close()
-            if ssh:
-                ssh.close()
 
     def url(self, name):
         """Retourner l'URL publique du fichier via nginx"""
         if not name:
             return ''
-        return f"{self.base_url.rstrip('/')}/{name}"
+        if self._staged_path(name) is not None:
+            # Pas encore sur Unraid : servi par Django en attendant l'envoi
+            return reverse('vetements:media_en_attente', args=[name])
+        url = f"{self.base_url.rstrip('/')}/{name}"
+        if self.signing_secret:
+            url += '?' + urlencode(media_url_params(self.signing_secret, name, self.url_ttl))
+        return url
 
     def listdir(self, path):
         """Lister les fichiers d'un répertoire"""
-        ssh, sftp = None, None
+        remote_path = os.path.join(self.remote_path, path) if path else self.remote_path
+
+        stat_cache = self._get_stat_cache()
+        entries = stat_cache.get_listing(remote_path) if stat_cache is not None else None
+        if entries is None:
+            try:
+                entries = self._run(lambda sftp: sftp.listdir_attr(remote_path))
+            except IOError:
+                return [], []
+            if stat_cache is not None:
+                stat_cache.set_listing(remote_path, entries)
+
+        files = []
+        dirs = []
+
+        for item in entries:
+            if item.st_mode & 0o040000:  # Répertoire
+                dirs.append(item.filename)
+            else:  # Fichier
+                files.append(item.filename)
+
+        return dirs, files
+
+
+@deconstructible
+class TieredStorage(ContentAddressedStorageMixin, Storage):
+    """
+    Stockage à deux niveaux : disque local (primaire) et Unraid (réplique).
+
+    Les envois sont écrits sur le disque local puis répliqués vers Unraid
+    en tâche de fond (ReplicationJournal, Replicator) : ils restent à la
+    vitesse du disque local même quand Unraid est lent ou injoignable. Les
+    lectures vont au disque local s'il a le fichier, sinon à Unraid tant
+    qu'il est déclaré disponible (ReplicaHealth). Au retour d'Unraid, les
+    entrées du journal sont rejouées ; `manage.py reconcilier_medias`
+    compare en plus les deux niveaux.
+
+    Les fichiers restent sur le disque local après réplication : c'est le
+    niveau primaire, à dimensionner en conséquence.
+
+    Configuration (en plus des variables UNRAID_* d'UnraidSFTPStorage) :
+    - UNRAID_TIERED_LOCAL_ROOT : Répertoire du niveau local (défaut: MEDIA_ROOT)
+    - UNRAID_REPLICATION_JOURNAL_DIR : Journal de réplication, sur un disque persistant
+      (défaut: <tmp>/garde-robe-replication)
+    - UNRAID_REPLICATION_WORKERS : Nombre de threads de réplication par processus (défaut: 2)
+    - UNRAID_HEALTH_CHECK_INTERVAL : Délai entre deux sondes d'Unraid indisponible, en secondes (défaut: 30)
+    """
+
+    def __init__(self):
+        self.local_root = str(config('UNRAID_TIERED_LOCAL_ROOT', default=str(settings.MEDIA_ROOT)))
+        self.journal_dir = config(
+            'UNRAID_REPLICATION_JOURNAL_DIR',
+            default=os.path.join(tempfile.gettempdir(), 'garde-robe-replication')
+        )
+        self.replication_workers = config('UNRAID_REPLICATION_WORKERS', default=2, cast=int)
+        self.health_check_interval = config('UNRAID_HEALTH_CHECK_INTERVAL', default=30, cast=int)
+        self.content_addressed = config('UNRAID_CONTENT_ADDRESSED', default=False, cast=bool)
+
+        self.primary = FileSystemStorage(location=self.local_root)
+        self.replica = UnraidSFTPStorage()
+        # Le journal de réplication remplace le write-behind ; les noms
+        # sont déjà choisis (et comptés dans MediaBlob) par ce storage
+        self.replica.write_behind = False
+        self.replica.content_addressed = False
+
+    def _get_replicator(self):
+        def probe():
+            self.replica._run(lambda sftp: sftp.stat(self.replica.remote_path))
+
+        return get_replicator(self.journal_dir, lambda: Replicator(
+            ReplicationJournal(self.journal_dir),
+            self._replicate,
+            ReplicaHealth(probe, interval=self.health_check_interval),
+            workers=self.replication_workers,
+        ))
+
+    def _replica_available(self):
+        return self._get_replicator().health.is_healthy()
+
+    def _replicate(self, entry):
+        """Appliquer une entrée du journal à Unraid (appelé par les workers du Replicator)"""
+        name = entry['name']
+        if entry['operation'] == 'delete':
+            self.replica.delete_many([name])
+            return
         try:
-            ssh, sftp = self._get_sftp_client()
-            remote_path = os.path.join(self.remote_path, path) if path else self.remote_path
+            content = open(self.primary.path(name), 'rb')
+        except FileNotFoundError:
+            return  # Supprimé localement entre-temps : l'entrée 'delete' suivra
+        with content:
+            self.replica._upload(name, content)
 
-            files = []
-            dirs = []
+    def _record(self, operation, name):
+        replicator = self._get_replicator()
+        replicator.journal.record(operation, name)
+        replicator.submit(name)
 
-            for item in sftp.listdir_attr(remote_path):
-                if item.st_mode & 0o040000:  # Répertoire
-                    dirs.append(item.filename)
-                else:  # Fichier
-                    files.append(item.filename)
+    @property
+    def staging_dir(self):
+        return self.local_root
 
-            return dirs, files
+    def _staged_path(self, name):
+        """Chemin local de name s'il n'est pas encore répliqué sur Unraid, sinon None"""
+        entry = self._get_replicator().journal.get(name)
+        if entry is None or entry['operation'] != 'put':
+            return None
+        return self.primary.path(name)
 
-        except IOError:
-            return [], []
+    def _replica_stat(self, name):
+        """stat sur Unraid ; None si absent ou injoignable (qui est alors signalé)"""
+        if not self._replica_available():
+            return None
+        try:
+            return self.replica._stat(name)
+        except FileNotFoundError:
+            return None
+        except IOError as e:
+            self._get_replicator().health.report_failure(e)
+            return None
 
-        finally:
-            if sftp:
-                sftp.close()
-            if ssh:
-                ssh.close()
+    def get_available_name(self, name, max_length=None):
+        if not self.content_addressed and not self._replica_available():
+            # Unraid ne peut pas être consulté : un nom aléatoire évite
+            # d'écraser à la réplication un fichier qui n'existe que là-bas
+            dir_name, file_name = os.path.split(name)
+            file_root, file_ext = os.path.splitext(file_name)
+            name = os.path.join(dir_name, self.get_alternative_name(file_root, file_ext))
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        name = self.primary._save(name, content)
+        self._record('put', name)
+        return name
+
+    def _open(self, name, mode='rb'):
+        if self.primary.exists(name):
+            return self.primary._open(name, mode)
+        if not self._replica_available():
+            raise IOError(f"{name} absent du stockage local et serveur distant indisponible")
+        try:
+            return self.replica._open(name, mode)
+        except IOError as e:
+            self._get_replicator().health.report_failure(e)
+            raise
+
+    def exists(self, name):
+        return self.primary.exists(name) or self._replica_stat(name) is not None
+
+    def delete(self, name):
+        if not self.release_blob(name):
+            return  # Fichier encore référencé par un autre envoi
+        self.primary.delete(name)
+        self._record('delete', name)
+
+    def size(self, name):
+        if self.primary.exists(name):
+            return self.primary.size(name)
+        attrs = self._replica_stat(name)
+        return attrs.st_size if attrs is not None else 0
+
+    def url(self, name):
+        if not name:
+            return ''
+        if self._staged_path(name) is not None:
+            # Pas encore sur Unraid : servi par Django en attendant la réplication
+            return reverse('vetements:media_en_attente', args=[name])
+        return self.replica.url(name)
+
+    def listdir(self, path):
+        dirs, files = self.primary.listdir(path) if self.primary.exists(path) else ([], [])
+        if self._replica_available():
+            remote_dirs, remote_files = self.replica.listdir(path)
+            dirs = sorted(set(dirs) | set(remote_dirs))
+            files = sorted(set(files) | set(remote_files))
+        return dirs, files
+
+    def get_modified_time(self, name):
+        if self.primary.exists(name):
+            return self.primary.get_modified_time(name)
+        attrs = self._replica_stat(name)
+        if attrs is None:
+            raise FileNotFoundError(name)
+        modified = datetime.fromtimestamp(attrs.st_mtime, tz=dt_timezone.utc)
+        return modified if settings.USE_TZ else modified.replace(tzinfo=None)
@@ -0,0 +1,76 @@
+from django import template
+from django.utils import timezone
+
+from ..images import VARIANT_WIDTHS, schedule_variants, variant_name, variants_pending, variants_ready
+from ..models import noter_vignettes
+
+register = template.Library()
+
+
+def _ready(image):
+    """
+    Vérifie que les vignettes de la photo existent, et planifie leur
+    génération sinon. L'état noté sur l'objet (image_vignettes) évite
+    d'interroger le storage ; après un échec de génération, l'original est
+    servi sans nouvel essai pendant NOUVEL_ESSAI_VIGNETTES. Le résultat
+    est mémorisé sur le fichier pour la durée du rendu.
+    """
+    if not image:
+        return False
+    ready = getattr(image, '_variants_ready', None)
+    if ready is not None:
+        return ready
+
+    instance = image.instance
+    suivi = hasattr(instance, 'image_vignettes')
+    if suivi and instance.image_vignettes:
+        ready = True
+    elif suivi and instance.image_vignettes_echec and (
+        timezone.now() - instance.image_vignettes_echec < instance.NOUVEL_ESSAI_VIGNETTES
+    ):
+        ready = False
+    elif variants_pending(image.name):
+        ready = False
+    else:
+        ready = variants_ready(image.name, image.storage)
+        if not ready:
+            schedule_variants(image.name, callback=noter_vignettes if suivi else None)
+        elif suivi:
+            # Vignettes antérieures au suivi : état noté une fois pour toutes
+            noter_vignettes(image.name, True)
+            instance.image_vignettes = True
+    image._variants_ready = ready
+    return ready
+
+
+@register.filter
+def variant_url(image, width):
+    """
+    URL de la vignette de largeur width (JPEG), ou de l'original si les
+    vignettes ne sont pas encore disponibles.
+
+    Usage: <img src="{{ vetement.image|variant_url:480 }}">
+    """
+    if not image:
+        return ''
+    if not _ready(image):
+        return image.url
+    return image.storage.url(variant_name(image.name, int(width)))
+
+
+@register.filter
+def srcset(image, fmt='jpeg'):
+    """
+    Valeur d'attribut srcset listant toutes les vignettes dans le format fmt
+    ('jpeg' ou 'webp'). Vide si les vignettes ne sont pas encore disponibles,
+    le navigateur se rabat alors sur src.
+
+    Usage: <source type="image/webp" srcset="{{ vetement.image|srcset:'webp' }}">
+    """
+    if not _ready(image):
+        return ''
+    storage = image.storage
+    return ', '.join(
+        f"{storage.url(variant_name(image.name, width, fmt))} {width}w"
+        for width in VARIANT_WIDTHS
+    )
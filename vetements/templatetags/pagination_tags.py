@@ -0,0 +1,31 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def url_curseur(context, curseur):
+    """
+    Lien vers la page du curseur, en gardant les autres paramètres de la
+    requête (recherche, filtres).
+
+    Usage: <a href="{% url_curseur page.suivant %}">Suivant</a>
+    """
+    parametres = context['request'].GET.copy()
+    parametres.pop('page', None)
+    if curseur:
+        parametres['curseur'] = curseur
+    else:
+        parametres.pop('curseur', None)
+    return f'?{parametres.urlencode()}'
+
+
+@register.inclusion_tag('vetements/pagination_curseur.html', takes_context=True)
+def pagination_curseur(context, page):
+    """
+    Liens première page / précédente / suivante d'une PageCurseur, et
+    nombre de résultats s'il a été calculé.
+
+    Usage: {% pagination_curseur page %}
+    """
+    return {'request': context['request'], 'page': page}
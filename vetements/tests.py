@@ -1,10 +1,58 @@
-from django.test import TestCase, Client
+from django.test import TestCase, SimpleTestCase, Client
 from django.contrib.auth.models import User
 from django.urls import reverse
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
+from io import BytesIO, StringIO
+import hashlib
+from importlib import import_module
+from collections import Counter
+import json
+import os
+import re
+import stat
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+import time
+from types import SimpleNamespace
+from unittest import mock
+from wsgiref.simple_server import WSGIRequestHandler, make_server
 
-from .models import Categorie, Couleur, Taille, Vetement, Tenue, Valise
+from .models import (Amitie, AnnonceVente, Categorie, Couleur, DocumentAnnonce, EvenementTenue, Taille, Vetement, Tenue, Valise, Message,
+                     ParametresSite, MediaBlob, Portage, StatistiquesUtilisateur, UtilisationStockage, noter_vignettes)
+import paramiko
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db.models.fields.files import ImageFieldFile
+from PIL import Image
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+
+from .forms import VetementForm
+from .sftp_local import LocalSFTPServer
+from .statistiques import calculer_statistiques, serie_portages
+from .cache_statistiques import cle_cache, en_cache
+from .recherche import analyser_requete, rechercher
+from . import recherche_annonces
+from .recherche_annonces import rechercher as rechercher_annonces, trigrammes
+from .pagination import paginer_queryset
+from .facettes import FACETTES, compter_facettes, filtrer
+from .signatures import media_url_params, upload_params, verify_media_url, verify_upload
+from .upload_receiver import UploadReceiver
+from . import images as images_module
+from .images import generate_variants, normalize_image, variant_name
+from .templatetags.image_tags import srcset, variant_url
+from .storage import (ContentAddressedFileSystemStorage, LocalFileCache, RemoteStatCache, SFTPConnectionPool, SFTPStreamingFile,
+                      TieredStorage, UnraidSFTPStorage, UploadQueue)
 
 
 class VetementModelTestCase(TestCase):
@@ -102,3 +150,1783 @@ class ViewsTestCase(TestCase):
         self.client.login(username='testuser', password='testpass123')
         response = self.client.get(reverse('vetements:accueil'))
         self.assertEqual(response.status_code, 200)
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+
+class FakeSSH:
+    def __init__(self):
+        self.transport = FakeTransport()
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.transport.active = False
+
+
+class FakeSFTP:
+    def normalize(self, path):
+        return '/'
+
+    def close(self):
+        pass
+
+
+class SFTPConnectionPoolTestCase(SimpleTestCase):
+    """Tests du pool de connexions SFTP"""
+
+    def setUp(self):
+        self.connexions = []
+
+        def connect():
+            ssh = FakeSSH()
+            self.connexions.append(ssh)
+            return ssh, FakeSFTP()
+
+        self.pool = SFTPConnectionPool(connect, max_size=2, acquire_timeout=0.1)
+
+    def test_session_reutilisee(self):
+        """Test qu'une seule connexion sert plusieurs opérations"""
+        for _ in range(5):
+            self.pool.run(lambda sftp: sftp.normalize('.'))
+        self.assertEqual(self.pool.handshakes, 1)
+
+    def test_taille_maximum(self):
+        """Test que le pool refuse de dépasser sa taille maximum"""
+        self.pool.acquire()
+        self.pool.acquire()
+        with self.assertRaises(IOError):
+            self.pool.acquire()
+
+    def test_reconnexion_session_morte(self):
+        """Test qu'une session coupée est remplacée et l'opération rejouée"""
+        self.pool.run(lambda sftp: None)
+
+        appels = []
+
+        def operation(sftp):
+            appels.append(sftp)
+            if len(appels) == 1:
+                self.connexions[0].transport.active = False
+                raise EOFError()
+            return 'ok'
+
+        self.assertEqual(self.pool.run(operation), 'ok')
+        self.assertEqual(len(appels), 2)
+        self.assertEqual(self.pool.handshakes, 2)
+
+    def test_expiration_sessions_inactives(self):
+        """Test que les sessions inactives sont fermées"""
+        self.pool.idle_timeout = 0
+        self.pool.run(lambda sftp: None)
+        self.pool.run(lambda sftp: None)
+        self.assertEqual(self.pool.handshakes, 2)
+        self.assertFalse(self.connexions[0].transport.is_active())
+
+
+class LocalFileCacheTestCase(SimpleTestCase):
+    """Tests du cache disque local des médias"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = LocalFileCache(self.tmp.name, max_bytes=10)
+
+    def downloader(self, data):
+        def download(fileobj):
+            fileobj.write(data)
+        return download
+
+    def test_lecture_repetee_sans_reseau(self):
+        """Test qu'un fichier déjà lu est servi depuis le disque"""
+        for _ in range(3):
+            with self.cache.open('a.jpg', 4, 100, self.downloader(b'abcd')) as f:
+                self.assertEqual(f.read(), b'abcd')
+        self.assertEqual(self.cache.downloads, 1)
+
+    def test_nouvelle_version(self):
+        """Test qu'un changement de taille/mtime remplace la copie en cache"""
+        self.cache.open('a.jpg', 4, 100, self.downloader(b'abcd')).close()
+        with self.cache.open('a.jpg', 3, 200, self.downloader(b'xyz')) as f:
+            self.assertEqual(f.read(), b'xyz')
+        self.assertEqual(self.cache.downloads, 2)
+        self.assertEqual(self.cache.current_bytes, 3)
+
+    def test_eviction_lru(self):
+        """Test que le fichier le moins récemment lu est évincé"""
+        self.cache.open('a.jpg', 4, 1, self.downloader(b'aaaa')).close()
+        self.cache.open('b.jpg', 4, 1, self.downloader(b'bbbb')).close()
+        self.cache.open('a.jpg', 4, 1, self.downloader(b'aaaa')).close()
+        self.cache.open('c.jpg', 4, 1, self.downloader(b'cccc')).close()
+        self.assertLessEqual(self.cache.current_bytes, 10)
+        self.cache.open('a.jpg', 4, 1, self.downloader(b'aaaa')).close()
+        self.assertEqual(self.cache.downloads, 3)
+        self.cache.open('b.jpg', 4, 1, self.downloader(b'bbbb')).close()
+        self.assertEqual(self.cache.downloads, 4)
+
+    def test_telechargement_partage(self):
+        """Test que des lecteurs concurrents partagent un seul téléchargement"""
+        demarre = threading.Event()
+        libere = threading.Event()
+
+        def download(fileobj):
+            demarre.set()
+            libere.wait(5)
+            fileobj.write(b'abcd')
+
+        resultats = []
+
+        def lire():
+            with self.cache.open('a.jpg', 4, 1, download) as f:
+                resultats.append(f.read())
+
+        threads = [threading.Thread(target=lire) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        demarre.wait(5)
+        libere.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(resultats, [b'abcd'] * 4)
+        self.assertEqual(self.cache.downloads, 1)
+
+
+class FakeRemoteSFTP:
+    """Serveur SFTP en mémoire qui compte les allers-retours"""
+
+    def __init__(self, files):
+        self.files = dict(files)
+        self.calls = 0
+
+    def _attrs(self, path):
+        attrs = paramiko.SFTPAttributes()
+        attrs.filename = path.rsplit('/', 1)[-1]
+        attrs.st_size = len(self.files[path])
+        attrs.st_mode = stat.S_IFREG | 0o644
+        attrs.st_mtime = 1
+        return attrs
+
+    def stat(self, path):
+        self.calls += 1
+        if path.rstrip('/') == '/media':
+            attrs = paramiko.SFTPAttributes()
+            attrs.st_mode = stat.S_IFDIR | 0o755
+            return attrs
+        if path not in self.files:
+            raise IOError(2, 'No such file')
+        return self._attrs(path)
+
+    def listdir_attr(self, path):
+        self.calls += 1
+        prefix = path.rstrip('/') + '/'
+        return [self._attrs(p) for p in self.files if p.startswith(prefix) and '/' not in p[len(prefix):]]
+
+    def listdir_iter(self, path):
+        self.calls += 1
+        prefix = path.rstrip('/') + '/'
+        subdirs = set()
+        for p in list(self.files):
+            if not p.startswith(prefix):
+                continue
+            rest = p[len(prefix):]
+            if '/' in rest:
+                subdirs.add(rest.split('/', 1)[0])
+            else:
+                yield self._attrs(p)
+        for subdir in sorted(subdirs):
+            attrs = paramiko.SFTPAttributes()
+            attrs.filename = subdir
+            attrs.st_mode = stat.S_IFDIR | 0o755
+            yield attrs
+
+    def putfo(self, fileobj, path):
+        self.calls += 1
+        self.files[path] = fileobj.read()
+        return self._attrs(path)
+
+    def chmod(self, path, mode):
+        self.calls += 1
+
+    def mkdir(self, path):
+        self.calls += 1
+
+    def remove(self, path):
+        self.calls += 1
+        if path not in self.files:
+            raise IOError(2, 'No such file')
+        del self.files[path]
+
+
+class RemoteStatCacheTestCase(SimpleTestCase):
+    """Tests du cache de métadonnées du storage SFTP"""
+
+    def setUp(self):
+        self.sftp = FakeRemoteSFTP({
+            '/media/a.jpg': b'aaaa',
+            '/media/b.jpg': b'bb',
+        })
+        self.cache = RemoteStatCache(ttl=60, negative_ttl=60)
+        self.storage = UnraidSFTPStorage()
+        self.storage.remote_path = '/media/'
+        self.storage.cache_enabled = False
+        self.storage._run = lambda operation: operation(self.sftp)
+        self.storage._get_stat_cache = lambda: self.cache
+
+    def test_listdir_puis_size(self):
+        """Test qu'un listdir alimente le stat de chaque entrée"""
+        dirs, files = self.storage.listdir('')
+        self.assertEqual(sorted(files), ['a.jpg', 'b.jpg'])
+        self.assertEqual([self.storage.size(f) for f in sorted(files)], [4, 2])
+        self.storage.listdir('')
+        self.assertEqual(self.sftp.calls, 1)
+
+    def test_cache_negatif(self):
+        """Test qu'une absence constatée est mise en cache"""
+        self.assertFalse(self.storage.exists('c.jpg'))
+        self.assertFalse(self.storage.exists('c.jpg'))
+        self.assertEqual(self.sftp.calls, 1)
+
+    def test_coherence_save_delete(self):
+        """Test que _save et delete mettent à jour le cache directement"""
+        self.assertFalse(self.storage.exists('c.jpg'))
+        self.storage.listdir('')
+        self.storage._save('c.jpg', BytesIO(b'ccc'))
+        calls = self.sftp.calls
+        self.assertTrue(self.storage.exists('c.jpg'))
+        self.assertEqual(self.storage.size('c.jpg'), 3)
+        self.assertIn('c.jpg', self.storage.listdir('')[1])
+
+        self.storage.delete('a.jpg')
+        self.assertFalse(self.storage.exists('a.jpg'))
+        self.assertNotIn('a.jpg', self.storage.listdir('')[1])
+        self.assertEqual(self.sftp.calls, calls + 1)
+
+    def test_expiration(self):
+        """Test qu'un stat expiré est redemandé au serveur"""
+        self.cache.ttl = -1
+        self.storage.size('a.jpg')
+        self.storage.size('a.jpg')
+        self.assertEqual(self.sftp.calls, 2)
+
+
+class UploadQueueTestCase(SimpleTestCase):
+    """Tests de l'envoi en arrière-plan (write-behind)"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.sftp = FakeRemoteSFTP({})
+        self.storage = UnraidSFTPStorage()
+        self.storage.remote_path = '/media/'
+        self.storage.cache_enabled = False
+        self.storage.write_behind = True
+        self.storage.staging_dir = self.tmp.name
+        self.storage._run = lambda operation: operation(self.sftp)
+        self.storage._get_stat_cache = lambda: None
+
+    def test_reessai_apres_echec(self):
+        """Test qu'un envoi en échec est retenté puis le staging nettoyé"""
+        essais = []
+
+        def push(name, path):
+            essais.append(name)
+            if len(essais) == 1:
+                raise IOError('uplink down')
+
+        upload_queue = UploadQueue(push, self.tmp.name, workers=1, backoff=0)
+        upload_queue.stage('vetements/a.jpg', BytesIO(b'abcd'))
+        upload_queue.join()
+        self.assertEqual(essais, ['vetements/a.jpg', 'vetements/a.jpg'])
+        self.assertFalse(upload_queue.is_staged('vetements/a.jpg'))
+
+    def test_url_pendant_envoi(self):
+        """Test que l'image reste servie tant qu'elle est en attente d'envoi"""
+        bloque = threading.Event()
+        original_push = self.storage._push
+
+        def push(name, local_path):
+            bloque.wait(5)
+            original_push(name, local_path)
+
+        self.storage._push = push
+
+        name = self.storage.save('vetements/a.jpg', BytesIO(b'abcd'))
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.size(name), 4)
+        self.assertEqual(self.storage.url(name), '/media-en-attente/vetements/a.jpg')
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'abcd')
+
+        bloque.set()
+        self.storage._get_upload_queue().join()
+        self.assertEqual(self.sftp.files['/media/vetements/a.jpg'], b'abcd')
+        self.assertTrue(self.storage.url(name).endswith('/vetements/a.jpg'))
+        self.assertFalse(self.storage.url(name).startswith('/media-en-attente/'))
+
+
+class FakeRemoteHandle:
+    """Handle SFTP en lecture qui compte les octets transférés"""
+
+    def __init__(self, data):
+        self.data = data
+        self.transferred = 0
+        self.closed = False
+
+    def readv(self, chunks):
+        for offset, length in chunks:
+            self.transferred += length
+            yield self.data[offset:offset + length]
+
+    def close(self):
+        self.closed = True
+
+
+class SFTPStreamingFileTestCase(SimpleTestCase):
+    """Tests de la lecture par morceaux des fichiers distants"""
+
+    def setUp(self):
+        self.data = bytes(range(256)) * 8192  # 2 Mo
+        self.handle = FakeRemoteHandle(self.data)
+        self.releases = []
+        self.file = SFTPStreamingFile(
+            self.handle, len(self.data), self.releases.append, max_read_ahead=256 * 1024
+        )
+
+    def test_lecture_entete(self):
+        """Test qu'une lecture d'en-tête ne transfère qu'un morceau"""
+        self.assertEqual(self.file.read(16), self.data[:16])
+        self.assertEqual(self.handle.transferred, SFTPStreamingFile.CHUNK_SIZE)
+
+    def test_lecture_complete_et_seek(self):
+        """Test qu'une lecture complète et un seek renvoient les bons octets"""
+        self.assertEqual(self.file.read(), self.data)
+        self.file.seek(-10, 2)
+        self.assertEqual(self.file.read(), self.data[-10:])
+        self.file.seek(1000)
+        self.assertEqual(self.file.read(5), self.data[1000:1005])
+
+    def test_fermeture_rend_la_session(self):
+        """Test que la fermeture rend la session au pool"""
+        self.file.close()
+        self.file.close()
+        self.assertTrue(self.handle.closed)
+        self.assertEqual(self.releases, [False])
+
+
+class ImageVariantsTestCase(SimpleTestCase):
+    """Tests du pipeline de vignettes"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = FileSystemStorage(location=self.tmp.name, base_url='/media/')
+
+        buffer = BytesIO()
+        Image.new('RGBA', (2000, 1000), (200, 30, 30, 128)).save(buffer, 'PNG')
+        self.name = self.storage.save('vetements/photo.png', ContentFile(buffer.getvalue()))
+
+    def image_field_file(self):
+        image = ImageFieldFile(None, Vetement._meta.get_field('image'), self.name)
+        image.storage = self.storage
+        return image
+
+    def test_generation_des_derives(self):
+        """Test que chaque largeur est générée en WebP et en JPEG"""
+        written = generate_variants(self.name, self.storage)
+        self.assertEqual(len(written), 6)
+        with self.storage.open(variant_name(self.name, 480, 'webp')) as f:
+            self.assertEqual(Image.open(f).size, (480, 240))
+        with self.storage.open(variant_name(self.name, 160)) as f:
+            self.assertEqual(Image.open(f).format, 'JPEG')
+
+    @mock.patch('vetements.templatetags.image_tags.schedule_variants')
+    def test_filtres_avec_et_sans_derives(self, schedule_variants):
+        """Test le repli sur l'original et le rattrapage des vignettes manquantes"""
+        self.assertEqual(variant_url(self.image_field_file(), 480), '/media/vetements/photo.png')
+        self.assertEqual(srcset(self.image_field_file()), '')
+        schedule_variants.assert_called_with(self.name, callback=None)
+
+        generate_variants(self.name, self.storage)
+        image = self.image_field_file()
+        self.assertEqual(variant_url(image, 480), '/media/vetements/photo_480w.jpg')
+        self.assertEqual(
+            srcset(image, 'webp'),
+            '/media/vetements/photo_160w.webp 160w, /media/vetements/photo_480w.webp 480w, '
+            '/media/vetements/photo_1024w.webp 1024w'
+        )
+
+
+class SuiviVignettesTestCase(TestCase):
+    """Tests de l'état des vignettes noté sur les vêtements"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(MEDIA_ROOT=self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.vetement = Vetement.objects.create(proprietaire=user, nom='Pull', categorie=Categorie.objects.create(nom='Pull'),
+                                                genre='homme', image='vetements/pull.jpg')
+
+    def recharger(self):
+        return Vetement.objects.get(pk=self.vetement.pk).image
+
+    @mock.patch('vetements.templatetags.image_tags.schedule_variants')
+    def test_echec_puis_nouvel_essai(self, schedule_variants):
+        """Test qu'une génération en échec n'est relancée qu'après le délai, sans accès au storage"""
+        with mock.patch('vetements.templatetags.image_tags.variants_ready', return_value=False) as pretes:
+            self.assertEqual(variant_url(self.recharger(), 480), '/media/vetements/pull.jpg')
+            schedule_variants.assert_called_once_with('vetements/pull.jpg', callback=noter_vignettes)
+
+            # Original illisible : l'échec est noté par le callback
+            with mock.patch('vetements.images.generate_variants', side_effect=OSError), \
+                    mock.patch('vetements.images.connections'), self.assertLogs('vetements.images', 'ERROR'):
+                images_module._generate_in_background('vetements/pull.jpg', noter_vignettes)
+            self.assertIsNotNone(self.recharger().instance.image_vignettes_echec)
+            variant_url(self.recharger(), 480)
+            self.assertEqual((pretes.call_count, schedule_variants.call_count), (1, 1))
+
+            Vetement.objects.update(image_vignettes_echec=timezone.now() - timedelta(hours=7))
+            variant_url(self.recharger(), 480)
+            self.assertEqual((pretes.call_count, schedule_variants.call_count), (2, 2))
+
+        noter_vignettes('vetements/pull.jpg', True)
+        with mock.patch('vetements.templatetags.image_tags.variants_ready') as pretes:
+            self.assertEqual(variant_url(self.recharger(), 480), '/media/vetements/pull_480w.jpg')
+        pretes.assert_not_called()
+
+    def test_vignettes_anterieures(self):
+        """Test que des vignettes déjà présentes sont notées au premier rendu, et oubliées avec la photo"""
+        with mock.patch('vetements.templatetags.image_tags.variants_ready', return_value=True):
+            variant_url(self.recharger(), 480)
+        self.assertTrue(self.recharger().instance.image_vignettes)
+
+        vetement = self.recharger().instance
+        vetement.image = ContentFile(photo_jpeg((100, 100)), name='autre.jpg')
+        with mock.patch('vetements.models.schedule_variants'):
+            vetement.save()
+        self.assertFalse(self.recharger().instance.image_vignettes)
+
+
+def photo_jpeg(size, orientation=None, bruit=False):
+    """Photo JPEG de test, éventuellement tournée (EXIF) ou bruitée (peu compressible)"""
+    if bruit:
+        image = Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3))
+    else:
+        image = Image.new('RGB', size, (10, 120, 200))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    exif[0x010F] = 'Téléphone'  # Make
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=95, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+class ImageIngestTestCase(TestCase):
+    """Tests de la normalisation des photos à l'envoi"""
+
+    def test_normalisation(self):
+        """Test orientation EXIF, réduction et suppression des métadonnées"""
+        upload = SimpleUploadedFile('IMG_0001.JPEG', photo_jpeg((4000, 3000), orientation=6))
+        normalized = normalize_image(upload, max_dimension=1000)
+        self.assertEqual(normalized.name, 'IMG_0001.jpg')
+        image = Image.open(normalized)
+        self.assertEqual(image.size, (750, 1000))
+        self.assertEqual(len(image.getexif()), 0)
+
+    @override_settings(IMAGE_MAX_DIMENSION=1600)
+    def test_taille_maximum(self):
+        """Test qu'une photo trop lourde après compression est refusée"""
+        ParametresSite.objects.create(taille_max_image=1)
+        categorie = Categorie.objects.create(nom='Pull')
+        data = {'nom': 'Pull', 'categorie': categorie.pk, 'genre': 'homme',
+                'saison': 'hiver', 'etat': 'bon'}
+
+        form = VetementForm(data, {'image': SimpleUploadedFile('a.jpg', photo_jpeg((1600, 1600), bruit=True))})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+        form = VetementForm(data, {'image': SimpleUploadedFile('b.jpg', photo_jpeg((3000, 2000)))})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(Image.open(form.cleaned_data['image']).size, (1600, 1067))
+
+
+class ContentAddressedStorageTestCase(TestCase):
+    """Tests du stockage adressé par contenu"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = ContentAddressedFileSystemStorage(location=self.tmp.name)
+
+    def test_envois_identiques_partages(self):
+        """Test que deux envois identiques partagent un seul fichier"""
+        a = self.storage.save('vetements/a.JPG', ContentFile(b'photo'))
+        b = self.storage.save('vetements/b.jpg', ContentFile(b'photo'))
+        c = self.storage.save('vetements/c.jpg', ContentFile(b'autre photo'))
+        digest = hashlib.sha256(b'photo').hexdigest()
+        self.assertEqual(a, f'vetements/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+        self.assertEqual(MediaBlob.objects.get(nom=a).references, 2)
+
+    def test_suppression_derniere_reference(self):
+        """Test que le fichier n'est supprimé qu'avec sa dernière référence"""
+        name = self.storage.save('vetements/a.jpg', ContentFile(b'photo'))
+        self.storage.save('vetements/b.jpg', ContentFile(b'photo'))
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(nom=name).exists())
+
+    def test_nom_des_derives_conserve(self):
+        """Test que les vignettes d'un fichier adressé par contenu gardent leur nom"""
+        name = self.storage.save('vetements/a.jpg', ContentFile(b'photo'))
+        derive = variant_name(name, 480)
+        self.assertEqual(self.storage.save(derive, ContentFile(b'vignette')), derive)
+        self.assertEqual(MediaBlob.objects.count(), 1)
+
+
+class ImageMetadataTestCase(TestCase):
+    """Tests des métadonnées de photo conservées en base"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(MEDIA_ROOT=self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.categorie = Categorie.objects.create(nom='Chemise')
+
+    def creer_vetement(self):
+        vetement = Vetement(proprietaire=self.user, nom='Chemise', categorie=self.categorie,
+                            genre='homme', saison='ete')
+        vetement.image = ContentFile(photo_jpeg((300, 200), orientation=6), name='chemise.jpg')
+        vetement.save()
+        return vetement
+
+    def test_metadonnees_a_l_envoi(self):
+        """Test que les métadonnées sont renseignées à l'enregistrement de la photo"""
+        vetement = Vetement.objects.get(pk=self.creer_vetement().pk)
+        self.assertEqual((vetement.image_largeur, vetement.image_hauteur), (200, 300))
+        self.assertEqual(vetement.image_format, 'jpeg')
+        self.assertEqual(vetement.image_taille, vetement.image.size)
+        self.assertRegex(vetement.image_couleur, r'^#[0-9a-f]{6}$')
+
+        vetement.image = None
+        vetement.save()
+        self.assertIsNone(Vetement.objects.get(pk=vetement.pk).image_largeur)
+
+    def test_commande_de_rattrapage(self):
+        """Test que la commande complète les photos sans métadonnées"""
+        vetement = self.creer_vetement()
+        Vetement.objects.filter(pk=vetement.pk).update(image_largeur=None, image_hauteur=None, image_couleur='')
+
+        call_command('completer_metadonnees_images', workers=1, stdout=StringIO())
+        vetement.refresh_from_db()
+        self.assertEqual((vetement.image_largeur, vetement.image_hauteur), (200, 300))
+        self.assertNotEqual(vetement.image_couleur, '')
+
+
+class MigrationMediasTestCase(TestCase):
+    """Tests de la commande migrer_medias"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.source = FileSystemStorage(location=os.path.join(self.tmp.name, 'source'))
+        self.destination = FileSystemStorage(location=os.path.join(self.tmp.name, 'destination'))
+
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        categorie = Categorie.objects.create(nom='Pull')
+        for nom in ('a', 'b'):
+            self.source.save(f'vetements/{nom}.jpg', ContentFile(nom.encode() * 100))
+            Vetement.objects.create(proprietaire=user, nom=nom, categorie=categorie, genre='homme',
+                                    saison='hiver', image=f'vetements/{nom}.jpg')
+
+    def migrer(self, **options):
+        out = StringIO()
+        call_command('migrer_medias', source=self.source, destination=self.destination,
+                     workers=2, stdout=out, stderr=out, **options)
+        return out.getvalue()
+
+    def test_copie_verifiee_et_reprise(self):
+        """Test la copie avec vérification SHA-256 puis la reprise via le checkpoint"""
+        checkpoint = os.path.join(self.tmp.name, 'checkpoint.log')
+        out = self.migrer(verifier='sha256', checkpoint=checkpoint)
+        self.assertIn('2 copié(s)', out)
+        with self.destination.open('vetements/a.jpg') as f:
+            self.assertEqual(f.read(), b'a' * 100)
+
+        out = self.migrer(checkpoint=checkpoint)
+        self.assertIn('2 déjà copié(s)', out)
+
+    def test_absent_non_marque(self):
+        """Test qu'un fichier absent de la source est signalé à chaque passage, puis copié une fois restauré"""
+        checkpoint = os.path.join(self.tmp.name, 'checkpoint.log')
+        self.source.delete('vetements/b.jpg')
+        for _ in range(2):
+            out = self.migrer(checkpoint=checkpoint)
+            self.assertIn('absent de la source vetements/b.jpg', out)
+            self.assertIn('1 absent(s) de la source', out)
+
+        self.source.save('vetements/b.jpg', ContentFile(b'b' * 100))
+        out = self.migrer(checkpoint=checkpoint)
+        self.assertIn('1 déjà copié(s)', out)
+        self.assertIn('1 copié(s)', out)
+        self.assertTrue(self.destination.exists('vetements/b.jpg'))
+
+    def test_dry_run(self):
+        """Test que le mode dry-run compare sans copier"""
+        self.destination.save('vetements/a.jpg', ContentFile(b'x'))
+        out = self.migrer(dry_run=True)
+        self.assertIn('1 différent, 1 manquant', out)
+        self.assertFalse(self.destination.exists('vetements/b.jpg'))
+
+
+class NettoyageMediasTestCase(TestCase):
+    """Tests du nettoyage des médias orphelins"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = FileSystemStorage(location=self.tmp.name)
+
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        categorie = Categorie.objects.create(nom='Pull')
+        Vetement.objects.create(proprietaire=user, nom='Pull', categorie=categorie, genre='homme',
+                                saison='hiver', image='vetements/garde.jpg')
+        for name in ('vetements/garde.jpg', 'vetements/garde_480w.webp',
+                     'vetements/orphelin.jpg', 'vetements/orphelin_480w.jpg'):
+            self.storage.save(name, ContentFile(b'x' * 1024))
+
+    def nettoyer(self, **options):
+        out = StringIO()
+        call_command('nettoyer_medias_orphelins', storage=self.storage, delai_grace=0,
+                     stdout=out, **options)
+        return out.getvalue()
+
+    def test_rapport_seul(self):
+        """Test que le mode par défaut ne supprime rien"""
+        out = self.nettoyer()
+        self.assertIn('2 orphelin(s)', out)
+        self.assertTrue(self.storage.exists('vetements/orphelin.jpg'))
+
+    def test_suppression(self):
+        """Test que seuls les orphelins sont supprimés, vignettes comprises"""
+        out = self.nettoyer(supprimer=True, lot=1)
+        self.assertIn('2 orphelin(s) supprimé(s)', out)
+        self.assertFalse(self.storage.exists('vetements/orphelin.jpg'))
+        self.assertFalse(self.storage.exists('vetements/orphelin_480w.jpg'))
+        self.assertTrue(self.storage.exists('vetements/garde.jpg'))
+        self.assertTrue(self.storage.exists('vetements/garde_480w.webp'))
+
+    def test_delai_de_grace(self):
+        """Test que les fichiers récents sont ignorés"""
+        out = StringIO()
+        call_command('nettoyer_medias_orphelins', storage=self.storage, supprimer=True, stdout=out)
+        self.assertIn('2 récent(s) ignoré(s)', out.getvalue())
+        self.assertTrue(self.storage.exists('vetements/orphelin.jpg'))
+
+    def test_parcours_sftp_en_flux(self):
+        """Test le parcours récursif et la suppression par lot sur SFTP"""
+        sftp = FakeRemoteSFTP({
+            '/media/vetements/a.jpg': b'a',
+            '/media/vetements/2025/b.jpg': b'bb',
+            '/media/tenues/c.jpg': b'ccc',
+        })
+        storage = UnraidSFTPStorage()
+        storage.remote_path = '/media/'
+        storage.cache_enabled = False
+        storage._get_stat_cache = lambda: None
+        storage._run = lambda operation: operation(sftp)
+        storage._lease = lambda: (sftp, lambda discard=False: None)
+
+        names = sorted(name for name, attrs in storage.walk())
+        self.assertEqual(names, ['tenues/c.jpg', 'vetements/2025/b.jpg', 'vetements/a.jpg'])
+        self.assertEqual(storage.delete_many(['tenues/c.jpg', 'absent.jpg']), ['tenues/c.jpg'])
+        self.assertNotIn('/media/tenues/c.jpg', sftp.files)
+
+
+class LocalSFTPServerTestCase(SimpleTestCase):
+    """Tests du storage contre le serveur SFTP local du benchmark"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.server = LocalSFTPServer(self.tmp.name)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+        self.storage = self.server.configure(UnraidSFTPStorage())
+        self.storage.cache_enabled = False
+        self.storage.stat_cache_ttl = 0
+        self.storage.write_behind = False
+        self.storage.content_addressed = False
+        self.addCleanup(lambda: self.storage._get_pool().close())
+
+    def test_operations_sur_une_session(self):
+        """Test que le pool réutilise une seule connexion SSH"""
+        name = self.storage.save('vetements/chemise.jpg', ContentFile(b'x' * 100000))
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.size(name), 100000)
+        with self.storage.open(name) as f:
+            self.assertEqual(len(f.read()), 100000)
+        self.assertEqual(self.storage.listdir('vetements'), ([], ['chemise.jpg']))
+        self.assertEqual([n for n, attrs in self.storage.walk()], ['vetements/chemise.jpg'])
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertLessEqual(self.server.handshakes, 2)  # Session du pool + session de lecture en flux
+
+    def test_benchmark_json(self):
+        """Test que le benchmark écrit ses mesures en JSON"""
+        sortie = os.path.join(self.tmp.name, 'bench.json')
+        call_command('benchmark_stockage', latence=0, operations=5, concurrence=2, taille=4,
+                     sortie=sortie, stdout=StringIO())
+        with open(sortie, encoding='utf-8') as f:
+            report = json.load(f)
+        self.assertEqual(set(report['scenarios']), {'envois', 'lectures', 'exists', 'listdir'})
+        envois = report['scenarios']['envois']
+        self.assertEqual(envois['erreurs'], 0)
+        self.assertGreater(envois['requetes_sftp'], 0)
+        self.assertEqual(set(envois['latence_ms']), {'p50', 'p95', 'p99', 'max'})
+
+
+class TieredStorageTestCase(SimpleTestCase):
+    """Tests du stockage local + réplication vers le serveur distant"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.server = LocalSFTPServer(os.path.join(self.tmp.name, 'unraid'))
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+        self.storage = TieredStorage()
+        self.storage.local_root = os.path.join(self.tmp.name, 'local')
+        self.storage.journal_dir = os.path.join(self.tmp.name, 'journal')
+        self.storage.health_check_interval = 0.05
+        self.storage.primary = FileSystemStorage(location=self.storage.local_root)
+        replica = self.server.configure(self.storage.replica)
+        replica.cache_enabled = False
+        replica.stat_cache_ttl = 0
+        self.replicator = self.storage._get_replicator()
+
+    def remote_path(self, name):
+        return os.path.join(self.server.root, 'media', name)
+
+    def wait_replicated(self):
+        for _ in range(100):
+            self.replicator.join()
+            if not self.replicator.journal.pending():
+                return
+            time.sleep(0.05)
+        self.fail("Réplication non terminée")
+
+    def test_envoi_puis_replication(self):
+        """Test que le fichier est local tout de suite, puis répliqué"""
+        name = self.storage.save('vetements/chemise.jpg', ContentFile(b'photo'))
+        self.assertTrue(os.path.isfile(self.storage.primary.path(name)))
+        self.wait_replicated()
+        with open(self.remote_path(name), 'rb') as f:
+            self.assertEqual(f.read(), b'photo')
+        self.assertEqual(self.storage.url(name), '/media/vetements/chemise.jpg')
+
+        self.storage.delete(name)
+        self.wait_replicated()
+        self.assertFalse(os.path.exists(self.remote_path(name)))
+
+    def test_serveur_indisponible(self):
+        """Test que les envois continuent pendant une coupure et sont rejoués au retour"""
+        port = self.storage.replica.port
+        self.storage.replica.port = 1  # Connexion refusée
+        name = self.storage.save('vetements/pull.jpg', ContentFile(b'photo'))
+        self.replicator.join()
+
+        self.assertFalse(self.replicator.health.is_healthy())
+        self.assertEqual(len(self.replicator.journal.pending()), 1)
+        self.assertEqual(self.storage.url(name), reverse('vetements:media_en_attente', args=[name]))
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'photo')
+        # Nom aléatoire : Unraid ne peut pas dire si pull.jpg y existe déjà
+        self.assertNotEqual(self.storage.get_available_name('vetements/pull.jpg'), 'vetements/pull.jpg')
+
+        self.storage.replica.port = port
+        self.wait_replicated()
+        self.assertTrue(self.replicator.health.is_healthy())
+        self.assertTrue(os.path.isfile(self.remote_path(name)))
+
+    def test_lecture_depuis_le_serveur(self):
+        """Test qu'un fichier présent seulement sur le serveur distant est lu là-bas"""
+        os.makedirs(os.path.dirname(self.remote_path('vetements/ancien.jpg')))
+        with open(self.remote_path('vetements/ancien.jpg'), 'wb') as f:
+            f.write(b'ancien')
+        self.assertTrue(self.storage.exists('vetements/ancien.jpg'))
+        with self.storage.open('vetements/ancien.jpg') as f:
+            self.assertEqual(f.read(), b'ancien')
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(MEDIA_UPLOAD_SECRET='secret-de-test')
+class EnvoiDirectTestCase(TestCase):
+    """Tests de l'envoi direct des photos au serveur média"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.server = make_server('127.0.0.1', 0, UploadReceiver(self.tmp.name, 'secret-de-test'),
+                                  handler_class=QuietHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.upload_url = f'http://127.0.0.1:{self.server.server_port}/upload/'
+
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.categorie = Categorie.objects.create(nom='Pull')
+        self.client.login(username='testuser', password='testpass123')
+
+    def put(self, url, data):
+        request = urllib.request.Request(url, data=data, method='PUT', headers={'Content-Type': 'image/jpeg'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def test_signature(self):
+        """Test que la signature couvre le nom, la taille maximum et l'expiration"""
+        params = upload_params('secret', 'vetements/a.jpg', 1000, 2000)
+        self.assertTrue(verify_upload('secret', 'vetements/a.jpg', 2000, 1000, params['signature'], now=1000))
+        self.assertFalse(verify_upload('secret', 'vetements/a.jpg', 2000, 1000, params['signature'], now=3000))
+        self.assertFalse(verify_upload('secret', 'vetements/b.jpg', 2000, 1000, params['signature'], now=1000))
+        self.assertFalse(verify_upload('secret', 'vetements/a.jpg', 2000, 9999, params['signature'], now=1000))
+        self.assertFalse(verify_upload('autre', 'vetements/a.jpg', 2000, 1000, params['signature'], now=1000))
+
+    def test_envoi_puis_formulaire(self):
+        """Test que la photo va au récepteur et que le formulaire n'enregistre que son nom"""
+        photo = photo_jpeg((64, 48))
+        with override_settings(MEDIA_UPLOAD_URL=self.upload_url):
+            config = VetementForm().direct_upload()
+        status, recu = self.put(config['url'], photo)
+        self.assertEqual(status, 201)
+        with open(os.path.join(self.tmp.name, recu['nom']), 'rb') as f:
+            self.assertEqual(f.read(), photo)
+        # URL à usage unique : le même nom ne peut pas être écrasé
+        self.assertEqual(self.put(config['url'], photo)[0], 409)
+
+        data = {'nom': 'Pull', 'categorie': self.categorie.pk, 'genre': 'homme', 'saison': 'hiver',
+                'etat': 'bon', 'image_directe': json.dumps(recu)}
+        with mock.patch('vetements.models.schedule_variants'), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('vetements:vetement_create'), data)
+        self.assertEqual(response.status_code, 302)
+        vetement = Vetement.objects.get(nom='Pull')
+        self.assertEqual(vetement.image.name, recu['nom'])
+        self.assertEqual(vetement.image_taille, len(photo))
+
+        recu['taille'] += 1
+        response = self.client.post(reverse('vetements:vetement_create'), dict(data, image_directe=json.dumps(recu)))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('image_directe', response.context['form'].errors)
+
+    def test_envois_refuses(self):
+        """Test que le récepteur refuse les URL modifiées et les fichiers trop gros"""
+        with override_settings(MEDIA_UPLOAD_URL=self.upload_url):
+            config = VetementForm().direct_upload()
+        self.assertEqual(self.put(config['url'].replace('vetements/', 'tenues/'), b'x')[0], 403)
+        params = upload_params('secret-de-test', 'vetements/petit.jpg', 10, time.time() + 60)
+        self.assertEqual(self.put(f"{self.upload_url}vetements/petit.jpg?{urlencode(params)}", b'x' * 11)[0], 413)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+class MediaSigneTestCase(TestCase):
+    """Tests des URLs de photos signées et de la vue media_protege"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.autre = User.objects.create_user(username='autre', password='testpass123')
+        categorie = Categorie.objects.create(nom='Pull')
+        Vetement.objects.create(proprietaire=self.user, nom='Pull', categorie=categorie, genre='homme',
+                                saison='hiver', image='vetements/pull.jpg')
+
+    def test_url_signee(self):
+        """Test que l'URL du storage est signée et vérifiée par le récepteur"""
+        storage = UnraidSFTPStorage()
+        storage.base_url = '/media/'
+        storage.write_behind = False
+        storage.signing_secret = 'secret'
+        url = storage.url('vetements/pull.jpg')
+        self.assertTrue(url.startswith('/media/vetements/pull.jpg?expires='))
+
+        receiver = UploadReceiver('/inexistant', '', media_secret='secret')
+        self.assertTrue(receiver.authorize(url))
+        self.assertFalse(receiver.authorize(url.replace('pull.jpg', 'autre.jpg')))
+        self.assertFalse(UploadReceiver('/inexistant', '', media_secret='autre').authorize(url))
+
+    def test_expiration(self):
+        """Test que l'URL reste la même dans une fenêtre et expire ensuite"""
+        params = media_url_params('secret', 'vetements/pull.jpg', 3600, now=7200)
+        self.assertEqual(params, media_url_params('secret', 'vetements/pull.jpg', 3600, now=10799))
+        self.assertTrue(verify_media_url('secret', 'vetements/pull.jpg', params['expires'], params['signature'], now=10799))
+        self.assertFalse(verify_media_url('secret', 'vetements/pull.jpg', params['expires'], params['signature'],
+                                          now=params['expires'] + 1))
+
+    def test_media_protege(self):
+        """Test que seuls le propriétaire et ses amis obtiennent le X-Accel-Redirect"""
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('vetements:media_protege', args=['vetements/pull_480w.webp']))
+        self.assertEqual(response['X-Accel-Redirect'], '/media-interne/vetements/pull_480w.webp')
+        self.assertEqual(response.content, b'')
+        self.assertNotIn('Content-Type', response)
+
+        self.client.login(username='autre', password='testpass123')
+        url = reverse('vetements:media_protege', args=['vetements/pull.jpg'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        Amitie.objects.create(demandeur=self.autre, destinataire=self.user, statut='acceptee')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_media_en_attente(self):
+        """Test que les photos en attente d'envoi sont réservées comme les photos protégées"""
+        url = reverse('vetements:media_en_attente', args=['vetements/pull.jpg'])
+        self.assertRedirects(self.client.get(url), f"{reverse('vetements:login')}?next={url}",
+                             fetch_redirect_response=False)
+        self.client.login(username='autre', password='testpass123')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.client.get(url).status_code, 302)  # Déjà envoyée : URL définitive
+
+    def test_url_signee_dans_script(self):
+        """Test que l'URL signée d'une photo arrive intacte dans les données JavaScript du fring"""
+        url = '/media/vetements/pull.jpg?expires=1000&signature=abc'
+        self.client.login(username='testuser', password='testpass123')
+        with mock.patch.object(FileSystemStorage, 'url', lambda storage, name: url), \
+                mock.patch('vetements.templatetags.image_tags.schedule_variants'):
+            response = self.client.get(reverse('vetements:fring_widget'))
+        images = re.findall(r'image: ("[^"]*")', response.content.decode())
+        self.assertEqual([json.loads(image) for image in images], [url])
+
+
+class QuotaStockageTestCase(TestCase):
+    """Tests du suivi de l'espace de stockage par utilisateur"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(MEDIA_ROOT=self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.categorie = Categorie.objects.create(nom='Pull')
+
+    def utilisation(self):
+        return UtilisationStockage.objects.filter(utilisateur=self.user).values_list(
+            'octets', 'nombre_fichiers').first()
+
+    def creer_vetement(self, taille=(300, 200)):
+        vetement = Vetement(proprietaire=self.user, nom='Pull', categorie=self.categorie,
+                            genre='homme', saison='hiver')
+        vetement.image = ContentFile(photo_jpeg(taille), name='pull.jpg')
+        vetement.save()
+        return vetement
+
+    def test_compteurs_incrementaux(self):
+        """Test les compteurs à l'envoi, au remplacement et à la suppression"""
+        a = self.creer_vetement()
+        b = self.creer_vetement((400, 300))
+        self.assertEqual(self.utilisation(), (a.image_taille + b.image_taille, 2))
+
+        b.nom = 'Pull bleu'
+        b.save()  # Sans changement de photo
+        b.image = ContentFile(photo_jpeg((100, 100)), name='petit.jpg')
+        b.save()
+        self.assertEqual(self.utilisation(), (a.image_taille + b.image_taille, 2))
+
+        a.image = None
+        a.save()
+        b.delete()
+        self.assertEqual(self.utilisation(), (0, 0))
+
+    def test_compteurs_initiaux(self):
+        """Test que la migration des quotas compte les photos déjà enregistrées"""
+        compteurs_initiaux = import_module('vetements.migrations.0013_utilisation_stockage').compteurs_initiaux
+        a = self.creer_vetement()
+        b = self.creer_vetement((400, 300))
+        Vetement.objects.filter(pk=b.pk).update(image_taille=None)  # Poids inconnu : compté sans octets
+        UtilisationStockage.objects.all().delete()
+
+        compteurs_initiaux(django_apps, None)
+        self.assertEqual(self.utilisation(), (a.image_taille, 2))
+
+    def test_poids_complete(self):
+        """Test que completer_metadonnees_images reporte le poids complété dans le quota"""
+        vetement = self.creer_vetement()
+        taille = vetement.image_taille
+        # Photo antérieure aux métadonnées : comptée sans son poids
+        Vetement.objects.filter(pk=vetement.pk).update(image_largeur=None, image_taille=None)
+        UtilisationStockage.objects.filter(utilisateur=self.user).update(octets=0)
+
+        call_command('completer_metadonnees_images', workers=1, stdout=StringIO())
+        self.assertEqual(self.utilisation(), (taille, 1))
+        call_command('completer_metadonnees_images', workers=1, tout=True, stdout=StringIO())
+        self.assertEqual(self.utilisation(), (taille, 1))
+
+    def test_quota_depasse(self):
+        """Test qu'une photo au-delà du quota restant est refusée par le formulaire"""
+        ParametresSite.objects.create(quota_stockage=1)
+        UtilisationStockage.objects.create(utilisateur=self.user, octets=1024 * 1024 - 100)
+        data = {'nom': 'Pull', 'categorie': self.categorie.pk, 'genre': 'homme',
+                'saison': 'hiver', 'etat': 'bon'}
+        photo = photo_jpeg((300, 200))
+
+        def fichiers():
+            return {'image': SimpleUploadedFile('a.jpg', photo)}
+
+        form = VetementForm(data, fichiers(), utilisateur=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('Quota de stockage atteint', str(form.errors['image']))
+
+        # Sans utilisateur (administration) ou avec un quota illimité : accepté
+        self.assertTrue(VetementForm(data, fichiers()).is_valid())
+        ParametresSite.objects.update(quota_stockage=0)
+        self.assertTrue(VetementForm(data, fichiers(), utilisateur=self.user).is_valid())
+
+    def test_recalcul(self):
+        """Test que recalculer_quotas reconstruit les compteurs depuis le storage"""
+        a = self.creer_vetement()
+        b = self.creer_vetement()
+        storage = FileSystemStorage(location=self.tmp.name)
+        storage.delete(b.image.name)
+        Vetement.objects.filter(pk=a.pk).update(image_taille=None)
+        UtilisationStockage.objects.filter(utilisateur=self.user).update(octets=1, nombre_fichiers=7)
+
+        out = StringIO()
+        call_command('recalculer_quotas', storage=storage, dry_run=True, stdout=out)
+        self.assertEqual(self.utilisation(), (1, 7))
+
+        call_command('recalculer_quotas', storage=storage, stdout=out)
+        a.refresh_from_db()
+        self.assertEqual(a.image_taille, storage.size(a.image.name))
+        self.assertEqual(self.utilisation(), (a.image_taille, 1))
+        self.assertIn('1 photo(s) absente(s) du storage', out.getvalue())
+
+    def test_suppression_utilisateur(self):
+        """Test que supprimer un utilisateur et ses photos ne recrée pas son compteur"""
+        self.creer_vetement()
+        self.user.delete()
+        self.assertFalse(UtilisationStockage.objects.exists())
+
+
+class StatistiquesUtilisateurTestCase(TestCase):
+    """Tests des statistiques de garde-robe tenues à jour en base"""
+
+    CHAMPS = StatistiquesUtilisateur.COMPTEURS + StatistiquesUtilisateur.REPARTITIONS
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.autre = User.objects.create_user(username='autre', password='testpass123')
+        self.pull = Categorie.objects.create(nom='Pull')
+        self.jean = Categorie.objects.create(nom='Jean')
+        self.noir = Couleur.objects.create(nom='Noir', code_hex='#000000')
+        StatistiquesUtilisateur.pour(self.user)
+        StatistiquesUtilisateur.pour(self.autre)
+
+    def etat(self, user):
+        return StatistiquesUtilisateur.objects.filter(utilisateur=user).values(*self.CHAMPS).get()
+
+    def verifier_coherence(self):
+        """Les compteurs incrémentaux doivent égaler une reconstruction complète"""
+        incrementaux = [self.etat(self.user), self.etat(self.autre)]
+        StatistiquesUtilisateur.recalculer()
+        self.assertEqual(incrementaux, [self.etat(self.user), self.etat(self.autre)])
+
+    def vetement(self, **kwargs):
+        valeurs = {'proprietaire': self.user, 'nom': 'Pull', 'categorie': self.pull,
+                   'genre': 'homme', 'saison': 'hiver'}
+        valeurs.update(kwargs)
+        return Vetement.objects.create(**valeurs)
+
+    def test_maintenance_incrementale(self):
+        """Test création, modification, changement de propriétaire et suppression"""
+        a = self.vetement(prix_achat=Decimal('49.90'), couleur=self.noir, favori=True)
+        b = self.vetement(categorie=self.jean, nombre_portage=5, a_laver=True)
+        stats = self.etat(self.user)
+        self.assertEqual((stats['nb_vetements'], stats['nb_favoris'], stats['nb_a_laver']), (2, 1, 1))
+        self.assertEqual((stats['nb_peu_portes'], stats['nb_jamais_portes']), (1, 1))
+        self.assertEqual(stats['total_depense'], Decimal('49.90'))
+        self.assertEqual(stats['par_categorie'], {str(self.pull.pk): 1, str(self.jean.pk): 1})
+
+        a.nombre_portage = 4
+        a.categorie = self.jean
+        a.couleur = None
+        a.save()
+        b.proprietaire = self.autre
+        b.save()
+        Tenue.objects.create(proprietaire=self.user, nom='Bureau')
+        message = Message.objects.create(expediteur=self.user, destinataire=self.autre, sujet='Salut', contenu='...')
+        message.marquer_comme_lu()
+        self.verifier_coherence()
+
+        a.delete()
+        message.delete()
+        self.verifier_coherence()
+        self.assertEqual(self.etat(self.user)['nb_vetements'], 0)
+
+    def test_tableau_de_bord(self):
+        """Test que l'accueil lit les statistiques sans parcourir les vêtements"""
+        self.client.login(username='testuser', password='testpass123')
+        self.vetement()
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('vetements:accueil'))
+        for _ in range(20):
+            self.vetement(categorie=self.jean, prix_achat=Decimal('10'))
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('vetements:accueil'))
+        self.assertEqual(response.context['total_vetements'], 21)
+        self.assertEqual(response.context['total_depense'], Decimal('200'))
+        self.assertEqual(response.context['par_categorie'][0], {'categorie__nom': 'Jean', 'count': 20})
+
+    def test_commande(self):
+        """Test que la commande corrige les statistiques après une mise à jour en masse"""
+        self.vetement()
+        Vetement.objects.update(favori=True)
+        call_command('recalculer_statistiques', utilisateur=['testuser'], stdout=StringIO())
+        self.assertEqual(self.etat(self.user)['nb_favoris'], 1)
+
+
+class CalculStatistiquesTestCase(TestCase):
+    """Tests du calcul des statistiques détaillées"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.pull = Categorie.objects.create(nom='Pull')
+        self.jean = Categorie.objects.create(nom='Jean')
+        self.noir = Couleur.objects.create(nom='Noir', code_hex='#000000')
+        self.aujourd_hui = date(2025, 3, 15)
+
+    def vetement(self, **kwargs):
+        valeurs = {'proprietaire': self.user, 'nom': 'Pull', 'categorie': self.pull,
+                   'genre': 'homme', 'saison': 'hiver'}
+        valeurs.update(kwargs)
+        return Vetement.objects.create(**valeurs)
+
+    def test_valeurs(self):
+        """Test les agrégats, le coût par portage et l'utilisation mensuelle"""
+        rentable = self.vetement(prix_achat=Decimal('50'), nombre_portage=10, couleur=self.noir,
+                                 derniere_utilisation=date(2025, 3, 1))
+        self.vetement(prix_achat=Decimal('30'), nombre_portage=1, derniere_utilisation=date(2024, 4, 30))
+        self.vetement(categorie=self.jean, prix_achat=Decimal('80'), derniere_utilisation=date(2024, 1, 10))
+        self.vetement(categorie=self.jean, nombre_portage=3, derniere_utilisation=date(2024, 8, 2))
+
+        stats = calculer_statistiques(self.user, aujourd_hui=self.aujourd_hui)
+        self.assertEqual((stats.total_vetements, stats.total_depense, stats.total_portages), (4, Decimal('160'), 14))
+        self.assertAlmostEqual(stats.cout_moyen_portage, (5 + 30) / 2)
+        self.assertEqual((stats.valeur_portee, stats.valeur_non_portee), (Decimal('80'), Decimal('80')))
+        self.assertEqual((stats.nb_jamais_portes, stats.nb_anciens, stats.vetements_recents), (1, 2, 1))
+        self.assertEqual(stats.taux_rotation, 25)
+        self.assertEqual([alerte['count'] for alerte in stats.alertes], [1, 2])
+
+        self.assertEqual(stats.par_categorie[0]['categorie__nom'], 'Jean')
+        self.assertEqual(stats.cout_par_categorie, [{'categorie': 'Pull', 'cout_moyen': 17.5, 'count': 2}])
+        self.assertEqual([c['couleur__nom'] for c in stats.couleurs_dominantes], ['Noir'])
+        self.assertEqual(stats.plus_rentables, [rentable])
+        self.assertEqual(len(stats.peu_portes), 2)
+
+        self.assertEqual(stats.labels_mois[0], date(2024, 4, 1).strftime('%b %Y'))
+        self.assertEqual(stats.utilisation_mensuelle, [0] * 12)
+
+        # Le graphique compte les portages de l'historique, pas les dernières utilisations
+        for jour in (date(2024, 3, 31), date(2024, 4, 30), date(2025, 3, 1), date(2025, 3, 2)):
+            Portage.enregistrer([rentable], jour)
+        stats = calculer_statistiques(self.user, aujourd_hui=self.aujourd_hui)
+        self.assertEqual(stats.utilisation_mensuelle, [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 2])
+
+    def test_nombre_de_requetes_constant(self):
+        """Test que le nombre de requêtes ne dépend pas de la taille de la garde-robe"""
+        self.vetement()
+        with self.assertNumQueries(8):
+            calculer_statistiques(self.user)
+
+        categories = Categorie.objects.bulk_create([Categorie(nom=f'Catégorie {i}') for i in range(15)])
+        Vetement.objects.bulk_create([
+            Vetement(proprietaire=self.user, nom=f'Vêtement {i}', categorie=categories[i % 15], genre='homme',
+                     prix_achat=Decimal(i + 1), nombre_portage=i % 8, derniere_utilisation=date.today())
+            for i in range(200)
+        ])
+        with self.assertNumQueries(8):
+            calculer_statistiques(self.user)
+
+    def test_page(self):
+        """Test que la page statistiques s'affiche"""
+        self.vetement(prix_achat=Decimal('50'), nombre_portage=6, derniere_utilisation=date.today())
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('vetements:statistiques'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_vetements'], 1)
+
+
+class PortageTestCase(TestCase):
+    """Tests de l'historique des portages"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        categorie = Categorie.objects.create(nom='Pull')
+        self.pull, self.jean = [
+            Vetement.objects.create(proprietaire=self.user, nom=nom, categorie=categorie, genre='homme')
+            for nom in ('Pull', 'Jean')
+        ]
+        self.tenue = Tenue.objects.create(proprietaire=self.user, nom='Bureau')
+        self.tenue.vetements.set([self.pull, self.jean])
+        StatistiquesUtilisateur.pour(self.user)
+
+    def test_portage_d_une_tenue(self):
+        """Test qu'une tenue portée enregistre ses vêtements en un insert et une mise à jour"""
+        # Savepoints compris : un insert pour l'historique, une mise à jour par table
+        with self.assertNumQueries(11):
+            self.tenue.porter(date(2025, 3, 10))
+        self.tenue.porter(date(2025, 1, 5))  # Portage saisi après coup
+
+        self.pull.refresh_from_db()
+        self.assertEqual((self.pull.nombre_portage, self.pull.derniere_utilisation), (2, date(2025, 3, 10)))
+        self.assertEqual((self.tenue.nombre_fois_portee, self.tenue.derniere_fois_portee), (2, date(2025, 3, 10)))
+        self.assertEqual(Portage.objects.filter(tenue=self.tenue).count(), 4)
+
+        stats = StatistiquesUtilisateur.objects.get(utilisateur=self.user)
+        self.assertEqual((stats.total_portages, stats.nb_jamais_portes, stats.nb_peu_portes), (4, 0, 2))
+
+    def test_series(self):
+        """Test les séries par jour, semaine et mois, sans période manquante"""
+        self.pull.porter(date(2025, 3, 3))
+        self.pull.porter(date(2025, 3, 4))
+        self.jean.porter(date(2025, 3, 4))
+        self.jean.porter(date(2025, 3, 12))
+
+        jours = serie_portages(self.user, date(2025, 3, 3), date(2025, 3, 5), 'jour')
+        self.assertEqual([(p['portages'], p['vetements']) for p in jours], [(1, 1), (2, 2), (0, 0)])
+
+        semaines = serie_portages(self.user, date(2025, 3, 5), date(2025, 3, 12), 'semaine')
+        self.assertEqual([p['periode'] for p in semaines], [date(2025, 3, 3), date(2025, 3, 10)])
+        self.assertEqual([p['portages'] for p in semaines], [3, 1])
+
+        mois = serie_portages(self.user, date(2025, 2, 1), date(2025, 3, 31), 'mois')
+        self.assertEqual([(p['periode'], p['portages'], p['vetements']) for p in mois],
+                         [(date(2025, 2, 1), 0, 0), (date(2025, 3, 1), 4, 2)])
+
+
+class CacheStatistiquesTestCase(TestCase):
+    """Tests du cache des statistiques, indexé par la version de la garde-robe"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.categorie = Categorie.objects.create(nom='Pull')
+        self.pull = Vetement.objects.create(proprietaire=self.user, nom='Pull', categorie=self.categorie, genre='homme')
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_pages_servies_depuis_le_cache(self):
+        """Test qu'un second affichage ne refait aucun calcul"""
+        for nom in ('vetements:statistiques', 'vetements:accueil'):
+            self.client.get(reverse(nom))
+            # Session, utilisateur, ligne de statistiques et processeur de contexte
+            with self.assertNumQueries(4):
+                response = self.client.get(reverse(nom))
+            self.assertEqual(response.context['total_vetements'], 1)
+
+    def test_invalidation(self):
+        """Test qu'une écriture dans la garde-robe périme les valeurs en cache"""
+        self.client.get(reverse('vetements:statistiques'))
+        self.pull.nom = 'Pull marin'
+        self.pull.save()
+        response = self.client.get(reverse('vetements:statistiques'))
+        self.assertEqual(response.context['peu_portes'][0].nom, 'Pull marin')
+
+        self.pull.porter()
+        response = self.client.get(reverse('vetements:statistiques'))
+        self.assertEqual(response.context['total_portages'], 1)
+
+    def test_suppression_couleur(self):
+        """Test qu'une couleur supprimée disparaît des statistiques en cache et des répartitions"""
+        rouge = Couleur.objects.create(nom='Rouge', code_hex='#ff0000')
+        self.pull.couleur = rouge
+        self.pull.save()
+        response = self.client.get(reverse('vetements:statistiques'))
+        self.assertIn('Rouge', [ligne['couleur__nom'] for ligne in response.context['par_couleur']])
+
+        rouge.delete()
+        response = self.client.get(reverse('vetements:statistiques'))
+        self.assertNotIn('Rouge', [ligne['couleur__nom'] for ligne in response.context['par_couleur']])
+        self.assertEqual(StatistiquesUtilisateur.objects.get(utilisateur=self.user).par_couleur, {})
+
+    def test_jour_local(self):
+        """Test que la clé du cache et le calcul utilisent le même jour, celui du fuseau du site"""
+        minuit_passe = datetime(2026, 3, 1, 23, 30, tzinfo=dt_timezone.utc)  # Le 2 mars à Paris
+        with override_settings(TIME_ZONE='Europe/Paris'), mock.patch('django.utils.timezone.now', return_value=minuit_passe), \
+                mock.patch('vetements.views.calculer_statistiques', wraps=calculer_statistiques) as calcul:
+            self.client.get(reverse('vetements:statistiques'))
+        self.assertEqual(calcul.call_args.args[1], date(2026, 3, 2))
+        self.assertIsNotNone(cache.get(cle_cache(self.user.pk, 'statistiques-2026-03-02')))
+
+    def test_un_seul_recalcul(self):
+        """Test qu'une version périmée n'est recalculée qu'une fois, l'ancienne valeur servie entre-temps"""
+        stats = SimpleNamespace(utilisateur_id=self.user.pk, version=1)
+        self.assertEqual(en_cache(stats, 'test', lambda: 'v1'), 'v1')
+
+        stats.version = 2
+        demarre, libere = threading.Event(), threading.Event()
+        appels = []
+
+        def calcul_lent():
+            appels.append(1)
+            demarre.set()
+            libere.wait(5)
+            return 'v2'
+
+        meneur = threading.Thread(target=en_cache, args=(stats, 'test', calcul_lent))
+        meneur.start()
+        demarre.wait(5)
+        resultats = [en_cache(stats, 'test', calcul_lent) for _ in range(3)]
+        libere.set()
+        meneur.join()
+
+        self.assertEqual(resultats, ['v1'] * 3)
+        self.assertEqual(len(appels), 1)
+        self.assertEqual(en_cache(stats, 'test', calcul_lent), 'v2')
+        self.assertEqual(len(appels), 1)
+
+
+class RechercheTestCase(TestCase):
+    """Tests de la recherche plein texte et de la syntaxe champ:valeur"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.haut = Categorie.objects.create(nom='Haut')
+        self.noir = Couleur.objects.create(nom='Noir', code_hex='#000000')
+        self.chemises = self.vetement(nom='Chemises à carreaux', marque='Zara', couleur=self.noir)
+        self.pull = self.vetement(nom='Pull rayé', description='Se porte avec une chemise', saison='hiver')
+        self.robe = self.vetement(nom="Robe d'été", marque='Comptoir des Cotonniers', saison='ete')
+
+    def vetement(self, **kwargs):
+        valeurs = {'proprietaire': self.user, 'categorie': self.haut, 'genre': 'femme'}
+        valeurs.update(kwargs)
+        return Vetement.objects.create(**valeurs)
+
+    def chercher(self, texte):
+        return list(rechercher(Vetement.objects.filter(proprietaire=self.user).order_by('-date_ajout'), texte))
+
+    def test_accents_pluriels_et_pertinence(self):
+        """Test que la recherche ignore accents et pluriels, et classe le nom avant la description"""
+        self.assertEqual(self.chercher('chemise'), [self.chemises, self.pull])
+        self.assertEqual(self.chercher('RAYEE'), [self.pull])
+        self.assertEqual(self.chercher('robe ete'), [self.robe])
+        self.assertEqual(self.chercher('la robe'), [self.robe])
+        self.assertEqual(self.chercher('cotonn'), [self.robe])  # Préfixe
+        self.assertEqual(self.chercher('chemise zara'), [self.chemises])
+
+    def test_syntaxe_de_champs(self):
+        """Test les filtres champ:valeur, seuls ou avec des mots libres"""
+        requete = analyser_requete('pull couleur:noir Saison:Été marque:"comptoir des cotonniers" url:x')
+        self.assertEqual(requete.termes, ['pull', 'url', 'x'])
+        self.assertEqual(requete.filtres, [('couleur', 'noir'), ('saison', 'Été'),
+                                           ('marque', 'comptoir des cotonniers')])
+
+        self.assertEqual(self.chercher('couleur:NOIR'), [self.chemises])
+        self.assertEqual(self.chercher('saison:été'), [self.robe])
+        self.assertEqual(self.chercher('marque:"comptoir des cotonniers" robe'), [self.robe])
+        self.assertEqual(self.chercher('chemise saison:hiver'), [self.pull])
+        self.assertEqual(self.chercher('couleur:violet'), [])
+        self.assertEqual(self.chercher('saison:"'), [])
+
+    def test_index_tenu_a_jour(self):
+        """Test que l'index suit les modifications et suppressions, et se reconstruit"""
+        self.pull.nom = 'Gilet'
+        self.pull.save()
+        self.assertEqual(self.chercher('gilet'), [self.pull])
+        self.assertEqual(self.chercher('pull'), [])
+        self.chemises.delete()
+        self.assertEqual(self.chercher('chemise'), [self.pull])
+
+        Vetement.objects.bulk_create([Vetement(proprietaire=self.user, categorie=self.haut, genre='homme', nom='Jean brut')])
+        self.assertEqual(self.chercher('jean'), [])
+        call_command('indexer_recherche', stdout=StringIO())
+        self.assertEqual([v.nom for v in self.chercher('jean')], ['Jean brut'])
+
+    def test_vue_liste(self):
+        """Test la recherche depuis la liste des vêtements, limitée au propriétaire"""
+        autre = User.objects.create_user(username='autre', password='testpass123')
+        self.vetement(proprietaire=autre, nom='Chemise')
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('vetements:liste_vetements'), {'q': 'chemise'})
+        self.assertEqual(list(response.context['vetements']), [self.chemises, self.pull])
+
+
+class RechercheAnnoncesTestCase(TestCase):
+    """Tests de la recherche approchée du marketplace"""
+
+    def setUp(self):
+        self.vendeur = User.objects.create_user(username='vendeur', password='testpass123')
+        self.acheteur = User.objects.create_user(username='acheteur', password='testpass123')
+        self.bas = Categorie.objects.create(nom='Pantalon')
+        self.jean = self.annonce('Jean slim', 'Levis')
+        self.baskets = self.annonce('Baskets Air', 'Nike')
+        self.robe = self.annonce('Robe longue', '', description_vente='Portée une fois, parfait état')
+
+    def annonce(self, nom, marque, **kwargs):
+        vetement = Vetement.objects.create(proprietaire=self.vendeur, nom=nom, marque=marque,
+                                           categorie=self.bas, genre='femme')
+        return AnnonceVente.objects.create(vetement=vetement, vendeur=self.vendeur, prix_vente=Decimal('20'), **kwargs)
+
+    def chercher(self, texte):
+        return list(rechercher_annonces(AnnonceVente.objects.filter(statut='en_vente'), texte))
+
+    def test_trigrammes(self):
+        """Test le découpage en trigrammes, comme pg_trgm"""
+        self.assertEqual(trigrammes('Été'), {'  e', ' et', 'ete', 'te '})
+
+    def test_fautes_de_frappe(self):
+        """Test qu'une requête mal orthographiée trouve l'annonce"""
+        self.assertEqual(self.chercher('jeen'), [self.jean])
+        self.assertEqual(self.chercher('nikee'), [self.baskets])
+        self.assertEqual(self.chercher('levi jeans'), [self.jean])
+        self.assertEqual(self.chercher('pantalons'), [self.robe, self.baskets, self.jean])  # Catégorie commune
+        self.assertEqual(self.chercher('parfait etat'), [self.robe])
+        self.assertEqual(self.chercher('chaussettes'), [])
+
+    def test_fraicheur(self):
+        """Test qu'à similarité égale, l'annonce la plus récente passe devant"""
+        ancienne = self.annonce('Jean brut', 'Levis')
+        AnnonceVente.objects.filter(pk=ancienne.pk).update(date_publication=timezone.now() - timedelta(days=60))
+        recherche_annonces.indexer([ancienne])
+        resultats = self.chercher('jean levis')
+        self.assertEqual(resultats[:2], [self.jean, ancienne])
+        self.assertGreater(resultats[0].score, 2 * resultats[1].score)
+
+    def test_documents_tenus_a_jour(self):
+        """Test que seules les annonces en vente sont cherchées, avec le nom courant du vêtement"""
+        self.jean.statut = 'vendue'
+        self.jean.save()
+        self.assertEqual(self.chercher('jean'), [])
+        self.assertFalse(DocumentAnnonce.objects.filter(annonce=self.jean).exists())
+
+        self.baskets.vetement.nom = 'Sneakers'
+        self.baskets.vetement.save()
+        self.assertEqual(self.chercher('sneaker'), [self.baskets])
+
+        AnnonceVente.objects.filter(pk=self.jean.pk).update(statut='en_vente')
+        call_command('indexer_recherche', stdout=StringIO())
+        self.assertEqual(self.chercher('jean'), [self.jean])
+
+    def test_vue_marketplace(self):
+        """Test la recherche depuis le marketplace, sans les annonces de l'utilisateur, page par page"""
+        self.client.login(username='acheteur', password='testpass123')
+        response = self.client.get(reverse('vetements:marketplace_liste'), {'q': 'jeen'})
+        self.assertEqual(list(response.context['annonces']), [self.jean])
+
+        self.client.login(username='vendeur', password='testpass123')
+        response = self.client.get(reverse('vetements:marketplace_liste'), {'q': 'jeen'})
+        self.assertEqual(list(response.context['annonces']), [])
+
+        self.client.login(username='acheteur', password='testpass123')
+        with mock.patch('vetements.views.ANNONCES_PAR_PAGE', 2):
+            response = self.client.get(reverse('vetements:marketplace_liste'), {'q': 'pantalons'})
+            self.assertEqual(list(response.context['annonces']), [self.robe, self.baskets])
+            suivante = {'q': 'pantalons', 'curseur': response.context['page'].suivant}
+            response = self.client.get(reverse('vetements:marketplace_liste'), suivante)
+        self.assertEqual(list(response.context['annonces']), [self.jean])
+
+
+class PaginationCurseurTestCase(TestCase):
+    """Tests de la pagination par curseur"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.autre = User.objects.create_user(username='autre', password='testpass123')
+        Message.objects.bulk_create([
+            Message(expediteur=self.autre, destinataire=self.user, sujet=f'Message {i}', contenu='...')
+            for i in range(23)
+        ])
+        # Dates en partie égales : l'identifiant départage
+        for i, message in enumerate(Message.objects.order_by('pk')):
+            Message.objects.filter(pk=message.pk).update(date_envoi=timezone.now() - timedelta(hours=i // 4))
+        self.messages = Message.objects.filter(destinataire=self.user).order_by('-date_envoi')
+
+    def test_parcours(self):
+        """Test que les pages, dans un sens puis dans l'autre, couvrent la liste sans doublon"""
+        attendus = list(self.messages.order_by('-date_envoi', '-pk'))
+        pages, curseur = [], None
+        while True:
+            page = paginer_queryset(self.messages, curseur, par_page=5)
+            pages.append(list(page))
+            if not page.suivant:
+                break
+            curseur = page.suivant
+        self.assertEqual(sum(pages, []), attendus)
+        self.assertEqual([len(p) for p in pages], [5, 5, 5, 5, 3])
+
+        retour = []
+        while page.precedent:
+            page = paginer_queryset(self.messages, page.precedent, par_page=5)
+            retour.insert(0, list(page))
+        self.assertEqual(retour, pages[:-1])
+
+    def test_cout_constant(self):
+        """Test qu'une page profonde coûte une seule requête, sans OFFSET"""
+        curseur = paginer_queryset(self.messages, None, par_page=20).suivant
+        with self.assertNumQueries(1) as requetes:
+            page = paginer_queryset(self.messages, curseur, par_page=20)
+        self.assertEqual(len(page), 3)
+        self.assertNotIn('OFFSET', requetes.captured_queries[0]['sql'])
+
+    def test_curseur_invalide(self):
+        """Test qu'un curseur falsifié ou illisible ramène à la première page"""
+        premiere = list(paginer_queryset(self.messages, None, par_page=5))
+        suivant = paginer_queryset(self.messages, None, par_page=5).suivant
+        for curseur in (suivant[:-2] + 'xx', 'nimporte-quoi'):
+            self.assertEqual(list(paginer_queryset(self.messages, curseur, par_page=5)), premiere)
+
+    def test_compte(self):
+        """Test le compte exact et le compte estimé plafonné"""
+        self.assertEqual(paginer_queryset(self.messages, compte='exact').compte, 23)
+        with mock.patch('vetements.pagination.PLAFOND_COMPTE', 10):
+            page = paginer_queryset(self.messages, compte='estime')
+        self.assertEqual((page.compte, page.compte_plafonne), (10, True))
+
+    def test_vues(self):
+        """Test la boîte de réception page par page, liens compris"""
+        self.client.login(username='testuser', password='testpass123')
+        with mock.patch('vetements.views.MESSAGES_PAR_PAGE', 20):
+            response = self.client.get(reverse('vetements:messages_inbox'))
+            page = response.context['page']
+            self.assertEqual(len(page), 20)
+            self.assertContains(response, '?' + urlencode({'curseur': page.suivant}))
+            response = self.client.get(reverse('vetements:messages_inbox'), {'curseur': page.suivant})
+        self.assertEqual(len(response.context['messages']), 3)
+
+        Vetement.objects.create(proprietaire=self.user, nom='Pull', categorie=Categorie.objects.create(nom='Pull'),
+                                genre='homme')
+        response = self.client.get(reverse('vetements:liste_vetements'), {'q': 'pull'})
+        self.assertEqual(len(response.context['vetements']), 1)
+        self.assertEqual(response.context['page'].compte, 1)
+        self.assertEqual(self.client.get(reverse('vetements:tenues_list')).status_code, 200)
+
+
+class PlansRequetesTestCase(TestCase):
+    """
+    Plans d'exécution (EXPLAIN) des requêtes des vues fréquentes, sur une
+    base peuplée et analysée : aucun parcours complet ni tri temporaire
+    d'une grande table
+    """
+
+    GRANDES_TABLES = {
+        'vetements_vetement', 'vetements_tenue', 'vetements_message',
+        'vetements_annoncevente', 'vetements_evenementtenue', 'vetements_portage',
+    }
+    UTILISATEURS = 20
+    PAR_UTILISATEUR = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        utilisateurs = [User.objects.create(username=f'utilisateur{i}') for i in range(cls.UTILISATEURS)]
+        cls.user = utilisateurs[0]
+        categories = [Categorie.objects.create(nom=nom) for nom in ('Hauts', 'Bas', 'Chaussures')]
+        aujourdhui = date.today()
+        for i, utilisateur in enumerate(utilisateurs):
+            suivant = utilisateurs[(i + 1) % len(utilisateurs)]
+            vetements = Vetement.objects.bulk_create([
+                Vetement(proprietaire=utilisateur, nom=f'Vêtement {j}', categorie=categories[j % 3], genre='homme',
+                         a_laver=j % 10 == 0, favori=j % 7 == 0)
+                for j in range(cls.PAR_UTILISATEUR)
+            ])
+            AnnonceVente.objects.bulk_create([
+                AnnonceVente(vetement=vetement, vendeur=utilisateur, prix_vente=Decimal('10'),
+                             statut='en_vente' if j % 5 == 0 else 'vendue')
+                for j, vetement in enumerate(vetements[:20])
+            ])
+            Tenue.objects.bulk_create([Tenue(proprietaire=utilisateur, nom=f'Tenue {j}') for j in range(10)])
+            Message.objects.bulk_create([
+                Message(expediteur=suivant, destinataire=utilisateur, sujet=f'Message {j}', contenu='...',
+                        lu=j % 10 != 0, archive_destinataire=j % 8 == 0)
+                for j in range(cls.PAR_UTILISATEUR)
+            ])
+            EvenementTenue.objects.bulk_create([
+                EvenementTenue(proprietaire=utilisateur, titre=f'Événement {j}', date=aujourdhui + timedelta(days=j * 7 - 100))
+                for j in range(30)
+            ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def requetes(self, nom, **params):
+        """(sql, paramètres) des SELECT exécutés par la vue nom"""
+        requetes = []
+
+        def enregistrer(execute, sql, sql_params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                requetes.append((sql, sql_params))
+            return execute(sql, sql_params, many, context)
+
+        with connection.execute_wrapper(enregistrer):
+            response = self.client.get(reverse(f'vetements:{nom}'), params)
+        self.assertEqual(response.status_code, 200)
+        return requetes, response
+
+    def defauts(self, sql, params):
+        """
+        Parcours complets de grandes tables dans le plan de sql, et tris
+        temporaires quand la table qui mène la requête est grande
+        """
+        if connection.vendor == 'postgresql':
+            return self._defauts_postgresql(sql, params)
+        alias = {alias: table for table, alias in re.findall(r'"(\w+)" ([A-Z]\d+)\b', sql)}
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            lignes = cursor.fetchall()
+        defauts, meneuse = [], None
+        for _, parent, _, detail in lignes:
+            acces = re.match(r'(SCAN|SEARCH) (?:TABLE )?(\w+)', detail)
+            if acces:
+                table = alias.get(acces[2], acces[2])
+                if parent == 0 and meneuse is None:
+                    meneuse = table
+                if acces[1] == 'SCAN' and detail == acces[0] and table in self.GRANDES_TABLES:
+                    defauts.append(detail)
+            elif 'TEMP B-TREE' in detail and 'ORDER BY' in detail and meneuse in self.GRANDES_TABLES:
+                defauts.append(detail)
+        return defauts
+
+    def _defauts_postgresql(self, sql, params):
+        # Sans parcours séquentiel ni tri possibles, le planificateur n'y recourt qu'en l'absence d'index
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('enable_seqscan', 'off', true), set_config('enable_sort', 'off', true)")
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        defauts = []
+
+        def parcourir(noeud):
+            """Table qui mène le sous-plan de noeud"""
+            meneuses = [parcourir(enfant) for enfant in noeud.get('Plans', [])]
+            meneuse = noeud.get('Relation Name') or next(filter(None, meneuses), None)
+            if noeud['Node Type'] == 'Seq Scan' and meneuse in self.GRANDES_TABLES:
+                defauts.append(f'Seq Scan on {meneuse}')
+            elif noeud['Node Type'] in ('Sort', 'Incremental Sort') and meneuse in self.GRANDES_TABLES:
+                defauts.append(f"{noeud['Node Type']} ({', '.join(noeud['Sort Key'])})")
+            return meneuse
+
+        parcourir(plan[0]['Plan'])
+        return defauts
+
+    def verifier(self, nom, **params):
+        requetes, response = self.requetes(nom, **params)
+        self.assertTrue(requetes)
+        for sql, sql_params in requetes:
+            with self.subTest(vue=nom, sql=sql):
+                self.assertEqual(self.defauts(sql, sql_params), [])
+        return response
+
+    def test_garde_robe(self):
+        """Test l'accueil, la liste des vêtements (filtres et page suivante) et l'entretien"""
+        self.verifier('accueil')
+        page = self.verifier('liste_vetements', a_laver=1).context['page']
+        self.verifier('liste_vetements', favori=1, categorie=Categorie.objects.first().pk)
+        with mock.patch('vetements.views.VETEMENTS_PAR_PAGE', 10):
+            page = self.verifier('liste_vetements').context['page']
+            self.verifier('liste_vetements', curseur=page.suivant)
+        self.verifier('entretien')
+        self.verifier('tenues_list')
+        self.verifier('calendrier_mensuel')
+
+    def test_messages(self):
+        """Test la boîte de réception (page suivante comprise) et les messages envoyés"""
+        with mock.patch('vetements.views.MESSAGES_PAR_PAGE', 10):
+            page = self.verifier('messages_inbox').context['page']
+            self.verifier('messages_inbox', curseur=page.suivant)
+        self.verifier('messages_sent')
+
+    def test_marketplace(self):
+        """Test le marketplace (page suivante comprise) et les annonces du vendeur"""
+        with mock.patch('vetements.views.ANNONCES_PAR_PAGE', 10):
+            page = self.verifier('marketplace_liste').context['page']
+            self.verifier('marketplace_liste', curseur=page.suivant)
+        self.verifier('marketplace_mes_annonces')
+
+    def test_detection(self):
+        """Test que le harnais signale un parcours complet et un tri sans index"""
+        requete = Vetement.objects.filter(genre='homme').order_by('nom')
+        sql, params = requete.query.sql_with_params()
+        self.assertEqual(len(self.defauts(sql, params)), 2)
+
+
+class FacettesTestCase(TestCase):
+    """Tests des comptes des facettes de la liste des vêtements"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.hauts = Categorie.objects.create(nom='Hauts')
+        self.bas = Categorie.objects.create(nom='Bas')
+        for i in range(24):
+            Vetement.objects.create(
+                proprietaire=self.user, nom=f'Vêtement {i}', categorie=(self.hauts, self.bas)[i % 2],
+                genre=('homme', 'femme', 'unisexe')[i % 3], saison=('hiver', 'ete', 'toute_saison', 'automne')[i % 4],
+                etat=('neuf', 'bon')[i % 5 == 0], favori=i % 3 == 0, a_laver=i % 4 == 1,
+            )
+        autre = User.objects.create_user(username='autre', password='testpass123')
+        Vetement.objects.create(proprietaire=autre, nom='Autre', categorie=self.hauts, genre='homme', saison='hiver')
+        self.vetements = Vetement.objects.filter(proprietaire=self.user)
+
+    def test_comptes(self):
+        """Test que chaque facette est comptée avec tous les filtres sauf le sien"""
+        champs = dict(FACETTES)
+        for filtres in ({}, {'saison': 'hiver', 'favori': True}, {'categorie': self.bas.pk, 'genre': 'femme', 'a_laver': True}):
+            comptes = compter_facettes(self.vetements, filtres)
+            for facette, champ in FACETTES:
+                autres = {f: v for f, v in filtres.items() if f != facette}
+                attendus = Counter(filtrer(self.vetements, autres).values_list(champ, flat=True))
+                self.assertEqual(+comptes[facette], attendus, (filtres, facette))
+
+    def test_requetes(self):
+        """Test une seule requête groupée, mise en cache jusqu'à la prochaine modification"""
+        stats = StatistiquesUtilisateur.pour(self.user)
+        with self.assertNumQueries(1):
+            comptes = compter_facettes(self.vetements, {'saison': 'hiver'}, stats)
+        with self.assertNumQueries(0):
+            self.assertEqual(compter_facettes(self.vetements, {'favori': True}, stats)['favori'][True], 8)
+        self.assertEqual(comptes['genre']['homme'], 2)
+
+        Vetement.objects.create(proprietaire=self.user, nom='Neuf', categorie=self.hauts, genre='homme', saison='hiver')
+        stats = StatistiquesUtilisateur.pour(self.user)
+        self.assertEqual(compter_facettes(self.vetements, {'saison': 'hiver'}, stats)['genre']['homme'], 3)
+
+    def test_vue(self):
+        """Test les comptes affichés dans les filtres de la liste"""
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('vetements:liste_vetements'), {'saison': 'hiver', 'categorie': self.hauts.pk})
+        self.assertEqual(len(response.context['vetements']), 6)
+        facettes = response.context['facettes']
+        self.assertEqual({option.valeur: option.nombre for option in facettes['saison']}['ete'], 0)
+        self.assertEqual([(o.libelle, o.nombre, o.active) for o in facettes['categorie']],
+                         [('Bas', 0, False), ('Hauts', 6, True)])
+        self.assertContains(response, 'Hiver (6)')
+
+        response = self.client.get(reverse('vetements:liste_vetements'), {'q': 'vêtement saison:hiver', 'categorie': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['facettes']['favori'], 2)
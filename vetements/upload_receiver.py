@@ -0,0 +1,198 @@
+"""
+Récepteur des envois directs de photos, à faire tourner à côté de nginx
+sur Unraid. Le navigateur y envoie la photo (PUT) avec l'URL signée remise
+par Django, sans que les octets ne passent par Render :
+
+    PUT /upload/vetements/3f2a....jpg?expires=...&max=...&signature=...
+
+Le récepteur vérifie la signature, l'expiration et la taille, écrit le
+fichier dans le répertoire média et répond par un reçu signé
+({"nom", "taille", "sha256", "recu"}) que le formulaire renvoie à Django.
+
+Avec MEDIA_SIGNING_SECRET, il vérifie aussi les URLs de photos signées
+pour nginx (auth_request) : GET /auth avec l'URL demandée dans l'en-tête
+X-Original-URI, réponse 204 si la signature est valide, 403 sinon.
+
+C'est une application WSGI sans dépendance à Django :
+
+    MEDIA_UPLOAD_SECRET=... MEDIA_UPLOAD_ROOT=/mnt/user/appdata/garde-robe/media \\
+    MEDIA_UPLOAD_ORIGIN=https://votre-app.onrender.com \\
+    python -m vetements.upload_receiver --port 8081
+
+(ou via gunicorn : `gunicorn 'vetements.upload_receiver:from_environ()'`).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from urllib.parse import parse_qs, unquote
+from wsgiref.simple_server import make_server
+
+from vetements.signatures import upload_receipt, verify_media_url, verify_upload
+
+
+CHUNK_SIZE = 64 * 1024
+
+STATUS = {
+    201: '201 Created',
+    204: '204 No Content',
+    400: '400 Bad Request',
+    403: '403 Forbidden',
+    404: '404 Not Found',
+    405: '405 Method Not Allowed',
+    409: '409 Conflict',
+    411: '411 Length Required',
+    413: '413 Payload Too Large',
+}
+
+
+def safe_name(name):
+    """Vérifier que name reste dans le répertoire média (ni chemin absolu ni '..')"""
+    return (
+        bool(name)
+        and not name.startswith('/')
+        and '\\' not in name
+        and '\x00' not in name
+        and all(part not in ('', '.', '..') for part in name.split('/'))
+    )
+
+
+class UploadReceiver:
+    """
+    Application WSGI recevant les PUT signés sous prefix et les écrivant
+    dans root ; vérifie aussi les URLs signées de media_prefix sur auth_path.
+    """
+
+    def __init__(self, root, secret, prefix='/upload/', allowed_origin='*',
+                 media_secret='', media_prefix='/media/', auth_path='/auth'):
+        if not (secret or media_secret):
+            raise ValueError("MEDIA_UPLOAD_SECRET ou MEDIA_SIGNING_SECRET manquant")
+        self.root = root
+        self.secret = secret
+        self.prefix = prefix
+        self.allowed_origin = allowed_origin
+        self.media_secret = media_secret
+        self.media_prefix = media_prefix
+        self.auth_path = auth_path
+
+    def __call__(self, environ, start_response):
+        status, body = self.handle(environ)
+        headers = [
+            ('Access-Control-Allow-Origin', self.allowed_origin),
+            ('Access-Control-Allow-Methods', 'PUT, OPTIONS'),
+            ('Access-Control-Allow-Headers', 'Content-Type'),
+            ('Content-Type', 'application/json'),
+        ]
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        headers.append(('Content-Length', str(len(payload))))
+        start_response(STATUS[status], headers)
+        return [payload]
+
+    def handle(self, environ):
+        """Traiter une requête ; retourne (code HTTP, corps JSON)"""
+        method = environ['REQUEST_METHOD']
+        if method == 'OPTIONS':
+            return 204, None
+        if method == 'GET' and environ.get('PATH_INFO') == self.auth_path:
+            return (204, None) if self.authorize(environ.get('HTTP_X_ORIGINAL_URI', '')) else (403, None)
+        if method != 'PUT':
+            return 405, {'erreur': 'Méthode non autorisée'}
+
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(self.prefix):
+            return 404, {'erreur': 'Introuvable'}
+        name = unquote(path[len(self.prefix):])
+        if not safe_name(name):
+            return 400, {'erreur': 'Nom de fichier invalide'}
+
+        params = {key: values[0] for key, values in parse_qs(environ.get('QUERY_STRING', '')).items()}
+        if not verify_upload(self.secret, name, params.get('expires'), params.get('max'), params.get('signature')):
+            return 403, {'erreur': 'Signature invalide ou expirée'}
+
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or '')
+        except ValueError:
+            return 411, {'erreur': 'Content-Length requis'}
+        if length > int(params['max']):
+            return 413, {'erreur': 'Fichier trop volumineux'}
+
+        path = os.path.join(self.root, name)
+        if os.path.exists(path):
+            return 409, {'erreur': 'Fichier déjà envoyé'}
+        size, sha256 = self._write(environ['wsgi.input'], length, path)
+        if size is None:
+            return 400, {'erreur': 'Envoi incomplet'}
+
+        return 201, {
+            'nom': name,
+            'taille': size,
+            'sha256': sha256,
+            'recu': upload_receipt(self.secret, name, size, sha256),
+        }
+
+    def authorize(self, uri):
+        """Vérifier l'URL signée d'une photo (chemin et paramètres de requête)"""
+        path, _, query = uri.partition('?')
+        if not self.media_secret or not path.startswith(self.media_prefix):
+            return False
+        params = {key: values[0] for key, values in parse_qs(query).items()}
+        return verify_media_url(
+            self.media_secret, unquote(path[len(self.media_prefix):]), params.get('expires'), params.get('signature')
+        )
+
+    @staticmethod
+    def _write(stream, length, path):
+        """Écrire length octets de stream dans path (atomique) ; retourne (taille, sha256)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        try:
+            remaining = length
+            with os.fdopen(fd, 'wb') as tmp:
+                while remaining:
+                    chunk = stream.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    tmp.write(chunk)
+                    digest.update(chunk)
+                    remaining -= len(chunk)
+            if remaining:
+                os.remove(tmp_path)
+                return None, None
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return length, digest.hexdigest()
+
+
+def from_environ():
+    """Récepteur configuré par les variables d'environnement MEDIA_UPLOAD_*"""
+    return UploadReceiver(
+        root=os.environ.get('MEDIA_UPLOAD_ROOT', '/mnt/user/appdata/garde-robe/media'),
+        secret=os.environ.get('MEDIA_UPLOAD_SECRET', ''),
+        prefix=os.environ.get('MEDIA_UPLOAD_PREFIX', '/upload/'),
+        allowed_origin=os.environ.get('MEDIA_UPLOAD_ORIGIN', '*'),
+        media_secret=os.environ.get('MEDIA_SIGNING_SECRET', ''),
+        media_prefix=os.environ.get('MEDIA_URL_PREFIX', '/media/'),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Récepteur des envois directs de photos")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+    with make_server(args.host, args.port, from_environ()) as server:
+        print(f"Récepteur d'envois sur http://{args.host}:{args.port}")
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
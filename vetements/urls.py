@@ -68,4 +68,8 @@ urlpatterns = [
     path('calendrier/evenement/creer/', views.evenement_create, name='evenement_create'),
     path('calendrier/evenement/<int:pk>/modifier/', views.evenement_edit, name='evenement_edit'),
     path('calendrier/evenement/<int:pk>/supprimer/', views.evenement_delete, name='evenement_delete'),
+
+    # Médias
+    path('media-en-attente/<path:path>', views.media_en_attente, name='media_en_attente'),
+    path('media-protege/<path:path>', views.media_protege, name='media_protege'),
 ]
@@ -1,6 +1,6 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView
-from django.db.models import Avg, Sum, Count, Q
+from django.db.models import Q
 from datetime import date
 from django.utils import timezone
 from django.contrib.auth import login, logout, authenticate
@@ -9,13 +9,31 @@ from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
 from django.contrib import messages
 from .models import (Vetement, Categorie, Tenue, Valise, ItemValise, Message, Amitie, AnnonceVente,
-                      FavoriAnnonce, TransactionVente, EvaluationVendeur, Couleur, Taille, EvenementTenue)
-from django.http import JsonResponse
+                      FavoriAnnonce, TransactionVente, EvaluationVendeur, Couleur, Taille, EvenementTenue,
+                      StatistiquesUtilisateur)
+from django.http import Http404, HttpResponse, JsonResponse
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.views.static import serve
 import json
+from urllib.parse import quote
+from .images import variant_root
+from .statistiques import calculer_statistiques
+from .cache_statistiques import en_cache
+from .recherche import rechercher
+from .recherche_annonces import rechercher as rechercher_annonces
+from .pagination import paginer
+from .facettes import compter_facettes, filtres_actifs, filtrer, options_facettes
 from .forms import ValiseForm, ValiseVetementsForm, ValiseStatutForm, VetementForm, EvenementForm
 import calendar
 from datetime import datetime, timedelta
 
+
+VETEMENTS_PAR_PAGE = 20
+TENUES_PAR_PAGE = 24
+ANNONCES_PAR_PAGE = 24
+MESSAGES_PAR_PAGE = 50
+
 # Create your views here.
 
 # Authentication views
@@ -98,51 +116,41 @@ def user_profile(request):
 
         return redirect('vetements:user_profile')
 
-    # Statistiques personnelles
-    nb_vetements = Vetement.objects.filter(proprietaire=request.user).count()
-    nb_tenues = Tenue.objects.filter(proprietaire=request.user).count()
-    nb_valises = Valise.objects.filter(proprietaire=request.user).count()
-    nb_messages_recus = Message.objects.filter(destinataire=request.user).count()
-    nb_messages_envoyes = Message.objects.filter(expediteur=request.user).count()
+    # Statistiques personnelles (tenues à jour en base)
+    stats = StatistiquesUtilisateur.pour(request.user)
 
     context = {
-        'nb_vetements': nb_vetements,
-        'nb_tenues': nb_tenues,
-        'nb_valises': nb_valises,
-        'nb_messages_recus': nb_messages_recus,
-        'nb_messages_envoyes': nb_messages_envoyes,
+        'nb_vetements': stats.nb_vetements,
+        'nb_tenues': stats.nb_tenues,
+        'nb_valises': stats.nb_valises,
+        'nb_messages_recus': stats.nb_messages_recus,
+        'nb_messages_envoyes': stats.nb_messages_envoyes,
     }
     return render(request, 'vetements/user_profile.html', context)
 
 @login_required
 def accueil(request):
     """Page d'accueil avec statistiques de la garde-robe"""
-    # Filtrer par utilisateur connecté
-    vetements = Vetement.objects.filter(proprietaire=request.user)
-    total_vetements = vetements.count()
-    favoris = vetements.filter(favori=True).count()
-    a_laver = vetements.filter(a_laver=True).count()
-    peu_portes = len([v for v in vetements if v.peu_porte])
-
-    # Statistiques sur les prix
-    total_depense = vetements.aggregate(total=Sum('prix_achat'))['total'] or 0
-
-    # Vêtements par catégorie
-    par_categorie = vetements.values('categorie__nom').annotate(count=Count('id')).order_by('-count')[:5]
-
-    # Statistiques de portage
-    total_portages = vetements.aggregate(total=Sum('nombre_portage'))['total'] or 0
+    # Statistiques tenues à jour en base : une seule ligne à lire, le reste
+    # est mis en cache jusqu'à la prochaine modification de la garde-robe
+    stats = StatistiquesUtilisateur.pour(request.user)
+    apercu = en_cache(stats, 'accueil', lambda: {
+        'par_categorie': stats.top_categories(5),
+        'derniers_vetements': list(Vetement.objects.filter(
+            proprietaire=request.user
+        ).select_related('categorie').order_by('-date_ajout')[:6]),
+    })
 
     context = {
-        'total_vetements': total_vetements,
-        'favoris': favoris,
-        'a_laver': a_laver,
-        'peu_portes': peu_portes,
-        'total_depense': total_depense,
-        'par_categorie': par_categorie,
-        'total_portages': total_portages,
-        'derniers_vetements': vetements.order_by('-date_ajout')[:6],
-        'total_tenues': Tenue.objects.filter(proprietaire=request.user).count(),
+        'total_vetements': stats.nb_vetements,
+        'favoris': stats.nb_favoris,
+        'a_laver': stats.nb_a_laver,
+        'peu_portes': stats.nb_peu_portes,
+        'total_depense': stats.total_depense,
+        'par_categorie': apercu['par_categorie'],
+        'total_portages': stats.total_portages,
+        'derniers_vetements': apercu['derniers_vetements'],
+        'total_tenues': stats.nb_tenues,
     }
     return render(request, 'vetements/accueil.html', context)
 
@@ -152,7 +160,7 @@ class VetementListView(ListView):
     model = Vetement
     template_name = 'vetements/liste_vetements.html'
     context_object_name = 'vetements'
-    paginate_by = 20
+    paginate_by = None  # Pagination par curseur (get_context_data)
 
     def dispatch(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
@@ -163,44 +171,26 @@ class VetementListView(ListView):
         # Filtrer par utilisateur connecté
         queryset = Vetement.objects.filter(proprietaire=self.request.user)
 
-        # Filtrage par catégorie
-        categorie_id = self.request.GET.get('categorie')
-        if categorie_id:
-            queryset = queryset.filter(categorie_id=categorie_id)
-
-        # Filtrage par genre
-        genre = self.request.GET.get('genre')
-        if genre:
-            queryset = queryset.filter(genre=genre)
-
-        # Filtrage par saison
-        saison = self.request.GET.get('saison')
-        if saison:
-            queryset = queryset.filter(saison=saison)
-
-        # Filtrage par état
-        etat = self.request.GET.get('etat')
-        if etat:
-            queryset = queryset.filter(etat=etat)
-
-        # Filtrage favoris
-        if self.request.GET.get('favori'):
-            queryset = queryset.filter(favori=True)
-
-        # Filtrage à laver
-        if self.request.GET.get('a_laver'):
-            queryset = queryset.filter(a_laver=True)
-
-        # Recherche
+        # Recherche plein texte et filtres champ:valeur (couleur:noir saison:hiver)
+        queryset = queryset.order_by('-date_ajout')
         recherche = self.request.GET.get('q')
         if recherche:
-            queryset = queryset.filter(nom__icontains=recherche) | queryset.filter(description__icontains=recherche) | queryset.filter(marque__icontains=recherche)
+            queryset = rechercher(queryset, recherche)
 
-        return queryset.order_by('-date_ajout')
+        # Filtres des facettes (catégorie, genre, saison, état, favoris, à laver),
+        # comptées sur le queryset qui ne les applique pas encore
+        self.vetements_facettes = queryset
+        self.filtres = filtres_actifs(self.request.GET)
+        return filtrer(queryset, self.filtres)
 
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+        page = paginer(self.request, self.object_list, par_page=VETEMENTS_PAR_PAGE, compte='estime')
+        context = super().get_context_data(object_list=page, **kwargs)
+        context['page'] = page
         context['categories'] = Categorie.objects.all()
+        comptes = compter_facettes(self.vetements_facettes, self.filtres, StatistiquesUtilisateur.pour(self.request.user),
+                                   self.request.GET.get('q', ''))
+        context['facettes'] = options_facettes(comptes, self.filtres, context['categories'])
         return context
 
 
@@ -265,8 +255,10 @@ def tenues_list(request):
     if request.GET.get('favori'):
         tenues = tenues.filter(favori=True)
 
+    page = paginer(request, tenues, par_page=TENUES_PAR_PAGE)
     context = {
-        'tenues': tenues,
+        'tenues': page,
+        'page': page,
     }
     return render(request, 'vetements/tenues_list.html', context)
 
@@ -285,149 +277,13 @@ def tenue_detail(request, pk):
 @login_required
 def statistiques(request):
     """Page de statistiques détaillées"""
-    from datetime import datetime, timedelta
-    from collections import defaultdict
-
-    vetements = Vetement.objects.filter(proprietaire=request.user)
-
-    # Statistiques générales
-    total_vetements = vetements.count()
-    total_depense = vetements.aggregate(total=Sum('prix_achat'))['total'] or 0
-
-    # Par catégorie
-    par_categorie = vetements.values('categorie__nom').annotate(count=Count('id')).order_by('-count')
-
-    # Par couleur
-    par_couleur = vetements.values('couleur__nom').annotate(count=Count('id')).order_by('-count')[:10]
-
-    # Par saison
-    par_saison = vetements.values('saison').annotate(count=Count('id')).order_by('-count')
-
-    # Statistiques de portage
-    total_portages = vetements.aggregate(total=Sum('nombre_portage'))['total'] or 0
-    vetements_avec_prix = vetements.exclude(prix_achat__isnull=True).exclude(nombre_portage=0)
-    cout_moyen_portage = None
-    if vetements_avec_prix.exists():
-        couts = [v.cout_par_portage for v in vetements_avec_prix if v.cout_par_portage]
-        if couts:
-            cout_moyen_portage = sum(couts) / len(couts)
-
-    # Les plus portés
-    plus_portes = vetements.filter(nombre_portage__gt=0).order_by('-nombre_portage')[:10]
-
-    # Les moins portés
-    peu_portes = [v for v in vetements if v.peu_porte]
-
-    # ========================================
-    # NOUVELLES STATISTIQUES AVANCÉES
-    # ========================================
-
-    # 1. Coût par portage par catégorie
-    cout_par_categorie = []
-    for cat in par_categorie:
-        cat_nom = cat['categorie__nom']
-        vetements_cat = vetements.filter(categorie__nom=cat_nom).exclude(prix_achat__isnull=True).exclude(nombre_portage=0)
-        if vetements_cat.exists():
-            couts_cat = [v.cout_par_portage for v in vetements_cat if v.cout_par_portage]
-            if couts_cat:
-                cout_par_categorie.append({
-                    'categorie': cat_nom,
-                    'cout_moyen': sum(couts_cat) / len(couts_cat),
-                    'count': len(couts_cat)
-                })
-    cout_par_categorie = sorted(cout_par_categorie, key=lambda x: x['cout_moyen'])[:10]
-
-    # 2. Top 10 vêtements les plus rentables (coût par portage le plus bas)
-    plus_rentables = []
-    for v in vetements_avec_prix:
-        if v.cout_par_portage and v.nombre_portage >= 5:  # Au moins 5 portages pour être considéré
-            plus_rentables.append(v)
-    plus_rentables = sorted(plus_rentables, key=lambda x: x.cout_par_portage)[:10]
-
-    # 3. Utilisation par mois (12 derniers mois)
-    today = timezone.now().date()
-    utilisation_mensuelle = []
-    labels_mois = []
-
-    for i in range(11, -1, -1):  # 12 derniers mois
-        mois_debut = (today.replace(day=1) - timedelta(days=i*30)).replace(day=1)
-        if mois_debut.month == 12:
-            mois_fin = mois_debut.replace(year=mois_debut.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            mois_fin = mois_debut.replace(month=mois_debut.month + 1, day=1) - timedelta(days=1)
-
-        # Compter les vêtements portés ce mois (dernière utilisation dans ce mois)
-        portages_mois = vetements.filter(
-            derniere_utilisation__gte=mois_debut,
-            derniere_utilisation__lte=mois_fin
-        ).count()
-
-        utilisation_mensuelle.append(portages_mois)
-        labels_mois.append(mois_debut.strftime('%b %Y'))
-
-    # 4. Alertes intelligentes - Vêtements jamais portés ou pas portés depuis longtemps
-    alertes = []
-    vetements_jamais_portes = vetements.filter(nombre_portage=0)
-    if vetements_jamais_portes.exists():
-        alertes.append({
-            'type': 'warning',
-            'titre': 'Vêtements jamais portés',
-            'message': f'{vetements_jamais_portes.count()} vêtement(s) n\'ont jamais été portés',
-            'count': vetements_jamais_portes.count(),
-            'icon': 'new_releases'
-        })
-
-    # Vêtements pas portés depuis plus de 6 mois
-    six_mois_ago = today - timedelta(days=180)
-    vetements_anciens = vetements.filter(
-        derniere_utilisation__lt=six_mois_ago
-    ).exclude(nombre_portage=0)
-    if vetements_anciens.exists():
-        alertes.append({
-            'type': 'info',
-            'titre': 'Pas portés depuis 6+ mois',
-            'message': f'{vetements_anciens.count()} vêtement(s) n\'ont pas été portés depuis plus de 6 mois',
-            'count': vetements_anciens.count(),
-            'icon': 'schedule'
-        })
-
-    # 5. Palette de couleurs dominante (top 5)
-    couleurs_dominantes = vetements.exclude(couleur__isnull=True).values(
-        'couleur__nom', 'couleur__code_hex'
-    ).annotate(count=Count('id')).order_by('-count')[:5]
-
-    # 6. Statistiques de valeur
-    valeur_portee = sum([v.prix_achat for v in vetements.filter(nombre_portage__gt=0) if v.prix_achat])
-    valeur_non_portee = sum([v.prix_achat for v in vetements.filter(nombre_portage=0) if v.prix_achat])
-
-    # 7. Taux de rotation (vêtements portés dans les 30 derniers jours)
-    trente_jours_ago = today - timedelta(days=30)
-    vetements_recents = vetements.filter(derniere_utilisation__gte=trente_jours_ago).count()
-    taux_rotation = (vetements_recents / total_vetements * 100) if total_vetements > 0 else 0
-
-    context = {
-        'total_vetements': total_vetements,
-        'total_depense': total_depense,
-        'par_categorie': par_categorie,
-        'par_couleur': par_couleur,
-        'par_saison': par_saison,
-        'total_portages': total_portages,
-        'cout_moyen_portage': cout_moyen_portage,
-        'plus_portes': plus_portes,
-        'peu_portes': peu_portes,
-        # Nouvelles statistiques
-        'cout_par_categorie': cout_par_categorie,
-        'plus_rentables': plus_rentables,
-        'utilisation_mensuelle': utilisation_mensuelle,
-        'labels_mois': labels_mois,
-        'alertes': alertes,
-        'couleurs_dominantes': couleurs_dominantes,
-        'valeur_portee': valeur_portee,
-        'valeur_non_portee': valeur_non_portee,
-        'taux_rotation': taux_rotation,
-        'vetements_recents': vetements_recents,
-    }
-    return render(request, 'vetements/statistiques.html', context)
+    # Recalculées seulement si la garde-robe a changé (ou chaque jour, pour
+    # les périodes glissantes)
+    stats = StatistiquesUtilisateur.pour(request.user)
+    aujourd_hui = timezone.localdate()
+    statistiques = en_cache(stats, f'statistiques-{aujourd_hui.isoformat()}',
+                            lambda: calculer_statistiques(request.user, aujourd_hui))
+    return render(request, 'vetements/statistiques.html', statistiques.contexte())
 
 
 # Vues pour les valises
@@ -495,8 +351,10 @@ def messages_inbox(request):
         except Message.DoesNotExist:
             pass
 
+    page = paginer(request, messages_recus.select_related('expediteur'), par_page=MESSAGES_PAR_PAGE)
     context = {
-        'messages': messages_recus,
+        'messages': page,
+        'page': page,
         'non_lus': non_lus,
         'selected_message': selected_message,
     }
@@ -524,8 +382,10 @@ def messages_sent(request):
         except Message.DoesNotExist:
             pass
 
+    page = paginer(request, messages_envoyes.select_related('destinataire'), par_page=MESSAGES_PAR_PAGE)
     context = {
-        'messages': messages_envoyes,
+        'messages': page,
+        'page': page,
         'selected_message': selected_message,
     }
     return render(request, 'vetements/messages_sent.html', context)
@@ -944,26 +804,25 @@ def marketplace_liste(request):
     if request.GET.get('livraison'):
         annonces = annonces.filter(livraison_possible=True)
 
-    # Recherche
+    # Recherche approchée (tolérante aux fautes de frappe), classée par score
     recherche = request.GET.get('q')
     if recherche:
-        annonces = annonces.filter(
-            Q(vetement__nom__icontains=recherche) |
-            Q(description_vente__icontains=recherche) |
-            Q(vetement__marque__icontains=recherche)
-        )
+        annonces = rechercher_annonces(annonces, recherche)
+
+    page = paginer(request, annonces, par_page=ANNONCES_PAR_PAGE)
 
     # Récupérer les favoris de l'utilisateur
-    favoris_ids = FavoriAnnonce.objects.filter(
+    favoris_ids = set(FavoriAnnonce.objects.filter(
         utilisateur=request.user
-    ).values_list('annonce_id', flat=True)
+    ).values_list('annonce_id', flat=True))
 
     # Ajouter une annotation pour savoir si c'est un favori
-    for annonce in annonces:
+    for annonce in page:
         annonce.est_favori = annonce.id in favoris_ids
 
     context = {
-        'annonces': annonces,
+        'annonces': page,
+        'page': page,
         'categories': Categorie.objects.all(),
         'couleurs': Couleur.objects.all(),
         'tailles': Taille.objects.all().order_by('ordre'),
@@ -1453,7 +1312,7 @@ def valise_add_items(request, pk):
 def vetement_create(request):
     """Créer un nouveau vêtement"""
     if request.method == 'POST':
-        form = VetementForm(request.POST, request.FILES)
+        form = VetementForm(request.POST, request.FILES, utilisateur=request.user)
         if form.is_valid():
             vetement = form.save(commit=False)
             vetement.proprietaire = request.user
@@ -1461,10 +1320,11 @@ def vetement_create(request):
             messages.success(request, f"Vêtement '{vetement.nom}' ajouté avec succès!")
             return redirect('vetements:detail_vetement', pk=vetement.pk)
     else:
-        form = VetementForm()
+        form = VetementForm(utilisateur=request.user)
 
     context = {
         'form': form,
+        'upload_directe': form.direct_upload(),
         'title': 'Ajouter un nouveau vêtement',
         'submit_text': 'Ajouter le vêtement'
     }
@@ -1477,17 +1337,18 @@ def vetement_edit(request, pk):
     vetement = get_object_or_404(Vetement, pk=pk, proprietaire=request.user)
 
     if request.method == 'POST':
-        form = VetementForm(request.POST, request.FILES, instance=vetement)
+        form = VetementForm(request.POST, request.FILES, instance=vetement, utilisateur=request.user)
         if form.is_valid():
             form.save()
             messages.success(request, f"Vêtement '{vetement.nom}' modifié avec succès!")
             return redirect('vetements:detail_vetement', pk=vetement.pk)
     else:
-        form = VetementForm(instance=vetement)
+        form = VetementForm(instance=vetement, utilisateur=request.user)
 
     context = {
         'form': form,
         'vetement': vetement,
+        'upload_directe': form.direct_upload(),
         'title': f'Modifier "{vetement.nom}"',
         'submit_text': 'Sauvegarder les modifications'
     }
@@ -1657,3 +1518,65 @@ def evenement_delete(request, pk):
         'evenement': evenement
     }
     return render(request, 'vetements/evenement_confirm_delete.html', context)
+
+
+# ========================================
+# MÉDIAS EN ATTENTE D'ENVOI
+# ========================================
+
+@login_required
+def media_en_attente(request, path):
+    """
+    Servir une image déposée en staging tant qu'elle n'est pas encore sur
+    Unraid, aux mêmes utilisateurs que media_protege
+    """
+    if not media_accessible(request.user, path):
+        raise Http404  # Ne pas révéler l'existence du fichier
+    staged_path = getattr(default_storage, '_staged_path', None)
+    if staged_path is None or staged_path(path) is None:
+        # Déjà envoyée (ou backend sans write-behind) : URL définitive
+        return redirect(default_storage.url(path))
+    return serve(request, path, document_root=default_storage.staging_dir)
+
+
+# ========================================
+# MÉDIAS PROTÉGÉS
+# ========================================
+
+def media_accessible(user, name):
+    """
+    Vérifier que user peut voir la photo name (ou l'une de ses vignettes) :
+    la sienne, celle d'un ami, ou celle d'un vêtement mis en vente.
+    """
+    if user.is_staff:
+        return True
+    root = variant_root(name)
+    photo = Q(image__startswith=f"{root}.") if root else Q(image=name)
+
+    amis = Amitie.objects.filter(
+        Q(demandeur=user, statut='acceptee') | Q(destinataire=user, statut='acceptee')
+    ).values_list('demandeur_id', 'destinataire_id')
+    proprietaires = {user.id} | {user_id for paire in amis for user_id in paire}
+
+    return (
+        Vetement.objects.filter(photo).filter(
+            Q(proprietaire_id__in=proprietaires) | Q(annonce_vente__isnull=False)
+        ).exists()
+        or Tenue.objects.filter(photo, proprietaire_id__in=proprietaires).exists()
+    )
+
+
+@login_required
+def media_protege(request, path):
+    """
+    Autoriser l'accès à une photo puis la faire servir par nginx
+    (X-Accel-Redirect) : Django ne transmet jamais les octets.
+    """
+    if not media_accessible(request.user, path):
+        raise Http404  # Ne pas révéler l'existence du fichier
+    response = HttpResponse()
+    # nginx déduit le type du fichier servi
+    del response['Content-Type']
+    response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response